@@ -3,12 +3,12 @@ from discord.ext import commands
 from discord import app_commands
 import csv
 import os
-import string
-import random
 from datetime import timezone, datetime
 from utils.localization import get_translation
 from utils.language import get_user_language
 from db.connection import get_pool
+from db.unique_ids import new_unique_id
+from db.catalog import load_catalog
 
 
 class AdminGroup(app_commands.Group):
@@ -86,7 +86,7 @@ class AdminGroup(app_commands.Group):
             await interaction.edit_original_response(content=file_not_found)
             return
 
-        pool = await get_pool()
+        pool = get_pool()
         inserted = 0
 
         
@@ -678,7 +678,8 @@ class AdminGroup(app_commands.Group):
                     inserted_total += inserted
                     inserted = 0
 
-
+        # Las tablas estáticas cambiaron: recargar el catálogo en memoria
+        await load_catalog()
         
         if content_type == "all":
             succesfull = get_translation(language, "upload_content.succesfull_all", inserted=inserted_total)
@@ -712,13 +713,7 @@ class AdminGroup(app_commands.Group):
             durability = item_row['max_durability']
             item_name = item_row['name']
             
-            unique_id = ""
-            while True:
-                new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                row = await conn.fetchrow("SELECT 1 FROM user_item_cards WHERE unique_id = $1", new_id)
-                if not row:
-                    unique_id = new_id
-                    break
+            unique_id = await new_unique_id(conn)
 
             
             values = (
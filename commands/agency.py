@@ -1,9 +1,10 @@
-import discord, asyncio, random, string
+import discord, asyncio
 from discord.ext import commands
 from discord import app_commands
 from utils.localization import get_translation
-from utils.language import get_user_language
+from utils.language import get_user_language, invalidate_user_language
 from db.connection import get_pool
+from db.unique_ids import new_unique_id
 from datetime import datetime
 
 LANGUAGES = {
@@ -126,6 +127,7 @@ class LanguageButton(discord.ui.Button):
     async def callback(self, interaction: discord.Interaction):
         pool = get_pool()
         await pool.execute("UPDATE users SET language = $1 WHERE user_id = $2", self.lang_code, self.user_id)
+        invalidate_user_language(self.user_id)
         await refresh_profile_view(interaction, self.user_id, self.owner)
 
 
@@ -208,7 +210,7 @@ class LevelConfirmView(discord.ui.View):
 
                 # 2. Entregar pack si hay
                 if self.level_data["pack"]:
-                    new_uid = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+                    new_uid = await new_unique_id(conn)
                     await conn.execute("""
                         INSERT INTO players_packs (unique_id, user_id, pack_id, buy_date)
                         VALUES ($1, $2, $3, $4)
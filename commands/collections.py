@@ -4,6 +4,7 @@ from discord import app_commands
 from utils.localization import get_translation
 from utils.language import get_user_language
 from db.connection import get_pool
+from db import mission_events
 from collections import defaultdict
 from typing import List
 
@@ -65,28 +66,18 @@ class CollectionCommand(commands.Cog):
 
         
         
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_collections'
-                """, interaction.user.id)
-            
-            query = "SELECT * FROM cards_idol WHERE vocal > 1"
-            params = []
-            idx = 1
-            
-            if group:
-                query += f" AND group_name = ${idx}"
-                params.append(group)
-                idx += 1
-            
-            query += " ORDER BY card_id"
+        mission_events.emit(interaction.user.id, "view_collections")
+        
+        query = "SELECT * FROM cards_idol WHERE vocal > 1"
+        params = []
+        idx = 1
+        
+        if group:
+            query += f" AND group_name = ${idx}"
+            params.append(group)
+            idx += 1
+        
+        query += " ORDER BY card_id"
         
         embeds, sorted_sets = await generate_sets_embeds(query, params, pool, interaction)  
         
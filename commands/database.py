@@ -16,7 +16,7 @@ class DatabaseCommands(commands.Cog):
             super().__init__(name="database", description="Comandos relacionados con la base de datos.")
 
         async def table_autocomplete(self, interaction: discord.Interaction, current: str):
-            pool = await get_pool()
+            pool = get_pool()
             async with pool.acquire() as conn:
                 rows = await conn.fetch("""
                     SELECT table_name
@@ -42,7 +42,7 @@ class DatabaseCommands(commands.Cog):
                 await interaction.response.send_message("❌ No tienes permiso para usar este comando.", ephemeral=True)
                 return
 
-            pool = await get_pool()
+            pool = get_pool()
             async with pool.acquire() as conn:
                 try:
                     await conn.execute(f'DROP TABLE IF EXISTS "{table}" CASCADE;')
@@ -62,7 +62,7 @@ class DatabaseCommands(commands.Cog):
             import csv
             import io
 
-            pool = await get_pool()
+            pool = get_pool()
             async with pool.acquire() as conn:
                 try:
                     rows = await conn.fetch(f'SELECT * FROM "{table}"')  # Protege contra mayúsculas
@@ -29,7 +29,7 @@ class GiveawaysGroup(app_commands.Group):
             c_id, u_id = prize.split(".")
         except Exception:
             return await interaction.response.send_message(content="## ❌ El ID ingresado no es válido.", ephemeral=True)
-        pool = await get_pool()
+        pool = get_pool()
         if duration == 0:
             duration = 1
         elif duration > 72:
@@ -97,7 +97,7 @@ class GiveawaysGroup(app_commands.Group):
             c_id, u_id = prize.split(".")
         except Exception:
             return await interaction.response.send_message(content="## ❌ El ID ingresado no es válido.", ephemeral=True)
-        pool = await get_pool()
+        pool = get_pool()
         if duration == 0:
             duration = 1
         elif duration > 72:
@@ -3,6 +3,7 @@ from discord.ext import commands
 from discord import app_commands
 from utils.localization import get_translation
 from utils.language import get_user_language
+from utils.emojis import get_emoji
 from db.connection import get_pool
 from datetime import timezone, datetime
 import random, string
@@ -1385,13 +1386,13 @@ class EquippedCardsPaginator:
                 if user_card_data:
                     skills = ""
                     if user_card_data['p_skill']:
-                        skills += f"{discord.utils.get(self.guild.emojis, name="PassiveSkill")} "
+                        skills += f"{get_emoji(self.guild, "PassiveSkill")} "
                     if user_card_data['a_skill']:
-                        skills += f"{discord.utils.get(self.guild.emojis, name="ActiveSkill")} "
+                        skills += f"{get_emoji(self.guild, "ActiveSkill")} "
                     if user_card_data['s_skill']:
-                        skills += f"{discord.utils.get(self.guild.emojis, name="SupportSkill")} "
+                        skills += f"{get_emoji(self.guild, "SupportSkill")} "
                     if user_card_data['u_skill']:
-                        skills += f"{discord.utils.get(self.guild.emojis, name="UltimateSkill")} "
+                        skills += f"{get_emoji(self.guild, "UltimateSkill")} "
             else:
                 vocal += idol_data['vocal']
                 rap += idol_data['rap']
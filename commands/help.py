@@ -5,7 +5,7 @@ from discord.ui import View, button, Button
 
 from utils.localization import get_translation
 from utils.language import get_user_language
-from db.connection import get_pool
+from db import mission_events
 from commands.starter import version
 
 HELP_TOPICS = [
@@ -45,18 +45,7 @@ class HelpGuide(commands.Cog):
                 "❌ Este comando solo está disponible en servidores.", 
                 ephemeral=True
             )
-        pool = get_pool()
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_help'
-                """, interaction.user.id)
+        mission_events.emit(interaction.user.id, "view_help")
         
         # 1) idioma del usuario
         lang = await get_user_language(interaction.user.id)
@@ -1,4 +1,4 @@
-import discord, random, asyncio, string, json, logging
+import discord, random, asyncio, json, logging
 from discord.ext import commands
 from discord import app_commands
 import csv
@@ -7,9 +7,12 @@ from utils.localization import get_translation
 from utils.language import get_user_language
 from utils.emojis import get_emoji
 from db.connection import get_pool
+from db.unique_ids import new_unique_id
+from db.catalog import get_catalog
 from datetime import datetime
-from utils.paginator import Paginator, NextButton, PreviousButton
-from collections import Counter, defaultdict
+from utils.paginator import Paginator, LazyPaginator, NextButton, PreviousButton
+from db import mission_events
+from collections import defaultdict
 from commands.starter import version
 from commands.starter import base, mult, reduct
 
@@ -123,11 +126,7 @@ class InventoryGroup(app_commands.Group):
             async with pool.acquire() as conn:
                 user_id = await conn.fetchval("SELECT user_id FROM users WHERE agency_name = $1", agency)
         
-        base_query = """
-            SELECT uc.*, ci.* FROM user_idol_cards uc
-            JOIN cards_idol ci ON uc.card_id = ci.card_id
-            WHERE uc.user_id = $1
-        """
+        base_query = "WHERE uc.user_id = $1"
         params = [user_id]
         idx = 2
         
@@ -180,29 +179,9 @@ class InventoryGroup(app_commands.Group):
             order_dir = order.value
         if not order and not order_by:
             order_dir = "DESC"
-        base_query += f" ORDER BY {order_column} {order_dir}"
         
-        async with pool.acquire() as conn:
-            
-            #mision
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_inventory'
-                """, interaction.user.id)
-            
-            rows = await conn.fetch(base_query, *params)
-            if duplicated:
-                card_counts = Counter([row['card_id'] for row in rows])
-                if duplicated.value == "✅":
-                    rows = [row for row in rows if card_counts[row['card_id']] >= 2]
-                else:
-                    rows = [row for row in rows if card_counts[row['card_id']] >= 1]
+        #mision
+        mission_events.emit(interaction.user.id, "view_inventory")
         is_detailed = True
         if details:
             if details.value == "✅":
@@ -212,20 +191,17 @@ class InventoryGroup(app_commands.Group):
                 
         
         language = await get_user_language(user_id=user_id)  
-            
-        if not rows:
-            await interaction.edit_original_response(content="## ❌No hay cartas para mostrar.")
-            return
-
-        card_counts = Counter([row['card_id'] for row in rows])
         
         main_user = None
         if agency:
             main_user = interaction.user.id
-        
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, is_detailed, main_user=main_user)
 
-        paginator = InventoryEmbedPaginator(embeds, rows, interaction, base_query, params, is_duplicated, is_detailed, embeds_per_page=3)
+        source = IdolCardQuery(base_query, params, order_column, order_dir, min_copies=2 if is_duplicated else None, with_copies=True)
+        paginator = InventoryEmbedPaginator(source, interaction, is_duplicated, is_detailed, embeds_per_page=3, main_user=main_user)
+        if not await paginator.load():
+            await interaction.edit_original_response(content="## ❌No hay cartas para mostrar.")
+            return
+
         await paginator.start()
 
     
@@ -374,16 +350,7 @@ class InventoryGroup(app_commands.Group):
         query += order_clause
 
         async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_items'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "view_items")
             rows = await conn.fetch(query, *params)
 
         language = await get_user_language(user_id=user_id)
@@ -422,19 +389,7 @@ class InventoryGroup(app_commands.Group):
             return await interaction.edit_original_response(
                 content="❌ Este comando solo está disponible en servidores."
             )
-        pool = get_pool()
-        
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_pcards'
-                """, interaction.user.id)
+        mission_events.emit(interaction.user.id, "view_pcards")
         
         await self.display_simple_inventory(
             interaction,
@@ -514,16 +469,7 @@ class InventoryGroup(app_commands.Group):
         query += order_clause
         
         async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_redeemables'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "view_redeemables")
             rows = await conn.fetch(query, *params)
             
         if not rows:
@@ -929,16 +875,7 @@ class ConfirmRedeemableButton(discord.ui.Button):
         
         if row['type'] == "boost" and row['redeemable_id'] not in ["ORGAN"]:
             async with pool.acquire() as conn:
-                await conn.execute("""
-                    UPDATE user_missions um
-                    SET obtained = um.obtained + 1,
-                        last_updated = now()
-                    FROM missions_base mb
-                    WHERE um.mission_id = mb.mission_id
-                    AND um.user_id = $1
-                    AND um.status = 'active'
-                    AND mb.mission_type = 'redeem_coupon'
-                    """, interaction.user.id)
+                mission_events.emit(interaction.user.id, "redeem_coupon")
                 
                 await conn.execute(
                     """INSERT INTO user_boosts (user_id, boost, amount)
@@ -970,11 +907,7 @@ class ConfirmRedeemableButton(discord.ui.Button):
 
                     card = await conn.fetchrow("SELECT * FROM cards_idol WHERE card_id = $1", new_card_id)
 
-                    while True:
-                        new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                        exists = await conn.fetchrow("SELECT 1 FROM user_idol_cards WHERE unique_id = $1", new_id)
-                        if not exists:
-                            break
+                    new_id = await new_unique_id(conn)
                     
                     p_skill = a_skill = s_skill = u_skill = None
                     
@@ -1204,16 +1137,7 @@ class ConfirmRedeemableGroupButton(discord.ui.Button):
                 )
                 
                 
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'redeem_coupon'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "redeem_coupon")
             
             await conn.execute(
                 "UPDATE user_redeemables SET quantity = quantity-1 WHERE user_id = $1 AND redeemable_id = $2",
@@ -1872,16 +1796,7 @@ class SelectMemberItemButton(discord.ui.Button):
             )
 
         async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'equip_card'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "equip_card")
             # 1) Desequipar antiguo si existe
             old = await conn.fetchval(
                 f"SELECT {slot} FROM groups_members WHERE group_id = $1 AND idol_id = $2",
@@ -2226,95 +2141,191 @@ class ConfirmItemRefundView(discord.ui.View):
 
 
 # - idol_cards
-async def generate_idol_card_embeds(rows: list, pool, guild: discord.Guild, is_detailed:bool, main_user = None) -> list[discord.Embed]:
-    """Genera una lista de embeds para cartas de idols."""
-    card_counts = Counter([row['card_id'] for row in rows])
-    embeds = []
-
-    for row in rows:
+class IdolCardQuery:
+    """Consulta de cartas de idols paginada por keyset: columna de orden + unique_id como desempate.
+    Cada página trae solo sus filas más una de adelanto y el total sale de un COUNT aparte."""
+    COLUMNS = "uc.*, ci.idol_name, ci.group_name, ci.set_name, ci.rarity, ci.vocal, ci.rap, ci.dance, ci.visual, ci.energy"
+    FROM = "FROM user_idol_cards uc JOIN cards_idol ci ON uc.card_id = ci.card_id"
+
+    def __init__(self, where: str, params: list, order_column: str, order_dir: str, min_copies: int = None, with_copies: bool = False):
+        self.where = where
+        self.params = list(params)
+        self.order_column = order_column
+        self.order_key = order_column.split(".")[-1]
+        self.order_dir = order_dir
+        self.min_copies = min_copies
+        self.with_copies = with_copies or min_copies is not None
+        self.cursors = {}
+
+    def filters(self, params: list) -> list[str]:
+        conditions = []
+        if self.min_copies:
+            params.append(self.min_copies)
+            conditions.append(f"""uc.card_id IN (
+                SELECT uc.card_id {self.FROM} {self.where}
+                GROUP BY uc.card_id HAVING COUNT(*) >= ${len(params)}
+            )""")
+        return conditions
+
+    def after_cursor(self, cursor: tuple, params: list) -> str:
+        """Condición de las filas que siguen al cursor, sobre la columna base para
+        poder usar el índice. Postgres ordena NULL al final en ASC y al principio
+        en DESC, y una comparación de filas con NULL nunca es verdadera."""
+        value, unique_id = cursor
+        col = self.order_column
+        op = "<" if self.order_dir == "DESC" else ">"
+        params.append(unique_id)
+        uid = f"${len(params)}"
+        if value is None:
+            if self.order_dir == "DESC":
+                return f"(({col} IS NULL AND uc.unique_id < {uid}) OR {col} IS NOT NULL)"
+            return f"({col} IS NULL AND uc.unique_id > {uid})"
+        params.append(value)
+        row = f"({col}, uc.unique_id) {op} (${len(params)}, {uid})"
+        if self.order_dir == "DESC":
+            return row
+        return f"({row} OR {col} IS NULL)"
+
+    def reset(self):
+        self.cursors.clear()
+
+    async def count(self) -> int:
+        params = list(self.params)
+        conditions = [self.where] + [f"AND {c}" for c in self.filters(params)]
+        pool = get_pool()
         async with pool.acquire() as conn:
-            idol_row = await conn.fetchrow("SELECT * FROM cards_idol WHERE card_id = $1", row["card_id"])
-            idol_base_row = await conn.fetchrow("SELECT * FROM idol_base WHERE idol_id = $1", row["idol_id"])
-            user_card_row = await conn.fetchrow("SELECT * FROM user_idol_cards WHERE unique_id = $1", row['unique_id'])
-        
-            have_it = ""
-            if main_user:
-                have_card = await conn.fetchrow("SELECT * FROM user_idol_cards WHERE card_id = $1 AND user_id = $2", row["card_id"], main_user)
-                if have_card:
-                    have_it = "✅"
-                else:
-                    have_it = "❌"
-        
-        name = idol_row['idol_name']
-        card_set = idol_row['set_name']
-        rarity = idol_row['rarity']
-        group_name = idol_row['group_name']
-
-        c_rarity = rarity
-        if rarity == "Regular":
-            model = idol_row['rarity_id'][1]
-            level = idol_row['rarity_id'][2]
-            rarity += f" {model} - Lvl.{level}"
-
-        blocked = "🔐" if row["is_locked"] else ""
-        c_status = ""
-        if row['status'] == 'equipped':
-            c_status = "👥"
-        elif row['status'] == "trading":
-            c_status = "🔄"
-        elif row['status'] == "on_sale":
-            c_status = "💲"
-        elif row['status'] == "giveaway":
-            c_status = "🎁"
-
-        RARITY_COLORS = {
-            "Regular": discord.Color.light_gray(),
-            "Special": discord.Color.purple(),
-            "Limited": discord.Color.yellow(),
-            "FCR": discord.Color.orange(),
-            "POB": discord.Color.blue(),
-            "Legacy": discord.Color.dark_purple(),
-        }
-        embed_color = RARITY_COLORS.get(c_rarity, discord.Color.default())
-
-        cantidad_copias = ""
-        if card_counts[row['card_id']] > 1:
-            cantidad_copias = f" `x{card_counts[row['card_id']]} copias`"
-
-        embed = discord.Embed(
-            title=f"{have_it}{name} - *{group_name}*{cantidad_copias} {blocked}{c_status}",
-            description=f"{card_set} `{rarity}`",
-            color=embed_color
-        )
-
-        image_url = f"https://res.cloudinary.com/dyvgkntvd/image/upload/f_webp,d_no_image.jpg/{row['card_id']}.webp{version}"
-        embed.set_thumbnail(url=image_url)
+            return await conn.fetchval(f"SELECT COUNT(*) {self.FROM} {' '.join(conditions)}", *params)
+
+    async def fetch_page(self, page: int, per_page: int) -> list:
+        params = list(self.params)
+        conditions = self.filters(params)
+
+        offset = 0
+        cursor = self.cursors.get(page)
+        if cursor:
+            conditions.append(self.after_cursor(cursor, params))
+        elif page > 0:
+            # Salto a una página sin cursor conocido (p. ej. de la primera a la última)
+            offset = page * per_page
+
+        where = " ".join([self.where] + [f"AND {c}" for c in conditions])
+        query = f"""
+            SELECT {self.COLUMNS} {self.FROM}
+            {where}
+            ORDER BY {self.order_column} {self.order_dir}, uc.unique_id {self.order_dir}
+            LIMIT {per_page + 1} OFFSET {offset}
+        """
+        if self.with_copies:
+            # Copias de cada carta dentro del mismo filtro, solo para las filas de la página
+            query = f"""
+                SELECT page.*, (
+                    SELECT COUNT(*) {self.FROM} {self.where} AND uc.card_id = page.card_id
+                ) AS copies
+                FROM ({query}) page
+                ORDER BY page.{self.order_key} {self.order_dir}, page.unique_id {self.order_dir}
+            """
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(query, *params)
 
-        skills = ""
-        if user_card_row['p_skill']:
-            skills += get_emoji(guild, "PassiveSkill")
-        if user_card_row['a_skill']:
-            skills += get_emoji(guild, "ActiveSkill")
-        if user_card_row['s_skill']:
-            skills += get_emoji(guild, "SupportSkill")
-        if user_card_row['u_skill']:
-            skills += get_emoji(guild, "UltimateSkill")
-
-        vocal = idol_row['vocal'] - idol_base_row['vocal']
-        rap = idol_row['rap'] - idol_base_row['rap']
-        dance = idol_row['dance'] - idol_base_row['dance']
-        visual = idol_row['visual'] - idol_base_row['visual']
-        energy = idol_row['energy'] - 50
-
-        if is_detailed:
-            embed.add_field(name=f"**🎤 Vocal: {idol_base_row['vocal']} (+{vocal})**", value=f"**🎶 Rap: {idol_base_row['rap']} (+{rap})**", inline=True)
-            embed.add_field(name=f"**💃 Dance: {idol_base_row['dance']} (+{dance})**", value=f"**✨ Visual: {idol_base_row['visual']} (+{visual})**", inline=True)
-            embed.add_field(name=f"**⚡ Energy: 50 (+{energy})**", value=f"**Skills: {skills}**", inline=True)
+        page_rows = rows[:per_page]
+        if len(rows) > per_page:
+            last = page_rows[-1]
+            self.cursors[page + 1] = (last[self.order_key], last['unique_id'])
+        return page_rows
 
-        embed.set_footer(text=f"{row['card_id']}.{row['unique_id']}")
-        embeds.append(embed)
+async def generate_idol_card_embeds(rows: list, pool, guild: discord.Guild, is_detailed:bool, main_user = None) -> list[discord.Embed]:
+    """Genera los embeds de una página de cartas de idols.
+    Las filas ya traen user_idol_cards, cards_idol y las copias (IdolCardQuery), idol_base sale
+    del catálogo y la posesión de otra agencia se consulta una sola vez."""
+    owned = None
+    if main_user:
+        card_ids = list({row['card_id'] for row in rows})
+        async with pool.acquire() as conn:
+            owned_rows = await conn.fetch(
+                "SELECT DISTINCT card_id FROM user_idol_cards WHERE user_id = $1 AND card_id = ANY($2::text[])",
+                main_user, card_ids
+            )
+        owned = {r['card_id'] for r in owned_rows}
+
+    card_counts = {row['card_id']: row['copies'] for row in rows}
+    return [build_idol_card_embed(row, guild, is_detailed, card_counts, owned) for row in rows]
+
+def build_idol_card_embed(row, guild: discord.Guild, is_detailed: bool, card_counts: dict, owned: set = None) -> discord.Embed:
+    idol_base_row = get_catalog().idol(row["idol_id"])
+
+    have_it = ""
+    if owned is not None:
+        have_it = "✅" if row["card_id"] in owned else "❌"
+
+    name = row['idol_name']
+    card_set = row['set_name']
+    rarity = row['rarity']
+    group_name = row['group_name']
+
+    c_rarity = rarity
+    if rarity == "Regular":
+        model = row['rarity_id'][1]
+        level = row['rarity_id'][2]
+        rarity += f" {model} - Lvl.{level}"
+
+    blocked = "🔐" if row["is_locked"] else ""
+    c_status = ""
+    if row['status'] == 'equipped':
+        c_status = "👥"
+    elif row['status'] == "trading":
+        c_status = "🔄"
+    elif row['status'] == "on_sale":
+        c_status = "💲"
+    elif row['status'] == "giveaway":
+        c_status = "🎁"
+
+    RARITY_COLORS = {
+        "Regular": discord.Color.light_gray(),
+        "Special": discord.Color.purple(),
+        "Limited": discord.Color.yellow(),
+        "FCR": discord.Color.orange(),
+        "POB": discord.Color.blue(),
+        "Legacy": discord.Color.dark_purple(),
+    }
+    embed_color = RARITY_COLORS.get(c_rarity, discord.Color.default())
+
+    cantidad_copias = ""
+    if card_counts.get(row['card_id'], 1) > 1:
+        cantidad_copias = f" `x{card_counts[row['card_id']]} copias`"
+
+    embed = discord.Embed(
+        title=f"{have_it}{name} - *{group_name}*{cantidad_copias} {blocked}{c_status}",
+        description=f"{card_set} `{rarity}`",
+        color=embed_color
+    )
 
-    return embeds
+    image_url = f"https://res.cloudinary.com/dyvgkntvd/image/upload/f_webp,d_no_image.jpg/{row['card_id']}.webp{version}"
+    embed.set_thumbnail(url=image_url)
+
+    skills = ""
+    if row['p_skill']:
+        skills += get_emoji(guild, "PassiveSkill")
+    if row['a_skill']:
+        skills += get_emoji(guild, "ActiveSkill")
+    if row['s_skill']:
+        skills += get_emoji(guild, "SupportSkill")
+    if row['u_skill']:
+        skills += get_emoji(guild, "UltimateSkill")
+
+    vocal = row['vocal'] - idol_base_row['vocal']
+    rap = row['rap'] - idol_base_row['rap']
+    dance = row['dance'] - idol_base_row['dance']
+    visual = row['visual'] - idol_base_row['visual']
+    energy = row['energy'] - 50
+
+    if is_detailed:
+        embed.add_field(name=f"**🎤 Vocal: {idol_base_row['vocal']} (+{vocal})**", value=f"**🎶 Rap: {idol_base_row['rap']} (+{rap})**", inline=True)
+        embed.add_field(name=f"**💃 Dance: {idol_base_row['dance']} (+{dance})**", value=f"**✨ Visual: {idol_base_row['visual']} (+{visual})**", inline=True)
+        embed.add_field(name=f"**⚡ Energy: 50 (+{energy})**", value=f"**Skills: {skills}**", inline=True)
+
+    embed.set_footer(text=f"{row['card_id']}.{row['unique_id']}")
+    return embed
 
 class CardDetailButton(discord.ui.Button):
     def __init__(self, row_data: dict, paginator: "InventoryEmbedPaginator"):
@@ -2325,8 +2336,6 @@ class CardDetailButton(discord.ui.Button):
         super().__init__(label=label, style=discord.ButtonStyle.primary)
 
         self.paginator = paginator
-        self.base_query = paginator.base_query
-        self.query_params = paginator.query_params
 
     async def callback(self, interaction: discord.Interaction):
         pool = get_pool()
@@ -2581,36 +2590,7 @@ class BackToInventoryButton(discord.ui.Button):
 
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        pool = get_pool()
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(self.paginator.base_query, *self.paginator.query_params)
-
-        if not rows:
-            await interaction.response.edit_message(
-                content="⚠️ No se encontraron cartas con esta búsqueda.",
-                embed=None,
-                view=None
-            )
-            return
-        card_counts = Counter([row['card_id'] for row in rows])
-        if self.paginator.is_duplicated:
-            rows = [row for row in rows if card_counts[row['card_id']] >= 2]
-        else:
-            rows = [row for row in rows if card_counts[row['card_id']] >= 1]
-            
-
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, self.paginator.is_detailed)
-        new_paginator = InventoryEmbedPaginator(
-            embeds,
-            rows,
-            interaction,
-            base_query=self.paginator.base_query,
-            query_params=self.paginator.query_params,
-            is_duplicated=self.paginator.is_duplicated,
-            is_detailed=self.paginator.is_detailed,
-            embeds_per_page=self.paginator.embeds_per_page
-        )
-        await new_paginator.restart(interaction)
+        await self.paginator.restart(interaction)
 
 class LockButton(discord.ui.Button):
     def __init__(self, row_data, paginator: "InventoryEmbedPaginator", lockable:bool):
@@ -2625,35 +2605,8 @@ class LockButton(discord.ui.Button):
             await conn.execute("UPDATE user_idol_cards SET is_locked = $1 WHERE card_id = $2 AND user_id = $3",
                                False, self.row_data['card_id'], interaction.user.id)
             await conn.execute("UPDATE user_idol_cards SET is_locked = $1 WHERE unique_id = $2", True, self.row_data['unique_id'])
-            
-            rows = await conn.fetch(self.paginator.base_query, *self.paginator.query_params)
-            
-        if not rows:
-            await interaction.response.edit_message(
-                content="⚠️ No se encontraron cartas con esta búsqueda.",
-                embed=None,
-                view=None
-            )
-            return
-        card_counts = Counter([row['card_id'] for row in rows])
-        if self.paginator.is_duplicated:
-            rows = [row for row in rows if card_counts[row['card_id']] >= 2]
-        else:
-            rows = [row for row in rows if card_counts[row['card_id']] >= 1]
-            
 
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, self.paginator.is_detailed)
-        new_paginator = InventoryEmbedPaginator(
-            embeds,
-            rows,
-            interaction,
-            base_query=self.paginator.base_query,
-            query_params=self.paginator.query_params,
-            is_duplicated=self.paginator.is_duplicated,
-            is_detailed=self.paginator.is_detailed,
-            embeds_per_page=self.paginator.embeds_per_page
-        )
-        await new_paginator.restart(interaction)
+        await self.paginator.restart(interaction)
 
 class UnlockButton(discord.ui.Button):
     def __init__(self, row_data, paginator: "InventoryEmbedPaginator", unlockable: bool):
@@ -2668,35 +2621,8 @@ class UnlockButton(discord.ui.Button):
         pool = get_pool()
         async with pool.acquire() as conn:
             await conn.execute("UPDATE user_idol_cards SET is_locked = $1 WHERE unique_id = $2", False, self.row_data['unique_id'])
-            
-            rows = await conn.fetch(self.paginator.base_query, *self.paginator.query_params)
-            
-        if not rows:
-            await interaction.response.edit_message(
-                content="⚠️ No se encontraron cartas con esta búsqueda.",
-                embed=None,
-                view=None
-            )
-            return
-        card_counts = Counter([row['card_id'] for row in rows])
-        if self.paginator.is_duplicated:
-            rows = [row for row in rows if card_counts[row['card_id']] >= 2]
-        else:
-            rows = [row for row in rows if card_counts[row['card_id']] >= 1]
-            
 
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, self.paginator.is_detailed)
-        new_paginator = InventoryEmbedPaginator(
-            embeds,
-            rows,
-            interaction,
-            base_query=self.paginator.base_query,
-            query_params=self.paginator.query_params,
-            is_duplicated=self.paginator.is_duplicated,
-            is_detailed=self.paginator.is_detailed,
-            embeds_per_page=self.paginator.embeds_per_page
-        )
-        await new_paginator.restart(interaction)
+        await self.paginator.restart(interaction)
 
 class EquipButton(discord.ui.Button):
     def __init__(self, row_data: dict, paginator: "InventoryEmbedPaginator"):
@@ -2833,16 +2759,7 @@ class ConfirmEquipIdolButton(discord.ui.Button):
         card_full_id = f"{self.parent.card['card_id']}.{self.parent.card['unique_id']}"
         # Obtener nombre para el mensaje final
         async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'equip_card'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "equip_card")
             
             name_row = await conn.fetchrow(
                 "SELECT idol_name FROM cards_idol WHERE card_id = $1", 
@@ -2879,26 +2796,8 @@ class ConfirmEquipIdolButton(discord.ui.Button):
                 self.parent.card["unique_id"]
             )
             print("status cambiado a: equipada")
-            
-            rows = await conn.fetch(
-                self.parent.paginator.base_query,
-                *self.parent.paginator.query_params
-            )
 
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, self.parent.paginator.is_detailed)
-
-        new_paginator = InventoryEmbedPaginator(
-            embeds=embeds,
-            rows=rows,
-            interaction=interaction,
-            base_query=self.parent.paginator.base_query,
-            query_params=self.parent.paginator.query_params,
-            embeds_per_page=self.parent.paginator.embeds_per_page,
-            is_duplicated=self.parent.paginator.is_duplicated,
-            is_detailed=self.parent.paginator.is_detailed
-        )
-
-        await new_paginator.restart(interaction)
+        await self.parent.paginator.restart(interaction)
 
 
 class DesequipButton(discord.ui.Button):
@@ -2977,24 +2876,9 @@ class ConfirmUnequipButton(discord.ui.Button):
                 """,
                 unique_id
             )
-            # 3) Re-consultar las rows originales
-            rows = await conn.fetch(self.parent.paginator.base_query,
-                                    *self.parent.paginator.query_params)
 
-        # 4) Regenerar embeds
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, self.parent.paginator.is_detailed)
-        new_pag = InventoryEmbedPaginator(
-            embeds=embeds,
-            rows=rows,
-            interaction=interaction,
-            base_query=self.parent.paginator.base_query,
-            query_params=self.parent.paginator.query_params,
-            is_duplicated=self.parent.paginator.is_duplicated,
-            is_detailed=self.parent.paginator.is_detailed,
-            embeds_per_page=self.parent.paginator.embeds_per_page
-        )
-        # 5) Reiniciar el paginador
-        await new_pag.restart(interaction)
+        # 3) Reiniciar el paginador con la consulta original
+        await self.parent.paginator.restart(interaction)
 
 class CancelUnequipButton(discord.ui.Button):
     def __init__(self, paginator: "InventoryEmbedPaginator"):
@@ -3004,23 +2888,7 @@ class CancelUnequipButton(discord.ui.Button):
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
         # simplemente regenerar inventario
-        pool = get_pool()
-        rows = await pool.acquire().__aenter__()  # para simplificar…
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(self.paginator.base_query,
-                                    *self.paginator.query_params)
-        embeds = await generate_idol_card_embeds(rows, pool, interaction.guild, self.paginator.is_detailed)
-        new_pag = InventoryEmbedPaginator(
-            embeds=embeds,
-            rows=rows,
-            interaction=interaction,
-            base_query=self.paginator.base_query,
-            query_params=self.paginator.query_params,
-            is_duplicated=self.paginator.is_duplicated,
-            is_detailed=self.paginator.is_detailed,
-            embeds_per_page=self.paginator.embeds_per_page
-        )
-        await new_pag.restart(interaction)
+        await self.paginator.restart(interaction)
         
 
 class PreviousPageButton(discord.ui.Button):
@@ -3039,50 +2907,46 @@ class NextPageButton(discord.ui.Button):
     async def callback(self, interaction: discord.Interaction):
         await self.paginator.next_page(interaction)
 
-class InventoryEmbedPaginator:
+class InventoryEmbedPaginator(LazyPaginator):
     def __init__(
         self,
-        embeds: list[discord.Embed],
-        rows: list[dict],
+        source: IdolCardQuery,
         interaction: discord.Interaction,
-        base_query: str,
-        query_params: tuple,
         is_duplicated: bool,
         is_detailed: bool,
-        embeds_per_page: int = 3
+        embeds_per_page: int = 3,
+        main_user: int = None
     ):
-        self.all_embeds = embeds
-        self.all_rows = rows
+        super().__init__(source.fetch_page, self.render_page, embeds_per_page, total=0)
+        self.source = source
         self.interaction = interaction
-        self.embeds_per_page = embeds_per_page
-        self.current_page = 0
-        self.total_pages = (len(embeds) + embeds_per_page - 1) // embeds_per_page
-        self.current_page_embeds: list[discord.Embed] = []
-
-        self.base_query = base_query
-        self.query_params = query_params
         self.is_duplicated = is_duplicated
         self.is_detailed = is_detailed
-    
-    def get_page_embeds(self):
-        start = self.current_page * self.embeds_per_page
-        end = start + self.embeds_per_page
-        page = self.all_embeds[start:end]
-        # al final, pie de página con info de paginación
-        footer = discord.Embed(
-            description=f"### Total: {len(self.all_embeds)}\n**Página** {self.current_page+1}/{self.total_pages}",
+        self.main_user = main_user
+        self.current_page_embeds: list[discord.Embed] = []
+
+    async def render_page(self, rows: list) -> list[discord.Embed]:
+        return await generate_idol_card_embeds(rows, get_pool(), self.interaction.guild, self.is_detailed, main_user=self.main_user)
+
+    async def load(self) -> int:
+        """Reinicia cursores y caché y recalcula el total con un COUNT."""
+        self.source.reset()
+        self.page_cache.clear()
+        self.current_page = 0
+        self.total = await self.source.count()
+        self.total_pages = max(1, (self.total + self.embeds_per_page - 1) // self.embeds_per_page)
+        return self.total
+
+    def page_header_embed(self) -> discord.Embed:
+        return discord.Embed(
+            description=f"### Total: {self.total}\n**Página** {self.current_page+1}/{self.total_pages}",
             color=discord.Color.dark_gray()
         )
-        return [footer] + page
 
     def get_view(self):
         view = discord.ui.View(timeout=120)
         # botones de detalles para cada embed de carta (sin contar el footer)
-        start = self.current_page * self.embeds_per_page
-        end = start + self.embeds_per_page
-        rows_this_page = self.all_rows[start:end]
-
-        for row in rows_this_page:
+        for row in self.current_rows:
             view.add_item(CardDetailButton(row, self))
 
         # navegación
@@ -3091,15 +2955,22 @@ class InventoryEmbedPaginator:
         return view
 
     async def start(self):
-        self.current_page_embeds = self.get_page_embeds()
+        self.current_page_embeds = await self.fetch_current_embeds()
         await self.interaction.edit_original_response(
             embeds=self.current_page_embeds,
             view=self.get_view()
         )
 
     async def restart(self, interaction: discord.Interaction):
-        self.current_page = 0  # Reiniciar la página
-        self.current_page_embeds = self.get_page_embeds()
+        # Reiniciar la página con datos frescos
+        if not await self.load():
+            await interaction.edit_original_response(
+                content="⚠️ No se encontraron cartas con esta búsqueda.",
+                embeds=[],
+                view=None
+            )
+            return
+        self.current_page_embeds = await self.fetch_current_embeds()
         await interaction.edit_original_response(
             content="",
             embeds=self.current_page_embeds,
@@ -3107,7 +2978,7 @@ class InventoryEmbedPaginator:
         )
 
     async def update(self, interaction: discord.Interaction):
-        self.current_page_embeds = self.get_page_embeds()
+        self.current_page_embeds = await self.fetch_current_embeds()
         await interaction.response.edit_message(
             content="",
             embeds=self.current_page_embeds,
@@ -3122,8 +2993,73 @@ class InventoryEmbedPaginator:
         self.current_page = (self.current_page + 1) % self.total_pages
         await self.update(interaction)
 
-
 # --- /cards
+async def generate_search_card_embeds(rows: list, pool, guild: discord.Guild) -> list[discord.Embed]:
+    """Embeds de una página de /cards search; los dueños se consultan una sola vez por página."""
+    async with pool.acquire() as conn:
+        user_rows = await conn.fetch(
+            "SELECT user_id, agency_name FROM users WHERE user_id = ANY($1::bigint[])",
+            list({card['user_id'] for card in rows})
+        )
+    agencies = {u['user_id']: u['agency_name'] for u in user_rows}
+
+    embeds = []
+    for card in rows:
+        c_rarity=""
+        if card['rarity'] == "Regular":
+            c_rarity = f"{card['rarity']} {card['rarity_id'][1]} - Lvl.{card['rarity_id'][2]}"
+        else:
+            c_rarity = f"{card['rarity']}"
+            
+        status = ""
+        if card['status'] == 'equipped':
+            status = "👥"
+        elif card['status'] == "trading":
+            status = "🔄"
+        elif card['status'] == "on_sale":
+            status = "💲"
+        elif card['status'] == "giveaway":
+            status = "🎁"
+        
+        if card['is_locked']:
+            status += "🔐"
+        
+        propietario = f"\nAgencia: **{agencies.get(card['user_id'])}**\nCEO: <@{card['user_id']}>"
+        
+        RARITY_COLORS = {
+            "Regular": discord.Color.light_gray(),
+            "Special": discord.Color.purple(),
+            "Limited": discord.Color.yellow(),
+            "FCR": discord.Color.orange(),
+            "POB": discord.Color.blue(),
+            "Legacy": discord.Color.dark_purple(),
+        }
+        embed_color = RARITY_COLORS.get(card['rarity'], discord.Color.default())
+        
+        skills = ""
+        if card['p_skill']:
+            skills += f"{get_emoji(guild, "PassiveSkill")}"
+        if card['a_skill']:
+            skills += f"{get_emoji(guild, "ActiveSkill")}"
+        if card['s_skill']:
+            skills += f"{get_emoji(guild, "SupportSkill")}"
+        if card['u_skill']:
+            skills += f"{get_emoji(guild, "UltimateSkill")}"
+            
+        embed = discord.Embed(
+            title=f"{skills} {card['idol_name']} - _{card['group_name']}_ {status}",
+            description=f"{card['set_name']} `{c_rarity}`{propietario}",
+            color=embed_color
+        )
+        
+        image_url = f"https://res.cloudinary.com/dyvgkntvd/image/upload/f_webp,d_no_image.jpg/{card['card_id']}.webp{version}"
+        embed.set_thumbnail(url=image_url)
+        
+        embed.set_footer(text=f"{card["card_id"]}.{card['unique_id']}")
+        embeds.append(embed)
+
+    return embeds
+
 class CardGroup(app_commands.Group):
     def __init__(self):
         super().__init__(name="cards", description="Manage idol and item cards")
@@ -3456,7 +3392,7 @@ class CardGroup(app_commands.Group):
         uid_1 = card_1.split(".")[1]
         uid_2 = card_2.split(".")[1]
 
-        pool = await get_pool()
+        pool = get_pool()
         async with pool.acquire() as conn:
             rows = await conn.fetch("""
                 SELECT * FROM user_idol_cards
@@ -3517,19 +3453,10 @@ class CardGroup(app_commands.Group):
                 ephemeral=True
             )
         user_id = interaction.user.id
-        pool = await get_pool()
+        pool = get_pool()
 
         async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_fusion'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "view_fusion")
             
             rows = await conn.fetch("""
                 SELECT uc.unique_id, uc.card_id, uc.idol_id, uc.set_id, uc.rarity_id,
@@ -3611,7 +3538,7 @@ class CardGroup(app_commands.Group):
         
         
         
-        pool = await get_pool()
+        pool = get_pool()
 
         async with pool.acquire() as conn:
             rows = await conn.fetch("""
@@ -3711,7 +3638,7 @@ class CardGroup(app_commands.Group):
         except IndexError:
             return await interaction.response.send_message("❌ El formato del ID es incorrecto.", ephemeral=True)
 
-        pool = await get_pool()
+        pool = get_pool()
         async with pool.acquire() as conn:
             row = await conn.fetchrow("""
                 SELECT * FROM user_idol_cards WHERE unique_id = $1 AND user_id = $2
@@ -3806,10 +3733,7 @@ class CardGroup(app_commands.Group):
         pool = get_pool()
         guild = interaction.guild
 
-        base_query = """
-            SELECT uc.*, ci.* FROM user_idol_cards uc
-            JOIN cards_idol ci ON uc.card_id = ci.card_id
-        """
+        base_query = "WHERE TRUE"
         params = []
         idx = 1
         
@@ -3862,78 +3786,16 @@ class CardGroup(app_commands.Group):
             order_dir = order.value
         if not order and not order_by:
             order_dir = "DESC"
-        base_query += f" ORDER BY {order_column} {order_dir}"
-        
-        
-        
-        
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(base_query, *params)
 
+        source = IdolCardQuery(base_query, params, order_column, order_dir)
+        total = await source.count()
+        if not total:
+            return await interaction.response.send_message("❌ No se encontró ninguna carta de este tipo", ephemeral=True)
 
-            if not rows:
-                return await interaction.response.send_message("❌ No se encontró ninguna carta de este tipo", ephemeral=True)
-
-            embeds = []
-            for card in rows:
-                c_rarity=""
-                if card['rarity'] == "Regular":
-                    c_rarity = f"{card['rarity']} {card['rarity_id'][1]} - Lvl.{card['rarity_id'][2]}"
-                else:
-                    c_rarity = f"{card['rarity']}"
-                    
-                status = ""
-                if card['status'] == 'equipped':
-                    status = "👥"
-                elif card['status'] == "trading":
-                    status = "🔄"
-                elif card['status'] == "on_sale":
-                    status = "💲"
-                elif card['status'] == "giveaway":
-                    status = "🎁"
-                
-                if card['is_locked']:
-                    status += "🔐"
-            
-                
-                user_row = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", card['user_id'])    
-                propietario = f"\nAgencia: **{user_row['agency_name']}**\nCEO: <@{user_row['user_id']}>"
-                
-                RARITY_COLORS = {
-                    "Regular": discord.Color.light_gray(),
-                    "Special": discord.Color.purple(),
-                    "Limited": discord.Color.yellow(),
-                    "FCR": discord.Color.orange(),
-                    "POB": discord.Color.blue(),
-                    "Legacy": discord.Color.dark_purple(),
-                }
-                embed_color = RARITY_COLORS.get(card['rarity'], discord.Color.default())
-                
-                skills = ""
-                if card['p_skill']:
-                    skills += f"{get_emoji(guild, "PassiveSkill")}"
-                if card['a_skill']:
-                    skills += f"{get_emoji(guild, "ActiveSkill")}"
-                if card['s_skill']:
-                    skills += f"{get_emoji(guild, "SupportSkill")}"
-                if card['u_skill']:
-                    skills += f"{get_emoji(guild, "UltimateSkill")}"
-                    
-                embed = discord.Embed(
-                    title=f"{skills} {card['idol_name']} - _{card['group_name']}_ {status}",
-                    description=f"{card['set_name']} `{c_rarity}`{propietario}",
-                    color=embed_color
-                )
-                
-                
-                image_url = f"https://res.cloudinary.com/dyvgkntvd/image/upload/f_webp,d_no_image.jpg/{card['card_id']}.webp{version}"
-                embed.set_thumbnail(url=image_url)
-                
-                
-                embed.set_footer(text=f"{card["card_id"]}.{card['unique_id']}")
-                embeds.append(embed)
+        async def render_page(page_rows):
+            return await generate_search_card_embeds(page_rows, pool, guild)
 
-        paginator = Paginator(embeds)
+        paginator = LazyPaginator(source.fetch_page, render_page, total=total)
         await paginator.start(interaction)
 
     @search_card.autocomplete("idol")
@@ -3982,7 +3844,7 @@ class ConfirmRefundView(discord.ui.View):
         if interaction.user.id != self.user_id:
             return await interaction.response.send_message("❌ No puedes usar este botón.", ephemeral=True)
 
-        pool = await get_pool()
+        pool = get_pool()
         async with pool.acquire() as conn:
             if self.item_type == "idol":
                 tabla = "user_idol_cards"
@@ -4042,7 +3904,7 @@ class ConfirmFusionView(discord.ui.View):
         if interaction.user.id != self.user_id:
             return await interaction.response.send_message("❌ No puedes usar este botón.", ephemeral=True)
 
-        pool = await get_pool()
+        pool = get_pool()
         xp = 150
         async with pool.acquire() as conn:
             
@@ -4065,16 +3927,7 @@ class ConfirmFusionView(discord.ui.View):
                     embed=None, view=None
                 )
             
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'try_fusion'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "try_fusion")
 
             msg = await interaction.response.edit_message(
                 content="## 🔮 Realizando fusión...\n",
@@ -4130,16 +3983,7 @@ class ConfirmFusionView(discord.ui.View):
                 return
 
 
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'fusion'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "fusion")
             
             await conn.execute("""
                 DELETE FROM user_idol_cards
@@ -4195,7 +4039,7 @@ class ConfirmFusionView(discord.ui.View):
                     final_skills[second_type] = skill_row["skill_name"]
                 
             
-            new_uid = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+            new_uid = await new_unique_id(conn)
             await conn.execute("""
                 INSERT INTO user_idol_cards (unique_id, user_id, card_id, idol_id, set_id, rarity_id, p_skill, a_skill, s_skill)
                 VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
@@ -4303,18 +4147,9 @@ class ConfirmLevelUpView(discord.ui.View):
         if interaction.user.id != self.user_id:
             return await interaction.response.send_message("❌ No puedes usar este botón.", ephemeral=True)
 
-        pool = await get_pool()
+        pool = get_pool()
         async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'level_up'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "level_up")
             
             # Verificar que ambas cartas aún estén disponibles
             rows = await conn.fetch("""
@@ -4377,11 +4212,11 @@ class ConfirmLevelUpView(discord.ui.View):
             """, self.cost, xp, self.user_id)
 
             # Insertar nueva carta
-            new_unique_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+            new_uid = await new_unique_id(conn)
             await conn.execute("""
                 INSERT INTO user_idol_cards (unique_id, user_id, card_id, idol_id, set_id, rarity_id, p_skill, a_skill, s_skill)
                 VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            """, new_unique_id, self.user_id, self.nuevo_card_id, self.idol_id, self.set_id, self.rarity_id, p_skill, a_skill, s_skill)
+            """, new_uid, self.user_id, self.nuevo_card_id, self.idol_id, self.set_id, self.rarity_id, p_skill, a_skill, s_skill)
 
         # Mostrar resultado final
         final_embed = discord.Embed(
@@ -1,10 +1,12 @@
-import discord, random, string
+import discord, random
 from datetime import timezone, datetime, timedelta
 from discord.ext import commands
 from discord import app_commands
 from utils.language import get_user_language
 from utils.localization import get_translation
 from db.connection import get_pool
+from db import mission_events
+from db.unique_ids import new_unique_id
 
 class MissionsGroup(app_commands.Group):
     def __init__(self):
@@ -77,11 +79,7 @@ class ConfirmClaimView(discord.ui.View):
             reward_desc = ""
             
             if reward == "pack":
-                while True:
-                    new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                    exists = await conn.fetchval("SELECT 1 FROM players_packs WHERE unique_id = $1", new_id)
-                    if not exists:
-                        break
+                new_id = await new_unique_id(conn)
                 reward_d = await conn.fetchval("SELECT name FROM packs WHERE pack_id = $1", row['pack_id'])
                 reward_desc = f"📦 {reward_d}"
                 await conn.execute("""
@@ -190,6 +188,7 @@ class ConfirmCancelView(discord.ui.View):
 
 
 async def build_missions_embed_view_for_user(user_id: int):
+    await mission_events.flush()  # que el progreso pendiente se vea al instante
     pool = get_pool()
     language = await get_user_language(user_id)
     async with pool.acquire() as conn:
@@ -1,10 +1,11 @@
-import discord, random, string
+import discord, random
 from datetime import timezone, datetime
 from discord.ext import commands
 from discord import app_commands
 from utils.language import get_user_language
 from utils.localization import get_translation
 from db.connection import get_pool
+from db.unique_ids import new_unique_id
 from commands.starter import version
 
 class ModGroup(app_commands.Group):
@@ -107,11 +108,7 @@ class ModGroup(app_commands.Group):
                 reward_credits, user.id
             )
             
-            while True:
-                new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                exists = await conn.fetchval("SELECT 1 FROM players_packs WHERE unique_id = $1", new_id)
-                if not exists:
-                    break
+            new_id = await new_unique_id(conn)
             await conn.execute(
                 """
                 INSERT INTO players_packs (pack_id, unique_id, user_id, buy_date)
@@ -162,15 +159,7 @@ class ModGroup(app_commands.Group):
                 await interaction.response.send_message(f"❌ La carta `{card_id}` no existe.", ephemeral=True)
                 return
             
-            unique_id = ""
-            while True:
-                caracteres = string.ascii_lowercase + string.digits
-                new_id = ''.join(random.choice(caracteres) for _ in range(5))
-                
-                row = await conn.fetchrow("SELECT * FROM user_idol_cards WHERE unique_id = $1", new_id)
-                if not row:
-                    unique_id = new_id
-                    break
+            unique_id = await new_unique_id(conn)
             idol_id = card_row['idol_id']
             set_id = card_row['set_id']
             rarity_id = card_row['rarity_id']
@@ -371,13 +360,7 @@ class ModGroup(app_commands.Group):
                 await interaction.response.send_message(f"❌ El pack `{pack_id}` no existe.", ephemeral=True)
                 return
 
-            unique_id = ""
-            while True:
-                new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                row = await conn.fetchrow("SELECT 1 FROM players_packs WHERE unique_id = $1", new_id)
-                if not row:
-                    unique_id = new_id
-                    break
+            unique_id = await new_unique_id(conn)
 
             values = (
                 unique_id,
@@ -471,15 +454,7 @@ class ModGroup(app_commands.Group):
                 await interaction.response.send_message(f"❌ La carta `{card_id}` no existe.", ephemeral=True)
                 return
             
-            unique_id = ""
-            while True:
-                caracteres = string.ascii_lowercase + string.digits
-                new_id = ''.join(random.choice(caracteres) for _ in range(5))
-                
-                row = await conn.fetchrow("SELECT * FROM user_idol_cards WHERE unique_id = $1", new_id)
-                if not row:
-                    unique_id = new_id
-                    break
+            unique_id = await new_unique_id(conn)
             idol_id = card_row['idol_id']
             set_id = card_row['set_id']
             rarity_id = card_row['rarity_id']
@@ -1,11 +1,15 @@
-import discord, asyncio, random, string, logging
+import discord, asyncio, logging
 from discord.ext import commands
 from discord import app_commands
 from utils.localization import get_translation
 from utils.language import get_user_language
 from db.connection import get_pool
+from db.unique_ids import new_unique_id, new_unique_ids
+from utils.pack_engine import draw_pack, insert_draws
 from datetime import timezone, datetime
+from collections import Counter
 from utils.paginator import Paginator, PreviousButton, NextButton
+from db import mission_events
 from commands.starter import version as v
 
 version = v
@@ -72,7 +76,7 @@ class PacksGroup(app_commands.Group):
                 ephemeral=True
             )
         user_id = interaction.user.id
-        pool = await get_pool()
+        pool = get_pool()
 
         async with pool.acquire() as conn:
             # Obtener todos los packs del usuario con info del pack
@@ -120,6 +124,84 @@ class PacksGroup(app_commands.Group):
 
 
 
+    @app_commands.command(name="open_all", description="Abrir todos tus packs de una vez")
+    @app_commands.describe(pack_id="(opcional) Abrir solo los packs de este tipo")
+    async def open_all(self, interaction: discord.Interaction, pack_id: str = None):
+        if interaction.guild is None:
+            return await interaction.response.send_message(
+                "❌ Este comando solo está disponible en servidores.", 
+                ephemeral=True
+            )
+        user_id = interaction.user.id
+        await interaction.response.send_message("## 📦 Abriendo tus packs...", ephemeral=True)
+
+        result, pack_rows = await open_all_packs(user_id, pack_id)
+        if not pack_rows:
+            return await interaction.edit_original_response(content="No tienes packs disponibles para abrir.")
+
+        pack_counts = Counter(p['name'] for p in pack_rows)
+        embed = discord.Embed(
+            title=f"📦 {len(pack_rows)} packs abiertos",
+            description="\n".join(f"> 🎁 {name} x{n}" for name, n in pack_counts.items()),
+            color=discord.Color.gold()
+        )
+
+        errors = [r for r in result if isinstance(r, str)]
+        obtained = Counter((r[0], r[1]) for r in result if not isinstance(r, str))
+        SUMMARY_FIELDS = [
+            ("idol", "👤 Idol cards"),
+            ("item", "🎒 Items"),
+            ("performance", "🎬 Performance cards"),
+            ("redeemable", "🎟️ Canjeables")
+        ]
+        for tipo, field_name in SUMMARY_FIELDS:
+            lines = []
+            for (t, desc), n in obtained.most_common():
+                if t == tipo:
+                    desc = desc.replace("\n", " ")
+                    lines.append(f"{desc} x{n}" if n > 1 else desc)
+            if not lines:
+                continue
+            total = sum(n for (t, _), n in obtained.items() if t == tipo)
+            value = ""
+            for i, line in enumerate(lines):
+                if len(value) + len(line) > 950:
+                    value += f"... y {len(lines) - i} más"
+                    break
+                value += line + "\n"
+            embed.add_field(name=f"{field_name} ({total})", value=value, inline=False)
+
+        if errors:
+            embed.add_field(name="❌ Errores", value="\n".join(sorted(set(errors))), inline=False)
+
+        if len(pack_rows) >= MAX_OPEN_ALL:
+            embed.set_footer(text=f"Se abren hasta {MAX_OPEN_ALL} packs por vez.")
+
+        await interaction.edit_original_response(content="", embed=embed)
+        await interaction.followup.send(
+            content=f"## {interaction.user.mention} ha abierto {len(pack_rows)} packs",
+            embed=embed,
+            ephemeral=False
+        )
+
+    @open_all.autocomplete("pack_id")
+    async def open_all_autocomplete(self, interaction: discord.Interaction, current: str):
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT pp.pack_id, p.name, COUNT(*) AS amount
+                FROM players_packs pp
+                JOIN packs p ON pp.pack_id = p.pack_id
+                WHERE pp.user_id = $1
+                GROUP BY pp.pack_id, p.name
+                ORDER BY p.name
+            """, interaction.user.id)
+        return [
+            app_commands.Choice(name=f"{row['name']} (x{row['amount']})", value=row['pack_id'])
+            for row in rows if current.lower() in row['name'].lower()
+        ][:25]
+
+
     @app_commands.command(name="buy", description="Comprar un sobre de cartas")
     @app_commands.describe(
         pack="Elige un pack para comprar",
@@ -263,16 +345,7 @@ class PacksGroup(app_commands.Group):
                 SELECT * FROM packs
             """)
             
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'view_packs'
-                """, user_id)
+            mission_events.emit(user_id, "view_packs")
 
         if not rows:
             await interaction.response.send_message("No hay packs disponibles actualmente.", ephemeral=True)
@@ -353,19 +426,7 @@ class OpenPackButton(discord.ui.Button):
         self.paginator = paginator
 
     async def callback(self, interaction: discord.Interaction):
-        pool = get_pool()
-        
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'open_pack'
-                """, interaction.user.id)
+        mission_events.emit(interaction.user.id, "open_pack")
         
         await interaction.response.edit_message(content="## 📦 Abriendo el pack...", embed=None, view=None)
 
@@ -500,7 +561,7 @@ class ReturnToPacksButton(discord.ui.Button):
         self.user_id = user_id
 
     async def callback(self, interaction: discord.Interaction):
-        pool = await get_pool()
+        pool = get_pool()
 
         async with pool.acquire() as conn:
             player_packs = await conn.fetch("""
@@ -560,8 +621,7 @@ class ReturnToPacksView(discord.ui.View):
 
 
 async def open_pack(unique_id: str, user_id: int):
-    pool = await get_pool()
-    results = []
+    pool = get_pool()
     
     async with pool.acquire() as conn:
         async with conn.transaction():  # Asegura que todo se ejecute de forma atómica
@@ -582,231 +642,48 @@ async def open_pack(unique_id: str, user_id: int):
             # Eliminar el pack
             await conn.execute("DELETE FROM players_packs WHERE unique_id = $1", unique_id)
 
-            amount = pack_row["card_amount"]
-
-            tipo_weights = {
-                "idol": pack_row["w_idol"],
-                "item": pack_row["w_item"],
-                "performance": pack_row["w_performance"],
-                "redeemable": pack_row["w_redeemable"]
-            }
-
-            rarity_weights = {
-                "R_": pack_row["w_regular"],
-                "LMT": pack_row["w_limited"],
-                "FCR": pack_row["w_fcr"],
-                "POB": pack_row["w_pob"],
-                "LEG": pack_row["w_legacy"]
-            }
-
-            for _ in range(amount):
-                tipo = random.choices(list(tipo_weights.keys()), weights=tipo_weights.values())[0]
-
-                if tipo == "item":
-                    cards = await conn.fetch("SELECT * FROM cards_item")
-                    if not cards:
-                        results.append("❌ No hay items disponibles.")
-                        continue
-
-                    card = random.choices(cards, weights=[c["weight"] for c in cards])[0]
-
-                    while True:
-                        new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                        exists = await conn.fetchrow("SELECT 1 FROM user_item_cards WHERE unique_id = $1", new_id)
-                        if not exists:
-                            break
-
-                    await conn.execute("""
-                        INSERT INTO user_item_cards (unique_id, user_id, item_id, durability)
-                        VALUES ($1, $2, $3, $4)
-                    """, new_id, user_id, card["item_id"], card["max_durability"])
-                    
-                    item_desc = ""
-                    if card['type'] == "mic":
-                        item_desc = "🎤"
-                    if card['type'] == "outfit":
-                        item_desc = "👗"
-                    if card['type'] == "accessory":
-                        item_desc = "🎀"
-                    if card['type'] == "consumable":
-                        item_desc = "🧃"
-                    item_desc += f" {card['name']}"
-                    
-                    results.append(("item", item_desc, card["item_id"], new_id))
-
-                elif tipo == "performance":
-                    cards = await conn.fetch("SELECT * FROM cards_performance")
-                    if not cards:
-                        results.append("❌ No hay performance cards disponibles.")
-                        continue
-
-                    card = random.choices(cards, weights=[c["weight"] for c in cards])[0]
-
-                    await conn.execute("""
-                        INSERT INTO user_performance_cards (user_id, pcard_id, quantity, last_updated)
-                        VALUES ($1, $2, 1, now())
-                        ON CONFLICT (user_id, pcard_id) DO UPDATE SET
-                        quantity = user_performance_cards.quantity + 1,
-                        last_updated = now()
-                    """, user_id, card["pcard_id"])
-                    
-                    perf_desc = ""
-                    if card['type'] == "reinforcement":
-                        perf_desc = "🎭"
-                    if card['type'] == "stage":
-                        perf_desc = "🪩"
-                    perf_desc += f" {card['name']}"
-                    results.append(("performance", perf_desc, card["pcard_id"], None))
-
-                elif tipo == "redeemable":
-                    cards = await conn.fetch("SELECT * FROM redeemables")
-                    if not cards:
-                        results.append("❌ No hay redeemables disponibles.")
-                        continue
-
-                    card = random.choices(cards, weights=[c["weight"] for c in cards])[0]
-
-                    await conn.execute("""
-                        INSERT INTO user_redeemables (user_id, redeemable_id, quantity, last_updated)
-                        VALUES ($1, $2, 1, now())
-                        ON CONFLICT (user_id, redeemable_id) DO UPDATE SET
-                        quantity = user_redeemables.quantity + 1,
-                        last_updated = now()
-                    """, user_id, card["redeemable_id"])
-                    results.append(("redeemable", f"🎟️ {card['name']}", card["redeemable_id"], None))
-
-                elif tipo == "idol":
-                    while True:
-                        rareza = random.choices(list(rarity_weights.keys()), weights=rarity_weights.values())[0]
-
-                        if rareza == "R_":
-                            query = "SELECT * FROM cards_idol WHERE rarity_id LIKE 'R_1'"
-                            params = []
-
-                            idx = 1
-                            
-                            if pack_row['group_name']:
-                                query += f" AND group_name = ${idx}"
-                                idx += 1
-                                params.append(pack_row['group_name'])
-                            if pack_row['set_id']:
-                                query += f" AND set_id = ${idx}"
-                                idx += 1
-                                params.append(pack_row['set_id'])
-
-                        else:
-                            query = "SELECT * FROM cards_idol WHERE rarity_id = $1"
-                            params = [rareza]
-                            idx = 2
-                            if pack_row['group_name']:
-                                query += f" AND group_name = ${idx}"
-                                idx += 1
-                                params.append(pack_row['group_name'])
-                            if pack_row['set_id']:
-                                query += f" AND set_id = ${idx}"
-                                idx += 1
-                                params.append(pack_row['set_id'])
-
-                        cards = await conn.fetch(query, *params)
-                        if cards:
-                            break
-
-                    card = random.choices(cards, weights=[c["weight"] for c in cards])[0]
-
-                    while True:
-                        new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                        exists = await conn.fetchrow("SELECT 1 FROM user_idol_cards WHERE unique_id = $1", new_id)
-                        if not exists:
-                            break
-                    
-                    p_skill = a_skill = s_skill = u_skill = None
-                    
-                    # Asignar habilidades dependiendo rareza
-                    if card["rarity"] == "Regular":
-                        tipo_habilidad = random.choice(["passive", "active", "support"])
-
-                        skill_row = await conn.fetchrow("""
-                            SELECT skill_name FROM skills WHERE skill_type = $1 ORDER BY RANDOM() LIMIT 1
-                        """, tipo_habilidad)
-
-                        if skill_row:
-                            if tipo_habilidad == "passive":
-                                p_skill = skill_row["skill_name"]
-                            elif tipo_habilidad == "active":
-                                a_skill = skill_row["skill_name"]
-                            elif tipo_habilidad == "support":
-                                s_skill = skill_row["skill_name"]
-                    
-                    elif card["rarity"] == "Limited":
-                        skill_row = await conn.fetchrow("""
-                            SELECT skill_name FROM skills WHERE skill_type = 'ultimate' ORDER BY RANDOM() LIMIT 1
-                        """)
-                        if skill_row:
-                            u_skill = skill_row["skill_name"]
-
-                        extra_type = random.choice(["passive", "active", "support"])
-                        skill_row = await conn.fetchrow("""
-                            SELECT skill_name FROM skills WHERE skill_type = $1 ORDER BY RANDOM() LIMIT 1
-                        """, extra_type)
-                        if skill_row:
-                            if extra_type == "passive":
-                                p_skill = skill_row["skill_name"]
-                            elif extra_type == "active":
-                                a_skill = skill_row["skill_name"]
-                            elif extra_type == "support":
-                                s_skill = skill_row["skill_name"]
-                                
-                    elif card["rarity"] == "FCR":
-                        skill_row = await conn.fetchrow("""
-                            SELECT skill_name FROM skills WHERE skill_type = 'support' ORDER BY RANDOM() LIMIT 1
-                        """)
-                        if skill_row:
-                            s_skill = skill_row["skill_name"]
-
-                        extra_type = random.choice(["passive", "active", "ultimate"])
-                        skill_row = await conn.fetchrow("""
-                            SELECT skill_name FROM skills WHERE skill_type = $1 ORDER BY RANDOM() LIMIT 1
-                        """, extra_type)
-                        if skill_row:
-                            if extra_type == "passive":
-                                p_skill = skill_row["skill_name"]
-                            elif extra_type == "active":
-                                a_skill = skill_row["skill_name"]
-                            elif extra_type == "ultimate":
-                                u_skill = skill_row["skill_name"]
-                    
-                    elif card["rarity"] == "POB":
-                        available_types = ["passive", "active", "support", "ultimate"]
-                        chosen_types = random.sample(available_types, 3)
-
-                        for skill_type in chosen_types:
-                            skill_row = await conn.fetchrow("""
-                                SELECT skill_name FROM skills WHERE skill_type = $1 ORDER BY RANDOM() LIMIT 1
-                            """, skill_type)
-
-                            if skill_row:
-                                if skill_type == "passive":
-                                    p_skill = skill_row["skill_name"]
-                                elif skill_type == "active":
-                                    a_skill = skill_row["skill_name"]
-                                elif skill_type == "support":
-                                    s_skill = skill_row["skill_name"]
-                                elif skill_type == "ultimate":
-                                    u_skill = skill_row["skill_name"]
-                    
-                    # Agregar carta al inventario
-                    await conn.execute("""
-                        INSERT INTO user_idol_cards (unique_id, user_id, card_id, idol_id, set_id, rarity_id, p_skill, a_skill, s_skill, u_skill)
-                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-                    """, new_id, user_id, card["card_id"], card["idol_id"], card["set_id"], card["rarity_id"], p_skill, a_skill, s_skill, u_skill)
-                    if card["rarity"] == "Regular" and card["rarity_id"].startswith("R") and len(card["rarity_id"]) == 3:
-                        modelo = card["rarity_id"][1]
-                        results.append(("idol", f"👤 {card['idol_name']} `{card['set_name']}`\n(Regular {modelo})", card["card_id"], new_id))
-                    else:
-                        results.append(("idol", f"👤 {card['idol_name']} `{card['set_name']}`\n({card['rarity']})", card["card_id"], new_id))
+            # Sorteo en memoria y un insert masivo por tabla
+            draws = draw_pack(pack_row)
+            results = await insert_draws(conn, user_id, draws)
 
     return results, pack_row['name']
 
+MAX_OPEN_ALL = 50
+
+async def open_all_packs(user_id: int, pack_id: str = None, limit: int = MAX_OPEN_ALL):
+    """Abre hasta `limit` packs del usuario en una sola transacción con inserts masivos."""
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Reclamar y eliminar los packs en una sola sentencia
+            pack_rows = await conn.fetch("""
+                DELETE FROM players_packs pp
+                USING packs p
+                WHERE pp.pack_id = p.pack_id
+                AND pp.unique_id IN (
+                    SELECT unique_id FROM players_packs
+                    WHERE user_id = $1 AND ($2::text IS NULL OR pack_id = $2)
+                    ORDER BY buy_date ASC
+                    LIMIT $3
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING pp.pack_id, pp.group_name, pp.set_id, p.name, p.card_amount,
+                          p.w_idol, p.w_item, p.w_performance, p.w_redeemable,
+                          p.w_regular, p.w_limited, p.w_fcr, p.w_pob, p.w_legacy
+            """, user_id, pack_id, limit)
+
+            if not pack_rows:
+                return [], []
+
+            draws = [draw for pack_row in pack_rows for draw in draw_pack(pack_row)]
+            results = await insert_draws(conn, user_id, draws)
+
+    #mision (solo si la transacción se confirmó)
+    mission_events.emit(user_id, "open_pack", len(pack_rows))
+
+    return results, pack_rows
+
 class ConfirmPurchaseView(discord.ui.View):
     def __init__(self, user_id, pack_data, total_price, final_receiver_id, group_name, agency, amount, discount_times):
         super().__init__(timeout=60)
@@ -838,12 +715,9 @@ class ConfirmPurchaseView(discord.ui.View):
 
             q_gave = 0
             total_xp = 0
+            new_ids = await new_unique_ids(quantity, conn)
             while q_gave < quantity:
-                while True:
-                    new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                    exists = await conn.fetchval("SELECT 1 FROM players_packs WHERE unique_id = $1", new_id)
-                    if not exists:
-                        break
+                new_id = new_ids[q_gave]
 
                 now = datetime.now(timezone.utc)
             
@@ -916,7 +790,7 @@ class ConfirmFCRView(discord.ui.View):
             return
 
         pool = get_pool()
-        unique_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+        unique_id = await new_unique_id()
 
         guild = interaction.guild
         
@@ -965,7 +839,7 @@ class ConfirmFCRView(discord.ui.View):
             return
 
         pool = get_pool()
-        unique_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+        unique_id = await new_unique_id()
 
         guild = interaction.guild
         
@@ -1,4 +1,5 @@
 import discord, json, inspect, math, asyncio
+from contextlib import nullcontext
 from discord.ext import commands
 from discord import app_commands, ui, Interaction
 from datetime import datetime, timezone
@@ -6,9 +7,16 @@ from utils.paginator import Paginator, PreviousButton, NextButton
 import random
 from typing import List
 from db.connection import get_pool
+from db.catalog import get_catalog
+from db import mission_events
 from utils.emojis import get_emoji
 from utils.language import get_user_language
 from utils.localization import get_translation
+from utils.presentation_engine import (
+    load_presentation_state, simulate_section, write_section_result, run_auto_presentation,
+    check_passive_condition,
+    apply_stat_boost, apply_extra_cost, apply_relative_cost, apply_multi_effect
+)
 from commands.starter import version as v
 
 version = v
@@ -1705,7 +1713,7 @@ async def show_current_section_view(interaction: discord.Interaction, presentati
             if card:
                 # 🟢 Passive Skill (PS)
                 if card["p_skill"]:
-                    skill = await conn.fetchrow("SELECT * FROM skills WHERE skill_name = $1 AND skill_type = 'passive'", card["p_skill"])
+                    skill = get_catalog().skill(card["p_skill"], 'passive')
                     if skill:
                         passive_name = card["p_skill"].replace("_", " ").capitalize()
                         fulfilled = await apply_passive_skill_if_applicable(
@@ -1900,190 +1908,68 @@ async def show_current_section_view(interaction: discord.Interaction, presentati
 
 async def perform_auto_presentation(interaction: discord.Interaction, presentation_id: str, edit: bool = False):
     pool = get_pool()
-    guild = interaction.guild
     user_id = interaction.user.id
 
+    st_embed = discord.Embed(
+        title="⏳ Presentación en curso... _(los mensajes de cada sección se borrarán después de un tiempo)_",
+        color=discord.Color.gold()
+        )
+    await interaction.edit_original_response(embed=st_embed, view=None)
+
     async with pool.acquire() as conn:
         presentation = await conn.fetchrow("""
             SELECT * FROM presentations
             WHERE presentation_id = $1 AND user_id = $2
         """, presentation_id, user_id)
-        
-        
-        st_embed = discord.Embed(
-            title="⏳ Presentación en curso... _(los mensajes de cada sección se borrarán después de un tiempo)_",
-            color=discord.Color.gold()
-            )
-        await interaction.edit_original_response(embed=st_embed, view=None)
 
         if not presentation:
             await interaction.edit_original_response(content="❌ No se encontró la presentación.")
             return
-        
-        idols = await conn.fetch("""
-            SELECT * FROM presentation_members
-            WHERE presentation_id = $1
-        """, presentation_id)
-        
-        # Seleccionar primer Idol
-        new_idol = random.choice(idols)
-
-        await conn.execute("""
-            UPDATE presentation_members
-            SET current_position = 'active'
-            WHERE presentation_id = $1 AND idol_id = $2
-        """, presentation_id, new_idol['idol_id'])
-
-
-    # 🔹 Loop principal
-    finished = False
-    
-
-
-    while not finished:
-        async with pool.acquire() as conn:
-
-            # 🔸 Refrescar estado SIEMPRE (importante)
-            presentation = await conn.fetchrow("""
-                SELECT * FROM presentations
-                WHERE presentation_id = $1 AND user_id = $2
-            """, presentation_id, user_id)
-
-            section = await conn.fetchrow("""
-                SELECT * FROM song_sections
-                WHERE song_id = $1 AND section_number = $2
-            """, presentation['song_id'], presentation['current_section'])
-
-            idols = await conn.fetch("""
-                SELECT * FROM presentation_members
-                WHERE presentation_id = $1
-            """, presentation_id)
-
-        # 🔸 6. Cambio de idol
-        if len(idols) > 1:
-            change = random.choices([True, False], weights=[70,30])
-            if presentation['free_switches'] < 0:
-                change = True
-            if change:
-                if presentation['free_switches'] != 0:
-                    async with pool.acquire() as conn:
-                        # Obtener actual activo
-                        old_active = await conn.fetchrow("""
-                            SELECT idol_id FROM presentation_members
-                            WHERE presentation_id = $1 AND current_position = 'active'
-                        """, presentation_id)
-                        
-                        n_idols = await conn.fetch("""
-                            SELECT * FROM presentation_members
-                            WHERE presentation_id = $1 AND idol_id <> $2
-                        """, presentation_id, old_active['idol_id'])
-                        
-                        weights = [
-                            max(0, idol['max_energy'] - idol['used_energy'])
-                            for idol in n_idols
-                        ]
-                        
-                        new_idol = random.choices(
-                            n_idols,
-                            weights=weights,
-                            k=1
-                            )[0]
-
-                        # Actualizar posiciones
-                        await conn.execute("""
-                            UPDATE presentation_members
-                            SET current_position = 'back'
-                            WHERE presentation_id = $1 AND current_position = 'active'
-                        """, presentation_id)
-
-                        await conn.execute("""
-                            UPDATE presentation_members
-                            SET current_position = 'active'
-                            WHERE presentation_id = $1 AND idol_id = $2
-                        """, presentation_id, new_idol['idol_id'])
-
-        # 🔸 1. P. Cards
-        if presentation['performance_card_uses'] > 0:
-            use_pcard = random.choice([True, False])
-            use_pcard = False ## placeholder
-
-            if use_pcard:
-                # elegir tipo / carta
-                pass
-
-        # 🔸 2. Habilidades
-        ## Revisar si tiene AS o US
-        action = "BASIC"
-
-        if action == "AS":
-            pass
-        elif action == "US":
-            pass
-        else: # Basic
-            pool = get_pool()
-            async with pool.acquire() as conn:
-                # Obtener info de la presentación
-                presentation = await conn.fetchrow("""
-                    SELECT * FROM presentations WHERE presentation_id = $1
-                """, presentation_id)
-
-                # Verificar idol activo
-                idol = await conn.fetchrow("""
-                    SELECT * FROM presentation_members 
-                    WHERE presentation_id = $1 AND current_position = 'active'
-                """, presentation_id)
-                
-                idol_name = await conn.fetchval("SELECT name FROM idol_base WHERE idol_id = $1", idol['idol_id'])
-
-                # Obtener sección actual
-                current_section = presentation["current_section"]
-                song_id = presentation["song_id"]
-                song_section = await conn.fetchrow("""
-                    SELECT * FROM song_sections
-                    WHERE song_id = $1 AND section_number = $2
-                """, song_id, current_section)
 
-                if not song_section:
-                    return await interaction.followup.send(content="Sección no encontrada.", ephemeral=True)
+        # Toda la canción se simula en memoria y se guarda, junto con el cierre
+        # de la presentación, en una sola transacción
+        missions = []
+        async with conn.transaction():
+            state, timeline = await run_auto_presentation(conn, presentation_id, presentation)
+            content = await finalize_presentation(conn, presentation, missions)
+        for mission_user, mission_type in missions:
+            mission_events.emit(mission_user, mission_type)
+
+        idol_names = {
+            r["idol_id"]: r["name"] for r in await conn.fetch(
+                "SELECT idol_id, name FROM idol_base WHERE idol_id = ANY($1::text[])",
+                list({m.idol_id for m in state.members}))
+        }
 
-                # REVISAR SI FUNCIONA
-                passive_bonus = await apply_passive_skill_if_applicable(conn, idol, song_section, presentation)
-                score, hype, finished, base_score = await perform_section_action(conn, presentation_id, idol, song_section, presentation, passive_bonus)
+    await present_auto_timeline(interaction, presentation, state, timeline, idol_names, content)
 
-                p_totals = await conn.fetchrow("SELECT total_hype, total_score FROM presentations WHERE presentation_id = $1", presentation_id)
 
-        # 🔸 4. Verificar fin
-        if finished:
-            is_ephemeral:bool = presentation['presentation_type'] == "practice"
-            content = await finalize_presentation(conn, presentation)
-            fn_embed =discord.Embed(
-                title="✅ Presentación finalizada!",
-                color=discord.Color.gold()
-            )
-            await interaction.edit_original_response(embed=fn_embed, view=None)
-            
-            await interaction.followup.send(
-                content=content,
-                ephemeral = is_ephemeral
-            )
+async def present_auto_timeline(interaction: discord.Interaction, presentation, state, timeline: list, idol_names: dict, content: str):
+    # Reproduce la línea de tiempo ya calculada al ritmo de la canción
+    for result in timeline:
+        if result.final:
             break
-        
-        # 🔸 5. Support Skill
-        ## Revisar si tiene SS
-        use_support = False
-        if use_support:
-            pass
-
 
-
-        
+        section = state.section(result.section_number)
         await interaction.followup.send(
-            content=f"## Sección {presentation['current_section']}\n- Idol: {idol_name} ({idol['idol_id']})\n- Puntuación: {format(score,',')} ({format(base_score,',')})\n- Hype: {round(p_totals['total_hype'],2)} ({hype})\n\n{section['lyrics'].replace("\\n","\n")}",
+            content=f"## Sección {result.section_number}\n- Idol: {idol_names.get(result.idol_id)} ({result.idol_id})\n- Puntuación: {format(result.score,',')} ({format(result.base_hype,',')})\n- Hype: {round(result.total_hype,2)} ({result.hype})\n\n{section['lyrics'].replace("\\n","\n")}",
             ephemeral=True
         )
-        
-        await asyncio.sleep(song_section["duration"])
- 
+
+        await asyncio.sleep(section["duration"])
+
+    is_ephemeral:bool = presentation['presentation_type'] == "practice"
+    fn_embed = discord.Embed(
+        title="✅ Presentación finalizada!",
+        color=discord.Color.gold()
+    )
+    await interaction.edit_original_response(embed=fn_embed, view=None)
+
+    await interaction.followup.send(
+        content=content,
+        ephemeral = is_ephemeral
+    )
+
 
 # - switch idol
 class SwitchIdolView(discord.ui.View):
@@ -3190,247 +3076,11 @@ class CancelPerformanceCardPreviewButton(discord.ui.Button):
 
 # - Funcion reutilizable para calculo de valores, stats, score, hype, etc
 async def perform_section_action(conn, presentation_id: str, idol_row, song_section, presentation_row, skill_bonus: dict):
-    current_section = presentation_row["current_section"]
-    song_id = presentation_row["song_id"]
-
-    Vs, Rs, Ds, Ls = song_section["vocal"], song_section["rap"], song_section["dance"], song_section["visual"]
-    Vc, Rc, Dc, Lc = idol_row["vocal"], idol_row["rap"], idol_row["dance"], idol_row["visual"]
-    
-    members = await conn.fetch(
-        "SELECT * FROM presentation_members WHERE presentation_id = $1 AND current_position <> 'back' AND current_position <> 'active'",
-        presentation_id
-    )
-    
-    section_bonus_applied = False
-    for m in members:
-        if m['current_position'] == 'participated':
-            Vc += m['vocal'] * 0.4
-            Rc += m['rap'] * 0.4
-            Dc += m['dance'] * 0.4
-            Lc += m['visual'] * 0.4
-        elif m['current_position'] == 'grupal':
-            Vc += m['vocal'] * 0.1
-            Rc += m['rap'] * 0.1
-            Dc += m['dance'] * 0.1
-            Lc += m['visual'] * 0.1
-        
-        if not section_bonus_applied and m['p_type'] == song_section['type_plus']:
-            Vs += song_section['plus_vocal']
-            Rs += song_section['plus_rap'] 
-            Ds += song_section['plus_dance'] 
-            Ls += song_section['plus_visual']
-            section_bonus_applied = True
-    
-    Vc = int(Vc)
-    Rc = int(Rc)
-    Dc = int(Dc)
-    Lc = int(Lc)
-    
-    # Overrides por ultimate
-    if "override_stat" in skill_bonus:
-        for stat, val in skill_bonus["override_stat"].items():
-            if stat == "vocal":
-                Vs = val
-            elif stat == "rap":
-                Rs = val
-            elif stat == "dance":
-                Ds = val
-            elif stat == "visual":
-                Ls = val
-    Vc += skill_bonus.get('vocal', 0)
-    Rc += skill_bonus.get('rap', 0)
-    Dc += skill_bonus.get("dance", 0)
-    Lc += skill_bonus.get("visual", 0)
-
-    duration = song_section["duration"]
-    
-    restante = max(0, round((idol_row["max_energy"] - idol_row["used_energy"]) / idol_row["max_energy"], 2))
-    if skill_bonus.get("override_energy") == "inverse":
-        restante = 1 - restante
-    if skill_bonus.get("override_energy") == "fixed":
-        Er = 1
-    else:
-        Er = 0.3 + restante * 0.7
-
-
-    # Stage y Support effects
-    effect = None
-    if presentation_row["stage_effect"] and presentation_row["stage_effect_duration"] > 0:
-        effect = await conn.fetchrow("SELECT * FROM performance_effects WHERE effect_id = $1", presentation_row["stage_effect"])
-
-    s_effect = None
-    if presentation_row["support_effect"] and presentation_row["support_effect_duration"] > 0:
-        s_effect = await conn.fetchrow("SELECT * FROM performance_effects WHERE effect_id = $1", presentation_row["support_effect"])
-
-    for ef in (effect, s_effect):
-        if ef:
-            Vs += ef["plus_vocal"]
-            Rs += ef["plus_rap"]
-            Ds += ef["plus_dance"]
-            Ls += ef["plus_visual"]
-
-            stats_section = [("vocal", Vs), ("rap", Rs), ("dance", Ds), ("visual", Ls)]
-            if ef["highest_stat_mod"]:
-                highest = max(stats_section, key=lambda x: (x[1], ["vocal", "rap", "dance", "visual"].index(x[0])))
-                locals()[f"{highest[0][0].upper()}s"] += ef["highest_stat_mod"]
-
-            if ef["lowest_stat_mod"]:
-                lowest = min(stats_section, key=lambda x: (x[1], ["vocal", "rap", "dance", "visual"].index(x[0])))
-                locals()[f"{lowest[0][0].upper()}s"] += ef["lowest_stat_mod"]
-    
-    H = presentation_row["total_hype"]
-    Ph = min(1.2, max(0.8, ((0.4 * H) - 20) / 100 + 1))
-
-    base_energy_cost = duration
-    
-    base_energy_cost += skill_bonus.get("extra_cost", 0)
-    base_energy_cost *= skill_bonus.get("relative_cost", 1)
-    base_energy_cost = round(base_energy_cost,2)
-    
-    
-    if effect:
-        base_energy_cost += effect["extra_cost"]
-        base_energy_cost *= effect["relative_cost"]
-    if s_effect:
-        base_energy_cost += s_effect["extra_cost"]
-        base_energy_cost *= s_effect["relative_cost"]
-
-    
-    new_used_energy = min(idol_row["max_energy"], idol_row["used_energy"] + base_energy_cost)
-
-    base_score = ((Vc * Vs) + (Rc * Rs) + (Dc * Ds) + (Lc * Ls)) * duration * Er * Ph
-    
-    base_score *= skill_bonus.get("score", 1)
-    if effect: base_score *= effect["score_mod"]
-    if s_effect: base_score *= s_effect["score_mod"]
-    base_score = int(base_score)
-
-    await conn.execute("""
-        INSERT INTO presentation_sections (presentation_id, section, score_got, active_card_id)
-        VALUES ($1, $2, $3, $4)
-    """, presentation_id, current_section, base_score, idol_row["card_id"])
-
-    await conn.execute("""
-        UPDATE presentations SET total_score = total_score + $1 WHERE presentation_id = $2
-    """, base_score, presentation_id)
-
-    # Set score to active idol
-    await conn.execute("""
-        UPDATE presentation_members SET individual_score = individual_score + $1
-        WHERE id = $2
-    """, base_score, idol_row["id"])
-
-    # Energy consume and regeneration
-    await conn.execute("""
-        UPDATE presentation_members SET used_energy = used_energy + $1
-        WHERE presentation_id = $2 AND current_position <> 'back'
-    """, base_energy_cost, presentation_id)
-
-    await conn.execute("""
-        UPDATE presentation_members SET used_energy = used_energy - $1
-        WHERE presentation_id = $2 AND current_position = 'back'
-    """, round(base_energy_cost * 0.1,1), presentation_id)
-
-    # Set last positions according to last current positions
-    await conn.execute("""
-        UPDATE presentation_members SET current_position = 'back', last_position = 'participated'
-        WHERE presentation_id = $1 AND current_position = 'participated'
-    """, presentation_id)
-    
-    await conn.execute("""
-        UPDATE presentation_members SET current_position = 'back', last_position = 'participated'
-        WHERE presentation_id = $1 AND current_position = 'grupal'
-    """, presentation_id)
-
-    await conn.execute("""
-        UPDATE presentation_members SET last_position = 'active'
-        WHERE presentation_id = $1 AND current_position = 'active'
-    """, presentation_id)
-
-    await conn.execute("""
-        UPDATE presentation_members SET last_position = 'back'
-        WHERE presentation_id = $1 AND current_position = 'back'
-    """, presentation_id)
-    
-    # Restore p_type to None
-    await conn.execute("""
-        UPDATE presentation_members SET p_type = $1
-        WHERE presentation_id = $2
-    """, None, presentation_id)
-
-    # Set max/min energy
-    await conn.execute("UPDATE presentation_members SET used_energy = max_energy WHERE presentation_id = $1 AND used_energy > max_energy", presentation_id)
-    await conn.execute("UPDATE presentation_members SET used_energy = 0 WHERE presentation_id = $1 AND used_energy < 0", presentation_id)
-
-    n_members = await conn.fetchval("SELECT COUNT(*) FROM presentation_members WHERE presentation_id = $1", presentation_id)
-    avg = await conn.fetchval("SELECT average_score FROM song_sections WHERE song_id = $1 AND section_number = $2", song_id, current_section)
-    base_hype = avg * (1 + 0.001 * n_members * ((n_members + 1) / 2))
-    Hg = round((1 - base_hype / base_score) * 5 * skill_bonus.get("hype", 1), 2)
-    if effect: Hg *= effect["hype_mod"]
-    if s_effect: Hg *= s_effect["hype_mod"]
-    
-    section_types = {
-        "intro": 1.1,
-        "verse": 0.9,
-        "pre_chorus": 1.0,
-        "chorus": 1.3,
-        "break": 1.2,
-        "bridge": 0.8,
-        "ending": 0.7
-    }
-    
-    for key, value in section_types.items():
-        if song_section['section_type'] == key:
-            Hg *= value
-
-    Hg = round(Hg,2)
-    await conn.execute("UPDATE presentations SET total_hype = LEAST(100, GREATEST(0, total_hype + $1)) WHERE presentation_id = $2", Hg, presentation_id)
-    await conn.execute("UPDATE presentation_sections SET hype_got = $1 WHERE presentation_id = $2 AND section = $3", Hg, presentation_id, current_section)
-
-    # Siguiente sección
-    next_section = current_section + 1
-    total_sections = await conn.fetchval("""
-        SELECT total_sections FROM songs WHERE song_id = $1
-    """, song_id)
-
-    final = False
-    if next_section > total_sections:
-        # Termina presentación
-        final = True
-        return base_score, Hg, final, int(base_hype)
-
-    # Siguiente sección y cambio de regla
-    await conn.execute("""
-        UPDATE presentations SET current_section = $1 WHERE presentation_id = $2
-    """, next_section, presentation_id)
-
-    change_rule = await conn.fetchval("""
-        SELECT change_rule FROM song_sections 
-        WHERE song_id = $1 AND section_number = $2
-    """, song_id, next_section)
-    new_duration = await conn.fetchval("""
-        SELECT duration FROM song_sections 
-        WHERE song_id = $1 AND section_number = $2
-    """, song_id, next_section)
-
-    new_switch = {"optional": 1, "forced": -1, "locked": 0}.get(change_rule, 1)
-
-    p_card_uses = 1 + new_duration // 6
-    
-    await conn.execute("""
-        UPDATE presentations SET free_switches = $1, performance_card_uses = $2
-        WHERE presentation_id = $3
-    """, new_switch, p_card_uses, presentation_id)
-
-    # Reducir duración de efectos
-    for field in ["stage_effect_duration", "support_effect_duration"]:
-        if presentation_row[field] and presentation_row[field] > 0:
-            await conn.execute(f"""
-                UPDATE presentations SET {field} = {field} - 1 WHERE presentation_id = $1
-            """, presentation_id)
+    state = await load_presentation_state(conn, presentation_id, presentation_row)
+    result = simulate_section(state, idol_row["id"], skill_bonus)
+    await write_section_result(conn, state, result)
 
-    
-    return base_score, Hg, final, int(base_hype)
+    return result.score, result.hype, result.final, result.base_hype
 
 # - ultimate skill
 async def apply_ultimate_skill_if_applicable(conn, idol_row, section_row, presentation_row):
@@ -3443,7 +3093,7 @@ async def apply_ultimate_skill_if_applicable(conn, idol_row, section_row, presen
     if not card or not card["u_skill"]:
         return {}
 
-    skill = await conn.fetchrow("SELECT * FROM skills WHERE skill_name = $1 AND skill_type = 'ultimate'", card["u_skill"])
+    skill = get_catalog().skill(card["u_skill"], 'ultimate')
     if not skill:
         return {}
 
@@ -3493,10 +3143,7 @@ async def apply_equals_to_idol_stat(params, conn, presentation_row, idol_row):
     if not value:
         return {}
 
-    section = await conn.fetchrow("""
-        SELECT vocal, rap, dance, visual FROM song_sections
-        WHERE song_id = $1 AND section_number = $2
-    """, presentation_row["song_id"], presentation_row["current_section"])
+    section = get_catalog().section(presentation_row["song_id"], presentation_row["current_section"])
 
     if not section:
         return {}
@@ -3976,7 +3623,7 @@ async def apply_active_skill_if_applicable(conn, idol_row, section_row, presenta
     if not card or not card["a_skill"]:
         return {}
 
-    skill = await conn.fetchrow("SELECT * FROM skills WHERE skill_name = $1 AND skill_type = 'active'", card["a_skill"])
+    skill = get_catalog().skill(card["a_skill"], 'active')
     if not skill:
         return {}
 
@@ -4026,48 +3673,21 @@ async def apply_active_skill_if_applicable(conn, idol_row, section_row, presenta
         condition = skill["condition"]
         condition_values = json.loads(skill["condition_values"])
 
-        condition_checkers = {
-            "section_stat_above": check_section_stat_above,
-            "idol_stat_below": check_idol_stat_below,
-            "highest_section_stat": check_highest_section_stat,
-            "duration_above": check_duration_above,
-            "stage_effect_active": check_stage_effect_active,
-            "section_stat_below": check_section_stat_below,
-            "duration_below": check_duration_below,
-            "idol_stat_above": check_idol_stat_above,
-            "highest_score": check_highest_score,
-            "highest_energy": check_highest_energy,
-            "lowest_score": check_lowest_score,
-            "lowest_energy": check_lowest_energy,
-            "hype_above": check_hype_above,
-            "hype_below": check_hype_below,
-            "idol_active": check_idol_active,
-            "idol_participated": check_idol_participated,
-            "same_highest_stat": check_same_highest_stat,
-            "solo_act": check_solo_act,
-            "stat_above_stat": check_stat_above_stat,
-            "stat_higher_than_section": check_stat_higher_than_section,
-            "support_effect_active": check_support_effect_active
-        }
-
-        
-        checker = condition_checkers.get(condition)
-        if checker:
-            success = await checker(condition_values, idol_row, section_row, presentation_row, conn)
-            if success:
-                condition_effect = skill["condition_effect"]
-                condition_params = json.loads(skill["condition_params"])
-
-                apply_func = effect_appliers.get(condition_effect)
-                if apply_func:
-                    conditional_bonus = apply_func(condition_params)
-                    for key, value in conditional_bonus.items():
-                        if key in bonus and key not in bonus_type:
-                            bonus[key] += value
-                        elif key in bonus and key in bonus_type:
-                            bonus[key] *= value
-                        else:
-                            bonus[key] = value
+        success = await check_passive_condition(conn, condition, condition_values, idol_row, section_row, presentation_row)
+        if success:
+            condition_effect = skill["condition_effect"]
+            condition_params = json.loads(skill["condition_params"])
+
+            apply_func = effect_appliers.get(condition_effect)
+            if apply_func:
+                conditional_bonus = apply_func(condition_params)
+                for key, value in conditional_bonus.items():
+                    if key in bonus and key not in bonus_type:
+                        bonus[key] += value
+                    elif key in bonus and key in bonus_type:
+                        bonus[key] *= value
+                    else:
+                        bonus[key] = value
 
     # -----------------------
     # Costos de energía
@@ -4083,270 +3703,12 @@ async def apply_active_skill_if_applicable(conn, idol_row, section_row, presenta
     return bonus
 
 # - basic action
-# CHECKERS
-async def check_section_stat_above(condition_values, idol_row, section_row, presentation_row, conn):
-    for stat, min_value in condition_values.items():
-        
-        effect = None
-        if presentation_row["stage_effect"] and presentation_row["stage_effect_duration"] > 0:
-            effect = await conn.fetchrow("SELECT * FROM performance_effects WHERE effect_id = $1", presentation_row["stage_effect"])
-
-        s_effect = None
-        if presentation_row["support_effect"] and presentation_row["support_effect_duration"] > 0:
-            s_effect = await conn.fetchrow("SELECT * FROM performance_effects WHERE effect_id = $1", presentation_row["support_effect"])
-
-        for ef in (effect, s_effect):
-            if ef:
-                min_value -= ef[f"plus_{stat}"]
-                
-        
-        if section_row.get(stat, 0) < min_value:
-            return False
-    return True
-
-async def check_section_stat_below(condition_values, idol_row, section_row, presentation_row, conn):
-    for stat, max_value in condition_values.items():
-        
-        effect = None
-        if presentation_row["stage_effect"] and presentation_row["stage_effect_duration"] > 0:
-            effect = await conn.fetchrow("SELECT * FROM performance_effects WHERE effect_id = $1", presentation_row["stage_effect"])
-
-        s_effect = None
-        if presentation_row["support_effect"] and presentation_row["support_effect_duration"] > 0:
-            s_effect = await conn.fetchrow("SELECT * FROM performance_effects WHERE effect_id = $1", presentation_row["support_effect"])
-
-        for ef in (effect, s_effect):
-            if ef:
-                max_value += ef[f"plus_{stat}"]
-                
-        
-        if section_row.get(stat, 999) >= max_value:
-            return False
-    return True
-
-async def check_idol_stat_below(condition_values, idol_row, section_row, presentation_row, conn):
-    for stat, max_ratio in condition_values.items():
-        if stat == "energy":
-            ratio = (idol_row["max_energy"] - idol_row["used_energy"]) / idol_row["max_energy"]
-            if ratio >= max_ratio:
-                return False
-    return True
-
-async def check_idol_stat_above(condition_values, idol_row, section_row, presentation_row, conn):
-    for stat, min_ratio in condition_values.items():
-        if stat == "energy":
-            ratio = (idol_row["max_energy"] - idol_row["used_energy"]) / idol_row["max_energy"]
-            if ratio <= min_ratio:
-                return False
-    return True
-
-async def check_highest_section_stat(condition_values, idol_row, section_row, presentation_row, conn):
-    target_stat = condition_values.get("stat")
-    if not target_stat:
-        return False
-
-    section_stats = {
-        "vocal": section_row["vocal"],
-        "rap": section_row["rap"],
-        "dance": section_row["dance"],
-        "visual": section_row["visual"]
-    }
-
-    highest = max(section_stats.items(), key=lambda x: (x[1], ["vocal", "rap", "dance", "visual"].index(x[0])))
-    return highest[0] == target_stat
-
-async def check_duration_above(condition_values, idol_row, section_row, presentation_row, conn):
-    return section_row["duration"] > condition_values.get("duration", 999)
-
-async def check_duration_below(condition_values, idol_row, section_row, presentation_row, conn):
-    return section_row["duration"] < condition_values.get("duration", 0)
-
-async def check_highest_score(condition_values, idol_row, section_row, presentation_row, conn):
-    """
-    Verifica si el idol activo es quien más score individual tiene.
-    condition_values puede tener: { "value": true } o { "value": false }
-    """
-    idol_score = idol_row["individual_score"]
-    presentation_id = idol_row["presentation_id"]
-
-    top_score = await conn.fetchval("""
-        SELECT MAX(individual_score)
-        FROM presentation_members
-        WHERE presentation_id = $1
-    """, presentation_id)
-
-    return idol_score == top_score if condition_values.get("value", True) else idol_score != top_score
-
-async def check_highest_energy(condition_values, idol_row, section_row, presentation_row, conn):
-    """
-    Verifica si el idol activo tiene el mayor porcentaje de energía.
-    condition_values puede tener: { "value": true } o { "value": false }
-    """
-    idol_energy = 1 - (idol_row["used_energy"] / idol_row["max_energy"])
-    presentation_id = idol_row["presentation_id"]
-
-    rows = await conn.fetch("""
-        SELECT used_energy, max_energy
-        FROM presentation_members
-        WHERE presentation_id = $1
-    """, presentation_id)
-
-    top_ratio = max(1 - (row["used_energy"] / row["max_energy"]) for row in rows)
-
-    return idol_energy == top_ratio if condition_values.get("value", True) else idol_energy != top_ratio
-
-async def check_lowest_score(condition_values, idol_row, section_row, presentation_row, conn):
-    idol_score = idol_row["individual_score"]
-    presentation_id = idol_row["presentation_id"]
-
-    lowest_score = await conn.fetchval("""
-        SELECT MIN(individual_score)
-        FROM presentation_members
-        WHERE presentation_id = $1
-    """, presentation_id)
-
-    return idol_score == lowest_score if condition_values.get("value", True) else idol_score != lowest_score
-
-async def check_lowest_energy(condition_values, idol_row, section_row, presentation_row, conn):
-    idol_energy = 1 - (idol_row["used_energy"] / idol_row["max_energy"])
-    presentation_id = idol_row["presentation_id"]
-
-    rows = await conn.fetch("""
-        SELECT used_energy, max_energy
-        FROM presentation_members
-        WHERE presentation_id = $1
-    """, presentation_id)
-
-    lowest_ratio = min(1 - (r["used_energy"] / r["max_energy"]) for r in rows)
-
-    return idol_energy == lowest_ratio if condition_values.get("value", True) else idol_energy != lowest_ratio
-
-async def check_hype_above(condition_values, idol_row, section_row, presentation_row, conn):
-    required = condition_values.get("hype")
-    current_hype = presentation_row["total_hype"]
-
-    return current_hype > required
-
-async def check_hype_below(condition_values, idol_row, section_row, presentation_row, conn):
-    required = condition_values.get("hype")
-    current_hype = presentation_row["total_hype"]
-
-    return current_hype < required
-
-async def check_idol_active(condition_values, idol_row, section_row, presentation_row, conn):
-    expected = condition_values.get("value", True)
-    return idol_row.get("last_position") == "active" if expected else idol_row.get("last_position") != "active"
-
-async def check_idol_participated(condition_values, idol_row, section_row, presentation_row, conn):
-    expected = condition_values.get("value", True)
-    participated = idol_row.get("last_position") in ["participated", "active"]
-    return participated == expected
-
-async def check_same_highest_stat(condition_values, idol_row, section_row, presentation_row, conn):
-    expected = condition_values.get("value", True)  # Se espera True o False
-
-    idol_stats = {
-        "vocal": idol_row["vocal"],
-        "rap": idol_row["rap"],
-        "dance": idol_row["dance"],
-        "visual": idol_row["visual"]
-    }
-    highest_idol = max(idol_stats.items(), key=lambda x: (x[1], ["vocal", "rap", "dance", "visual"].index(x[0])))[0]
-
-    section_stats = {
-        "vocal": section_row["vocal"],
-        "rap": section_row["rap"],
-        "dance": section_row["dance"],
-        "visual": section_row["visual"]
-    }
-    highest_section = max(section_stats.items(), key=lambda x: (x[1], ["vocal", "rap", "dance", "visual"].index(x[0])))[0]
-
-    return (highest_idol == highest_section) == expected
-
-async def check_solo_act(condition_values, idol_row, section_row, presentation_row, conn):
-    if idol_row.get("last_position") != "active":
-        return False
-
-    idol_energy_ratio = 1 - (idol_row["used_energy"] / idol_row["max_energy"])
-
-    rows = await conn.fetch("""
-        SELECT used_energy, max_energy FROM presentation_members
-        WHERE presentation_id = $1
-    """, idol_row["presentation_id"])
-
-    highest_ratio = max(1 - (r["used_energy"] / r["max_energy"]) for r in rows)
-
-    return idol_energy_ratio == highest_ratio
-
-async def check_stat_above_stat(condition_values, idol_row, section_row, presentation_row, conn):
-    stat1 = condition_values.get("higher")
-    stat2 = condition_values.get("lower")
-
-    if stat1 == stat2 or stat1 not in section_row or stat2 not in section_row:
-        return False
-
-    return section_row[stat1] > section_row[stat2]
-
-async def check_stat_higher_than_section(condition_values, idol_row, section_row, presentation_row, conn):
-    stat = condition_values.get("stat")
-
-    if stat not in ["vocal", "rap", "dance", "visual"]:
-        return False
-
-    return idol_row[stat] > section_row[stat]
-
-async def check_stage_effect_active(condition_values, idol_row, section_row, presentation_row, conn):
-    expected = condition_values.get("value", False)
-    return bool(presentation_row["stage_effect_duration"]) > 0 if expected else presentation_row["stage_effect_duration"] <= 0
-
-async def check_support_effect_active(condition_values, idol_row, section_row, presentation_row, conn):
-    expected = condition_values.get("value", False)
-    return bool(presentation_row["support_effect_duration"]) > 0 if expected else presentation_row["support_effect_duration"] <= 0
-
-
-
 # EFFECTS
-def apply_stat_boost(effect_values, conn=None, presentation_row=None, idol_row=None):
-    return {
-        "vocal": effect_values.get("vocal", 0),
-        "rap": effect_values.get("rap", 0),
-        "dance": effect_values.get("dance", 0),
-        "visual": effect_values.get("visual", 0),
-        "score": effect_values.get("score", 1),
-        "hype": effect_values.get("hype", 1)
-    }
-
-def apply_extra_cost(effect_values, conn=None, presentation_row=None, idol_row=None):
-    return {
-        "extra_cost": effect_values.get("energy", 0)
-    }
-    
-def apply_relative_cost(effect_values, conn=None, presentation_row=None, idol_row=None):
-    return {
-        "relative_cost": effect_values.get("energy", 1)
-    }
-
-def apply_multi_effect(effect_values, conn=None, presentation_row=None, idol_row=None):
-    return{
-        "relative_cost": effect_values.get("relative_energy", 1),
-        "extra_cost": effect_values.get("extra_energy", 0),
-        "vocal": effect_values.get("vocal", 0),
-        "rap": effect_values.get("rap", 0),
-        "dance": effect_values.get("dance", 0),
-        "visual": effect_values.get("visual", 0),
-        "score": effect_values.get("score", 1),
-        "hype": effect_values.get("hype", 1)
-    }
-
 async def apply_boost_higher_stat(effect_values, conn, presentation_row, idol_row=None):
     song_id = presentation_row["song_id"]
     section_number = presentation_row["current_section"]
 
-    section = await conn.fetchrow("""
-        SELECT vocal, rap, dance, visual
-        FROM song_sections
-        WHERE song_id = $1 AND section_number = $2
-    """, song_id, section_number)
+    section = get_catalog().section(song_id, section_number)
 
     if not section:
         return {}
@@ -4363,11 +3725,7 @@ async def apply_boost_lower_stat(effect_values, conn, presentation_row, idol_row
     song_id = presentation_row["song_id"]
     section_number = presentation_row["current_section"]
 
-    section = await conn.fetchrow("""
-        SELECT vocal, rap, dance, visual
-        FROM song_sections
-        WHERE song_id = $1 AND section_number = $2
-    """, song_id, section_number)
+    section = get_catalog().section(song_id, section_number)
 
     if not section:
         return {}
@@ -4391,7 +3749,7 @@ async def apply_passive_skill_if_applicable(conn, idol_row, section_row, present
     if not card or not card["p_skill"]:
         return {}
 
-    skill = await conn.fetchrow("SELECT * FROM skills WHERE skill_name = $1 AND skill_type = 'passive'", card["p_skill"])
+    skill = get_catalog().skill(card["p_skill"], 'passive')
     if not skill:
         return {}
 
@@ -4399,36 +3757,7 @@ async def apply_passive_skill_if_applicable(conn, idol_row, section_row, present
     condition_values = json.loads(skill["condition_values"])
 
     
-    condition_checkers = {
-        "section_stat_above": check_section_stat_above,
-        "idol_stat_below": check_idol_stat_below,
-        "highest_section_stat": check_highest_section_stat,  # <-- este sería el de Dazzling Smile
-        "duration_above": check_duration_above,
-        "stage_effect_active": check_stage_effect_active,
-        "section_stat_below": check_section_stat_below,
-        "duration_below": check_duration_below,
-        "idol_stat_above": check_idol_stat_above,
-        "highest_score": check_highest_score,
-        "highest_energy": check_highest_energy,
-        "lowest_score": check_lowest_score,
-        "lowest_energy": check_lowest_energy,
-        "hype_above": check_hype_above,
-        "hype_below": check_hype_below,
-        "idol_active": check_idol_active,
-        "idol_participated": check_idol_participated,
-        "same_highest_stat": check_same_highest_stat,
-        "solo_act": check_solo_act,
-        "stat_above_stat": check_stat_above_stat,
-        "stat_higher_than_section": check_stat_higher_than_section,
-        "stage_effect_active": check_stage_effect_active,
-        "support_effect_active": check_support_effect_active
-    }
-
-    checker = condition_checkers.get(condition)
-    if not checker:
-        return {} if not check_only else False
-
-    success = await checker(condition_values, idol_row, section_row, presentation_row, conn)
+    success = await check_passive_condition(conn, condition, condition_values, idol_row, section_row, presentation_row)
     if not success:
         return {} if not check_only else False
 
@@ -4510,7 +3839,7 @@ class BasicActionButton(discord.ui.Button):
         
         if final:
             is_ephemeral:bool = presentation['presentation_type'] == "practice"
-            content = await finalize_presentation(conn, presentation)
+            content = await finalize_presentation(None, presentation)  # la conexión de arriba ya se liberó
             await interaction.edit_original_response(embed=embed, view=None)
             
             await interaction.followup.send(
@@ -4549,14 +3878,22 @@ class ReturnToSectionButton(discord.ui.Button):
         await interaction.response.defer()
         await show_current_section_view(interaction, self.presentation_id, edit=True)
 
-async def finalize_presentation(conn, presentation: dict) -> str:
+async def finalize_presentation(conn, presentation: dict, missions: list = None) -> str:
     presentation_id = presentation["presentation_id"]
     user_id = presentation["user_id"]
     group_id = presentation["group_id"]
     song_id = presentation["song_id"]
     ptype = presentation.get("presentation_type", "live")
-    pool = get_pool()
-    async with pool.acquire() as conn:
+
+    def mission(mission_type: str):
+        # Dentro de una transacción ajena, quien llama emite `missions` tras el commit
+        if missions is None:
+            mission_events.emit(user_id, mission_type)
+        else:
+            missions.append((user_id, mission_type))
+
+    # Con `conn` se usa la conexión (y la transacción) de quien llama
+    async with (get_pool().acquire() if conn is None else nullcontext(conn)) as conn:
 
         average_score = await conn.fetchval(
             "SELECT average_score FROM songs WHERE song_id = $1",
@@ -4573,16 +3910,7 @@ async def finalize_presentation(conn, presentation: dict) -> str:
             popularity = int(1000 * (total_score / average_score))
             xp = popularity // 10
             
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'do_presentation'
-                """, user_id)
+            mission("do_presentation")
             
             double = ""
             
@@ -4633,16 +3961,7 @@ async def finalize_presentation(conn, presentation: dict) -> str:
             normal_score = int(1000 * (total_score / average_score))
             xp = normal_score // 10
             
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'do_presentation'
-                """, user_id)
+            mission("do_presentation")
             
             
             
@@ -4668,27 +3987,9 @@ async def finalize_presentation(conn, presentation: dict) -> str:
             )
             
         else:
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'do_practice'
-                """, user_id)
+            mission("do_practice")
             
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'do_presentation'
-                """, user_id)
+            mission("do_presentation")
             
             await conn.execute(
                 """
@@ -1,4 +1,4 @@
-import discord, random, asyncio, string
+import discord, random, asyncio
 from discord.ext import commands
 from discord import app_commands
 import csv
@@ -6,8 +6,10 @@ import os
 from utils.localization import get_translation
 from utils.language import get_user_language
 from db.connection import get_pool
+from db.unique_ids import new_unique_id
 from datetime import datetime
 from utils.paginator import Paginator
+from db import mission_events
 from collections import Counter, defaultdict
 from commands.starter import version as v
 
@@ -547,24 +549,11 @@ class RedeemableButton(discord.ui.Button):
             if row == "UPDATE 0":
                 return await interaction.response.edit_message(content="❌ Ya no tienes este redeemable disponible.", embed=None, view=None)
 
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'redeem_coupon'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "redeem_coupon")
             
             # Insertar carta al inventario del usuario
             if self.is_idol_card:
-                while True:
-                    new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                    exists = await conn.fetchrow("SELECT 1 FROM user_idol_cards WHERE unique_id = $1", new_id)
-                    if not exists:
-                        break
+                new_id = await new_unique_id(conn)
                 card = await conn.fetchrow("SELECT * FROM cards_idol WHERE card_id = $1", self.card_id)
                 
                 p_skill = a_skill = s_skill = u_skill = None
@@ -665,11 +654,7 @@ class RedeemableButton(discord.ui.Button):
                         VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
                     """, new_id, user_id, card["card_id"], card["idol_id"], card["set_id"], card["rarity_id"], p_skill, a_skill, s_skill, u_skill)
             else:
-                while True:
-                    new_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                    exists = await conn.fetchrow("SELECT 1 FROM user_item_cards WHERE unique_id = $1", new_id)
-                    if not exists:
-                        break
+                new_id = await new_unique_id(conn)
                 card = await conn.fetchrow("SELECT * FROM cards_item WHERE item_id = $1", self.card_id)
                 await conn.execute("""
                         INSERT INTO user_item_cards (unique_id, user_id, item_id, durability)
@@ -717,16 +702,7 @@ class PcardRedeemableButton(discord.ui.Button):
             if row == "UPDATE 0":
                 return await interaction.response.edit_message(content="❌ Ya no tienes este redeemable disponible.", embed=None, view=None)
 
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'redeem_coupon'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "redeem_coupon")
             
             card_id = await conn.fetchval(
                 "SELECT pcard_id FROM cards_performance WHERE name = $1",
@@ -782,16 +758,7 @@ class SkillRedeemableButton(discord.ui.Button):
             if row == "UPDATE 0":
                 return await interaction.response.edit_message(content="❌ Ya no tienes este redeemable disponible.", embed=None, view=None)
 
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'redeem_coupon'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "redeem_coupon")
             
             card_id = await conn.fetchval(
                 "SELECT card_id FROM user_idol_cards WHERE unique_id = $1",
@@ -946,16 +913,7 @@ class UpgradeRedeemableButton(discord.ui.Button):
             if row == "UPDATE 0":
                 return await interaction.response.edit_message(content="❌ Ya no tienes este redeemable disponible.", embed=None, view=None)
 
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'redeem_coupon'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "redeem_coupon")
             
             card = await conn.fetchrow(
                 "SELECT * FROM user_idol_cards WHERE unique_id = $1",
@@ -1,10 +1,12 @@
-import discord, random, string
+import discord, random
 from discord import app_commands
 from discord.ext import commands
 from db.connection import get_pool
+from db.unique_ids import new_unique_id
 from datetime import datetime, timezone, timedelta
 from utils.localization import get_translation
-from utils.language import get_user_language
+from utils.language import get_user_language, invalidate_user_language
+from db import mission_events
 from asyncpg import Pool
 
 version = "?v=235"
@@ -59,7 +61,7 @@ class NewAgencyModal(discord.ui.Modal, title="Create Your Agency"):
         self.language = language
 
     async def on_submit(self, interaction: discord.Interaction):
-        pool = await get_pool()
+        pool = get_pool()
         user_id = interaction.user.id
         agency = self.agency_name.value
         now = datetime.now(timezone.utc)
@@ -75,12 +77,9 @@ class NewAgencyModal(discord.ui.Modal, title="Create Your Agency"):
                 INSERT INTO users (user_id, agency_name, credits, register_date, language, last_sponsor)
                 VALUES ($1, $2, $3, $4, $5, $6)
             """, user_id, agency, credits, now, self.language, now)
+            invalidate_user_language(user_id)
             
-            while True:
-                p_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-                exists = await conn.fetchval("SELECT 1 FROM players_packs WHERE unique_id = $1", p_id)
-                if not exists:
-                    break
+            p_id = await new_unique_id(conn)
             await conn.execute("""INSERT INTO players_packs (unique_id, user_id, pack_id, buy_date)
                                VALUES ($1, $2, 'MST', $3)
                                """, p_id, user_id, now)
@@ -255,7 +254,7 @@ class StartCommand(commands.Cog):
                 ephemeral=True
             )
         user_id = interaction.user.id
-        pool = await get_pool()
+        pool = get_pool()
 
         async with pool.acquire() as conn:
             user = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
@@ -319,16 +318,7 @@ class SponsorView(discord.ui.View):
                 total_credits, now, self.user_id
             )
             
-            await conn.execute("""
-                UPDATE user_missions um
-                SET obtained = um.obtained + 1,
-                    last_updated = now()
-                FROM missions_base mb
-                WHERE um.mission_id = mb.mission_id
-                AND um.user_id = $1
-                AND um.status = 'active'
-                AND mb.mission_type = 'claim_sponsor'
-                """, interaction.user.id)
+            mission_events.emit(interaction.user.id, "claim_sponsor")
             
             user_data = await conn.fetchrow("SELECT credits FROM users WHERE user_id = $1", interaction.user.id)
             current_credits = user_data['credits']
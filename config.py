@@ -7,6 +7,13 @@ load_dotenv()
 # Esto funcionará en Render porque usa variables de entorno del sistema
 TOKEN = os.getenv("DISCORD_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Recargar locales/*.json al modificarlos (útil en desarrollo)
+LOCALES_HOT_RELOAD = os.getenv("LOCALES_HOT_RELOAD") == "1"
+# Pool de conexiones a la base de datos
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+DB_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_LIFETIME", "300"))  # segundos
 
 if not TOKEN:
     raise ValueError("⚠️ No se encontró el DISCORD_TOKEN.")
\ No newline at end of file
@@ -0,0 +1,146 @@
+import logging
+from collections import defaultdict
+from db.connection import get_pool
+
+# Caché en memoria de las tablas estáticas del juego.
+# Estas tablas solo cambian con /admin upload_content (y el precio/set del pack LMT
+# en los eventos semanales), así que se cargan una vez al iniciar y se recargan
+# al terminar cada carga de contenido.
+
+# tabla -> llave primaria
+CATALOG_TABLES = {
+    "cards_idol": "card_id",
+    "idol_base": "idol_id",
+    "skills": "skill_name",
+    "songs": "song_id",
+    "song_sections": "section_id",
+    "performance_effects": "effect_id",
+    "packs": "pack_id",
+    "cards_item": "item_id",
+    "cards_performance": "pcard_id",
+    "redeemables": "redeemable_id",
+    "badges": "badge_id",
+}
+
+
+class Catalog:
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self.by_key = {
+            table: {row[key]: row for row in tables.get(table, [])}
+            for table, key in CATALOG_TABLES.items()
+        }
+
+        self.cards_by_idol = defaultdict(list)
+        self.cards_by_set = defaultdict(list)
+        self.cards_by_group = defaultdict(list)
+        self.set_names = {}
+        for card in tables.get("cards_idol", []):
+            self.cards_by_idol[card["idol_id"]].append(card)
+            self.cards_by_set[card["set_id"]].append(card)
+            self.cards_by_group[card["group_name"]].append(card)
+            self.set_names.setdefault(card["set_id"], card["set_name"])
+
+        self.skills_by_type = defaultdict(list)
+        for skill in tables.get("skills", []):
+            self.skills_by_type[skill["skill_type"]].append(skill)
+
+        self.sections = {}
+        self.sections_by_song = defaultdict(list)
+        for section in sorted(tables.get("song_sections", []), key=lambda s: s["section_number"]):
+            self.sections[(section["song_id"], section["section_number"])] = section
+            self.sections_by_song[section["song_id"]].append(section)
+
+        self.badges_by_card = {}
+        for badge in tables.get("badges", []):
+            if badge["set_id"] and badge["idol_id"]:
+                self.badges_by_card.setdefault((badge["set_id"], badge["idol_id"]), badge)
+
+    def rows(self, table: str) -> list:
+        return self.tables.get(table, [])
+
+    def card(self, card_id: str):
+        return self.by_key["cards_idol"].get(card_id)
+
+    def idol(self, idol_id: str):
+        return self.by_key["idol_base"].get(idol_id)
+
+    def skill(self, skill_name: str, skill_type: str = None):
+        skill = self.by_key["skills"].get(skill_name)
+        if skill and skill_type and skill["skill_type"] != skill_type:
+            return None
+        return skill
+
+    def song(self, song_id: str):
+        return self.by_key["songs"].get(song_id)
+
+    def section(self, song_id: str, section_number: int):
+        return self.sections.get((song_id, section_number))
+
+    def song_sections(self, song_id: str) -> list:
+        return self.sections_by_song.get(song_id, [])
+
+    def effect(self, effect_id: str):
+        return self.by_key["performance_effects"].get(effect_id)
+
+    def pack(self, pack_id: str):
+        return self.by_key["packs"].get(pack_id)
+
+    def item(self, item_id: str):
+        return self.by_key["cards_item"].get(item_id)
+
+    def pcard(self, pcard_id: str):
+        return self.by_key["cards_performance"].get(pcard_id)
+
+    def redeemable(self, redeemable_id: str):
+        return self.by_key["redeemables"].get(redeemable_id)
+
+    def badge(self, badge_id: str):
+        return self.by_key["badges"].get(badge_id)
+
+    def badge_for_card(self, set_id: str, idol_id: str):
+        return self.badges_by_card.get((set_id, idol_id))
+
+    def set_name(self, set_id: str):
+        return self.set_names.get(set_id)
+
+    def cards(self, idol_id: str = None, set_id: str = None, group_name: str = None) -> list:
+        if idol_id:
+            cards = self.cards_by_idol.get(idol_id, [])
+        elif set_id:
+            cards = self.cards_by_set.get(set_id, [])
+        elif group_name:
+            cards = self.cards_by_group.get(group_name, [])
+        else:
+            cards = self.rows("cards_idol")
+
+        return [
+            c for c in cards
+            if (not set_id or c["set_id"] == set_id) and (not group_name or c["group_name"] == group_name)
+        ]
+
+    def skills_of_type(self, skill_type: str) -> list:
+        return self.skills_by_type.get(skill_type, [])
+
+
+_catalog = Catalog({})
+
+
+async def load_catalog(*tables: str):
+    """Carga las tablas estáticas; con argumentos recarga solo esas tablas."""
+    global _catalog
+    names = tables or tuple(CATALOG_TABLES)
+    loaded = dict(_catalog.tables)
+
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        for table in names:
+            loaded[table] = await conn.fetch(f"SELECT * FROM {table}")
+
+    # Se reemplaza el catálogo completo para que los lectores nunca vean índices a medias
+    _catalog = Catalog(loaded)
+    logging.info(f"Catálogo cargado: {', '.join(f'{t}={len(loaded[t])}' for t in names)}")
+
+
+def get_catalog() -> Catalog:
+    return _catalog
@@ -1,14 +1,167 @@
-import asyncpg
-from config import DATABASE_URL
+import asyncpg, logging, time
+from config import (
+    DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+    DB_STATEMENT_CACHE_SIZE, DB_MAX_INACTIVE_LIFETIME
+)
+from db.metrics import metrics
 
-# Pool global
 db_pool = None
 
-# Crear el pool (una vez)
+# Funciones async (conn) que se ejecutan al abrir cada conexión del pool
+CONNECTION_INIT_HOOKS = []
+
+
+def _status_rows(status: str):
+    # "UPDATE 3", "INSERT 0 1", "SELECT 5" -> 3, 1, 5
+    last = status.rsplit(" ", 1)[-1] if status else ""
+    return int(last) if last.isdigit() else None
+
+
+class InstrumentedConnection(asyncpg.Connection):
+    """Conexión que registra latencia y filas de cada consulta en db.metrics."""
+
+    async def execute(self, query: str, *args, timeout: float = None) -> str:
+        start = time.perf_counter()
+        try:
+            status = await super().execute(query, *args, timeout=timeout)
+        except Exception:
+            metrics.record_query(query, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        metrics.record_query(query, (time.perf_counter() - start) * 1000, _status_rows(status))
+        return status
+
+    async def executemany(self, command: str, args, *, timeout: float = None):
+        start = time.perf_counter()
+        try:
+            result = await super().executemany(command, args, timeout=timeout)
+        except Exception:
+            metrics.record_query(command, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        rows = len(args) if hasattr(args, "__len__") else None
+        metrics.record_query(command, (time.perf_counter() - start) * 1000, rows)
+        return result
+
+    async def fetch(self, query: str, *args, timeout: float = None, record_class=None) -> list:
+        start = time.perf_counter()
+        try:
+            rows = await super().fetch(query, *args, timeout=timeout, record_class=record_class)
+        except Exception:
+            metrics.record_query(query, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        metrics.record_query(query, (time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+    async def fetchrow(self, query: str, *args, timeout: float = None, record_class=None):
+        start = time.perf_counter()
+        try:
+            row = await super().fetchrow(query, *args, timeout=timeout, record_class=record_class)
+        except Exception:
+            metrics.record_query(query, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        metrics.record_query(query, (time.perf_counter() - start) * 1000, 0 if row is None else 1)
+        return row
+
+    async def fetchval(self, query: str, *args, column=0, timeout: float = None):
+        start = time.perf_counter()
+        try:
+            value = await super().fetchval(query, *args, column=column, timeout=timeout)
+        except Exception:
+            metrics.record_query(query, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        metrics.record_query(query, (time.perf_counter() - start) * 1000, 0 if value is None else 1)
+        return value
+
+
+class _TimedAcquire:
+    """Envuelve pool.acquire() para medir cuánto se espera por una conexión.
+    Sirve tanto con `async with pool.acquire() as conn` como con `await pool.acquire()`."""
+
+    def __init__(self, ctx):
+        self._ctx = ctx
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        conn = await self._ctx.__aenter__()
+        metrics.record_acquire((time.perf_counter() - start) * 1000)
+        return conn
+
+    async def __aexit__(self, *exc):
+        return await self._ctx.__aexit__(*exc)
+
+    async def _acquire(self):
+        start = time.perf_counter()
+        conn = await self._ctx
+        metrics.record_acquire((time.perf_counter() - start) * 1000)
+        return conn
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class InstrumentedPool:
+    """Pool de asyncpg con la espera de acquire medida también en los atajos
+    pool.execute/fetch/..., que de otro modo usan el acquire interno."""
+
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+
+    def acquire(self, *, timeout: float = None) -> _TimedAcquire:
+        return _TimedAcquire(self._pool.acquire(timeout=timeout))
+
+    async def execute(self, query: str, *args, timeout: float = None) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args, *, timeout: float = None):
+        async with self.acquire() as conn:
+            return await conn.executemany(command, args, timeout=timeout)
+
+    async def fetch(self, query: str, *args, timeout: float = None, record_class=None) -> list:
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout, record_class=record_class)
+
+    async def fetchrow(self, query: str, *args, timeout: float = None, record_class=None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout, record_class=record_class)
+
+    async def fetchval(self, query: str, *args, column=0, timeout: float = None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+async def init_connection(conn):
+    metrics.connections_opened += 1
+    for hook in CONNECTION_INIT_HOOKS:
+        await hook(conn)
+
+
 async def create_pool():
     global db_pool
-    db_pool = await asyncpg.create_pool(DATABASE_URL)
+    pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+        # asyncpg prepara y reutiliza cada consulta por conexión (caché LRU por texto)
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        connection_class=InstrumentedConnection,
+        init=init_connection,
+        server_settings={"application_name": "ludibot"}
+    )
+    db_pool = InstrumentedPool(pool)
+    logging.info(f"Pool de base de datos listo: {db_pool.stats()}")
+
 
-# Obtener el pool desde otros archivos
-def get_pool():
-    return db_pool
\ No newline at end of file
+def get_pool() -> InstrumentedPool:
+    return db_pool
@@ -0,0 +1,161 @@
+import datetime
+from collections import defaultdict
+from db.catalog import get_catalog
+from db.unique_ids import new_unique_ids
+
+# Reparto de recompensas al terminar un evento semanal.
+# El ranking se calcula con una función de ventana, las recompensas se unen por
+# rango de puesto en SQL y los créditos, packs, insignias y popularidad se
+# aplican con una sentencia por tabla en la transacción de quien llama.
+
+RANKED_EVENT_TYPES = ('live_showcase', 'comeback_show', 'star_hunt')
+
+RANK_PARTICIPATIONS = """
+    WITH ranked AS (
+        SELECT participation_id, user_id, performance_id, normal_score,
+               ROW_NUMBER() OVER (ORDER BY normal_score DESC, participation_id) AS rank
+        FROM event_participation
+        WHERE instance_id = $1 AND normal_score > 0
+    ), upd AS (
+        UPDATE event_participation ep
+        SET ranking = r.rank
+        FROM ranked r
+        WHERE ep.participation_id = r.participation_id
+    )
+    SELECT r.participation_id, r.user_id, r.normal_score, r.rank,
+           g.group_id, g.name AS group_name,
+           g.popularity + g.permanent_popularity AS group_popularity,
+           u.agency_name, u.notifications
+    FROM ranked r
+    LEFT JOIN presentations p ON p.presentation_id = r.performance_id
+    LEFT JOIN groups g ON g.group_id = p.group_id
+    LEFT JOIN users u ON u.user_id = r.user_id
+    ORDER BY r.rank
+"""
+
+# Se ejecuta después de RANK_PARTICIPATIONS, así que ya ve el ranking asignado
+RANK_REWARDS = """
+    SELECT ep.participation_id, er.credits, er.pack_id, er.badge_id, er.boost
+    FROM event_participation ep
+    JOIN event_rewards er
+      ON er.event_id = $2 AND ep.ranking BETWEEN er.rank_min AND er.rank_max
+    WHERE ep.instance_id = $1 AND ep.normal_score > 0
+    ORDER BY ep.ranking, er.reward_id
+"""
+
+
+def permanent_popularity(event_type: str, rank: int) -> int:
+    if event_type == 'comeback_show':
+        return 100
+    if event_type == 'live_showcase' and rank == 1:
+        return 50
+    return 0
+
+
+async def distribute_event_rewards(conn, event_row, event_type: str) -> list[dict]:
+    """Asigna ranking y recompensas a todas las participaciones del evento.
+    Devuelve, en orden de puesto, lo entregado a cada participante."""
+    participants = await conn.fetch(RANK_PARTICIPATIONS, event_row['instance_id'])
+    if not participants:
+        return []
+
+    rewards = defaultdict(list)
+    if event_type in RANKED_EVENT_TYPES:
+        for r in await conn.fetch(RANK_REWARDS, event_row['instance_id'], event_row['event_id']):
+            rewards[r['participation_id']].append(r)
+
+    catalog = get_catalog()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    pack_ids = iter(await new_unique_ids(
+        sum(1 for rs in rewards.values() for r in rs if r['pack_id']), conn))
+
+    credits = defaultdict(int)
+    group_deltas = defaultdict(lambda: [0, 0])  # group_id -> [popularidad, permanente]
+    pack_rows = []
+    badge_rows = []
+    results = []
+    for pa in participants:
+        reward_desc = ""
+        reward_credits = 0
+        normal_score = pa['normal_score']
+        for r in rewards.get(pa['participation_id'], []):
+            reward_credits += r['credits'] or 0
+
+            if r['pack_id']:
+                pack_rows.append((
+                    next(pack_ids), pa['user_id'], r['pack_id'], now,
+                    event_row['set_id'], event_row['theme']
+                ))
+                pack = catalog.pack(r['pack_id'])
+                reward_desc += f"> 📦 {pack['name'] if pack else r['pack_id']}\n"
+
+            if r['badge_id']:
+                badge_rows.append((r['badge_id'], pa['user_id'], now, event_row['event_number']))
+                badge = catalog.badge(r['badge_id'])
+                reward_desc += f"> 🏅 {badge['name'] if badge else r['badge_id']} #{event_row['event_number']}\n"
+
+            normal_score *= r['boost']
+
+        normal_score = int(normal_score)
+        credits[pa['user_id']] += reward_credits
+
+        if pa['group_id']:
+            merch_credits = int(50 * (pa['group_popularity'] ** 0.5))
+            perm = permanent_popularity(event_type, pa['rank'])
+            credits[pa['user_id']] += merch_credits
+            group_deltas[pa['group_id']][0] += normal_score
+            group_deltas[pa['group_id']][1] += perm
+
+            reward_desc += f"> **Venta de mercancía:** 💵{format(merch_credits,',')}\n"
+            reward_desc += f"> **⭐ Popularidad para `{pa['group_name']}`**: {format(normal_score,',')}\n"
+            reward_desc += f"> **🏆 Popularidad permanente para `{pa['group_name']}`**: {perm}\n"
+
+        if reward_credits > 0:
+            reward_desc += f"> **Créditos:** 💵{format(reward_credits,',')}\n"
+
+        results.append({
+            "user_id": pa['user_id'],
+            "rank": pa['rank'],
+            "group_name": pa['group_name'],
+            "agency_name": pa['agency_name'],
+            "notifications": pa['notifications'],
+            "reward_desc": reward_desc
+        })
+
+    credited = [(user_id, amount) for user_id, amount in credits.items() if amount]
+    if credited:
+        await conn.execute("""
+            UPDATE users u
+            SET credits = u.credits + v.amount
+            FROM unnest($1::bigint[], $2::int[]) AS v(user_id, amount)
+            WHERE u.user_id = v.user_id
+        """, [c[0] for c in credited], [c[1] for c in credited])
+
+    if pack_rows:
+        await conn.executemany("""
+            INSERT INTO players_packs (
+                unique_id, user_id, pack_id, buy_date,
+                set_id, theme
+            ) VALUES ($1, $2, $3, $4, $5, $6)
+        """, pack_rows)
+
+    if badge_rows:
+        await conn.executemany("""
+            INSERT INTO user_badges (
+                badge_id, user_id, date_obtained, event_number
+            ) VALUES ($1, $2, $3, $4)
+            ON CONFLICT (user_id, badge_id) DO UPDATE SET
+            date_obtained = EXCLUDED.date_obtained,
+            event_number = EXCLUDED.event_number
+        """, badge_rows)
+
+    if group_deltas:
+        await conn.execute("""
+            UPDATE groups g
+            SET popularity = g.popularity + v.popularity,
+                permanent_popularity = g.permanent_popularity + v.permanent
+            FROM unnest($1::text[], $2::int[], $3::int[]) AS v(group_id, popularity, permanent)
+            WHERE g.group_id = v.group_id
+        """, list(group_deltas), [d[0] for d in group_deltas.values()], [d[1] for d in group_deltas.values()])
+
+    return results
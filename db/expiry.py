@@ -0,0 +1,70 @@
+import time, logging
+
+# Expiración de presentaciones sin terminar, compartida por cancel_presentation
+# y change_event. Todo se hace en una sola sentencia: la popularidad final se
+# calcula con UPDATE ... FROM songs y se suma a los grupos (presentaciones live)
+# o, solo al cerrar el evento ($3), se guarda en event_participation
+# (presentaciones de evento activas).
+
+EXPIRE_PRESENTATIONS = """
+    WITH stale AS (
+        SELECT presentation_id, song_id,
+               (presentation_type = 'live' AND group_id IS NOT NULL)
+               OR ($3 AND presentation_type = 'event' AND status = 'active') AS scores
+        FROM presentations
+        WHERE status IN ('preparation', 'active')
+        AND ($1::timestamptz IS NULL OR presentation_date < $1)
+        AND ($2::text IS NULL OR presentation_type = $2)
+        FOR UPDATE
+    ), expired AS (
+        UPDATE presentations p
+        SET status = 'expired',
+            total_popularity = CASE
+                WHEN s.scores AND so.average_score > 0
+                THEN trunc(500 * (p.total_score / so.average_score))::int
+                ELSE p.total_popularity
+            END
+        FROM stale s
+        LEFT JOIN songs so ON so.song_id = s.song_id
+        WHERE p.presentation_id = s.presentation_id
+        RETURNING p.presentation_id, p.presentation_type, p.group_id, p.total_popularity,
+                  s.scores AND so.average_score > 0 AS scored
+    ), group_deltas AS (
+        SELECT group_id, SUM(total_popularity) AS popularity
+        FROM expired
+        WHERE scored AND presentation_type = 'live'
+        GROUP BY group_id
+    ), grp AS (
+        UPDATE groups g
+        SET popularity = g.popularity + d.popularity
+        FROM group_deltas d
+        WHERE g.group_id = d.group_id
+        RETURNING d.popularity
+    ), participations AS (
+        UPDATE event_participation ep
+        SET normal_score = e.total_popularity
+        FROM expired e
+        WHERE e.scored AND e.presentation_type = 'event'
+        AND ep.performance_id = e.presentation_id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM expired) AS expired,
+           (SELECT COUNT(*) FROM expired WHERE scored) AS scored,
+           (SELECT COUNT(*) FROM grp) AS groups,
+           (SELECT COALESCE(SUM(popularity), 0) FROM grp) AS group_popularity,
+           (SELECT COUNT(*) FROM participations) AS participations
+"""
+
+
+async def expire_presentations(conn, older_than=None, presentation_type: str = None, score_events: bool = False) -> dict:
+    """Marca como expiradas las presentaciones en preparación o activas.
+    Filtra por fecha de creación y/o tipo; con `score_events` las de evento
+    activas también puntúan (solo change_event). Devuelve un resumen para el log."""
+    start = time.perf_counter()
+    row = await conn.fetchrow(EXPIRE_PRESENTATIONS, older_than, presentation_type, score_events)
+
+    summary = dict(row)
+    summary["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    if summary["expired"]:
+        logging.info(f"Presentaciones expiradas: {summary}")
+    return summary
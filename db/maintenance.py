@@ -0,0 +1,66 @@
+import time, logging
+from db.connection import get_pool
+
+# Tareas semanales de mantenimiento.
+# Cada tarea es una sola sentencia SQL (los CTE devuelven cuántas filas tocó)
+# ejecutada dentro de una transacción; se registra filas afectadas y duración.
+
+MAINTENANCE_JOBS = {
+    "reset_fcr": """
+        WITH u AS (
+            UPDATE users SET can_fcr = TRUE RETURNING 1
+        ), g AS (
+            UPDATE groups SET first_presentation = TRUE RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM u) AS users, (SELECT COUNT(*) FROM g) AS groups
+    """,
+    # Mismo cálculo que antes en Python: int(popularity * (0.9 - 0.03 * unpaid_weeks))
+    "reduce_popularity": """
+        WITH g AS (
+            UPDATE groups
+            SET popularity = trunc(popularity::float8 * (0.9::float8 - 0.03::float8 * unpaid_weeks))::int
+            WHERE status <> 'creating'
+            RETURNING 1
+        )
+        SELECT COUNT(*) AS groups FROM g
+    """,
+    "reduce_influence": """
+        WITH u AS (
+            UPDATE users SET influence_temp = influence_temp * 0.9 RETURNING 1
+        )
+        SELECT COUNT(*) AS users FROM u
+    """,
+}
+
+
+async def run_maintenance_job(job: str, conn=None) -> dict:
+    """Ejecuta una tarea de mantenimiento y devuelve filas afectadas y duración.
+    Con `conn` se ejecuta dentro de la transacción de quien llama."""
+    start = time.perf_counter()
+    if conn is not None:
+        row = await conn.fetchrow(MAINTENANCE_JOBS[job])
+    else:
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                row = await conn.fetchrow(MAINTENANCE_JOBS[job])
+
+    result = {
+        "job": job,
+        "rows": dict(row),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+    logging.info(f"Mantenimiento {job}: {result['rows']} en {result['duration_ms']} ms")
+    return result
+
+
+async def reset_fcr(conn=None) -> dict:
+    return await run_maintenance_job("reset_fcr", conn)
+
+
+async def reduce_popularity(conn=None) -> dict:
+    return await run_maintenance_job("reduce_popularity", conn)
+
+
+async def reduce_influence(conn=None) -> dict:
+    return await run_maintenance_job("reduce_influence", conn)
@@ -0,0 +1,160 @@
+import asyncio, bisect, contextvars, logging, re
+
+# Métricas de la base de datos en memoria: latencia y filas por consulta, y
+# espera para obtener una conexión del pool. Las consultas se agrupan por su
+# texto normalizado (sin espacios repetidos, recortado).
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+LABEL_LENGTH = 90
+REPORT_INTERVAL = 600  # segundos entre resúmenes en el log
+
+# Otras estadísticas en memoria que se agregan al resumen periódico:
+# nombre -> función sin argumentos que devuelve un dict
+REPORT_SOURCES = {}
+
+_whitespace = re.compile(r"\s+")
+
+
+class DbTimer:
+    """Tiempo de base de datos acumulado por una tarea (ver start_db_timer)."""
+    __slots__ = ("queries", "total_ms")
+
+    def __init__(self):
+        self.queries = 0
+        self.total_ms = 0.0
+
+
+_db_timer = contextvars.ContextVar("db_timer", default=None)
+
+
+def start_db_timer() -> DbTimer:
+    """Empieza a sumar el tiempo de las consultas de la tarea actual (y de las
+    que cree a partir de ahora) en un DbTimer nuevo."""
+    timer = DbTimer()
+    _db_timer.set(timer)
+    return timer
+
+
+def query_label(query: str) -> str:
+    return _whitespace.sub(" ", query).strip()[:LABEL_LENGTH]
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # el último es "más que el mayor"
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """Límite superior del bucket donde cae el percentil p (0-1)."""
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, round(self.max, 2))
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": round(self.max, 2),
+            "buckets": dict(zip([*map(str, self.bounds), "inf"], self.counts))
+        }
+
+
+class QueryStats:
+    __slots__ = ("latency", "rows", "errors")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.rows = Histogram(ROW_BUCKETS)
+        self.errors = 0
+
+
+class DatabaseMetrics:
+    def __init__(self):
+        self.queries = {}  # etiqueta -> QueryStats
+        self.acquire_wait = Histogram(LATENCY_BUCKETS_MS)
+        self.connections_opened = 0
+
+    def record_query(self, query: str, elapsed_ms: float, rows: int = None, error: bool = False):
+        timer = _db_timer.get()
+        if timer is not None:
+            timer.queries += 1
+            timer.total_ms += elapsed_ms
+        label = query_label(query)
+        stats = self.queries.get(label)
+        if stats is None:
+            stats = self.queries[label] = QueryStats()
+        stats.latency.observe(elapsed_ms)
+        if rows is not None:
+            stats.rows.observe(rows)
+        if error:
+            stats.errors += 1
+
+    def record_acquire(self, elapsed_ms: float):
+        self.acquire_wait.observe(elapsed_ms)
+
+    def top_queries(self, n: int = 10, key: str = "total") -> list[tuple]:
+        """Consultas con más tiempo acumulado ("total"), más llamadas ("count") o más lentas ("max")."""
+        return sorted(
+            self.queries.items(),
+            key=lambda item: getattr(item[1].latency, key),
+            reverse=True
+        )[:n]
+
+    def snapshot(self, n: int = 10) -> dict:
+        return {
+            "acquire_wait_ms": self.acquire_wait.snapshot(),
+            "connections_opened": self.connections_opened,
+            "queries": {
+                label: {
+                    "latency_ms": stats.latency.snapshot(),
+                    "rows": stats.rows.snapshot(),
+                    "errors": stats.errors
+                }
+                for label, stats in self.top_queries(n)
+            }
+        }
+
+    def log_summary(self, n: int = 5):
+        wait = self.acquire_wait.snapshot()
+        logging.info(
+            f"db: {wait['count']} acquires, espera p50={wait['p50']}ms p95={wait['p95']}ms "
+            f"max={wait['max']}ms, {self.connections_opened} conexiones abiertas"
+        )
+        for label, stats in self.top_queries(n):
+            lat = stats.latency
+            logging.info(
+                f"db: {lat.count}x total={round(lat.total)}ms p95={lat.percentile(0.95)}ms "
+                f"filas~{round(stats.rows.total / stats.rows.count, 1) if stats.rows.count else 0} | {label}"
+            )
+
+
+metrics = DatabaseMetrics()
+
+
+async def run_metrics_report(interval: float = REPORT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        metrics.log_summary()
+        for name, source in REPORT_SOURCES.items():
+            logging.info(f"{name}: {source()}")
@@ -0,0 +1,166 @@
+import json, logging
+from db.connection import get_pool
+
+# Migraciones versionadas que se aplican después de create_all_tables.
+# Cada versión se ejecuta una sola vez, en su propia transacción, y queda
+# registrada en schema_version. Para agregar cambios, añadir una versión nueva
+# al final de MIGRATIONS; nunca modificar una ya publicada.
+
+MIGRATION_LOCK_ID = 715001  # pg_advisory_lock: evita que dos procesos migren a la vez
+
+MIGRATIONS = [
+    (1, "Índices para las consultas más frecuentes", [
+        # Inventario: cartas de un usuario (por estado) y búsquedas por carta
+        "CREATE INDEX IF NOT EXISTS idx_user_idol_cards_user_status ON user_idol_cards (user_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_user_idol_cards_card ON user_idol_cards (card_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_item_cards_user_status ON user_item_cards (user_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_players_packs_user ON players_packs (user_id)",
+        # Presentaciones: miembros por posición y secciones de la canción
+        "CREATE INDEX IF NOT EXISTS idx_presentation_members_position ON presentation_members (presentation_id, current_position)",
+        "CREATE INDEX IF NOT EXISTS idx_song_sections_song ON song_sections (song_id, section_number)",
+        # Presentaciones sin terminar que revisa cancel_presentation
+        """CREATE INDEX IF NOT EXISTS idx_presentations_open ON presentations (presentation_date)
+           WHERE status IN ('preparation', 'active')""",
+        "CREATE INDEX IF NOT EXISTS idx_user_missions_user_status ON user_missions (user_id, status)",
+        # giveaway_entries (giveaway_id, user_id) y event_participation (instance_id, user_id)
+        # ya tienen índice por su UNIQUE, que sirve para filtrar por la primera columna
+    ]),
+    (2, "Registro de interacciones (utils/telemetry.py)", [
+        """CREATE TABLE IF NOT EXISTS interaction_log (
+            created_at TIMESTAMPTZ NOT NULL,
+            user_id BIGINT NOT NULL,
+            guild_id BIGINT,
+            kind TEXT NOT NULL,
+            name TEXT,
+            label TEXT,
+            response_ms REAL,
+            db_ms REAL,
+            db_queries INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_interaction_log_created ON interaction_log (created_at)",
+    ]),
+    (3, "Índices para la paginación del inventario de idols", [
+        # Orden por defecto de /inventory idol_cards (IdolCardQuery): el keyset
+        # (date_obtained, unique_id) avanza por el índice en ASC y en DESC
+        """CREATE INDEX IF NOT EXISTS idx_user_idol_cards_user_date
+           ON user_idol_cards (user_id, date_obtained, unique_id)""",
+        # Copias de cada carta de la página
+        "CREATE INDEX IF NOT EXISTS idx_user_idol_cards_user_card ON user_idol_cards (user_id, card_id)",
+    ]),
+]
+
+# Consultas frecuentes y el índice que deben usar (ver check_query_plans)
+HOT_QUERIES = [
+    ("inventario de cartas",
+     "SELECT * FROM user_idol_cards WHERE user_id = $1 AND status = $2",
+     (0, "available"), "idx_user_idol_cards_user_status"),
+    ("página del inventario",
+     """SELECT * FROM user_idol_cards WHERE user_id = $1 AND (date_obtained, unique_id) < ($2, $3)
+        ORDER BY date_obtained DESC, unique_id DESC LIMIT 4""",
+     (0, None, ""), "idx_user_idol_cards_user_date"),
+    ("copias de una carta",
+     "SELECT unique_id FROM user_idol_cards WHERE card_id = $1",
+     ("",), "idx_user_idol_cards_card"),
+    ("miembros por posición",
+     "SELECT * FROM presentation_members WHERE presentation_id = $1 AND current_position = $2",
+     ("", "front"), "idx_presentation_members_position"),
+    ("sección de una canción",
+     "SELECT * FROM song_sections WHERE song_id = $1 AND section_number = $2",
+     ("", 1), "idx_song_sections_song"),
+    ("misiones activas",
+     "SELECT * FROM user_missions WHERE user_id = $1 AND status = 'active'",
+     (0,), "idx_user_missions_user_status"),
+    ("participantes de un sorteo",
+     "SELECT user_id FROM giveaway_entries WHERE giveaway_id = $1",
+     ("",), "giveaway_entries_giveaway_id_user_id_key"),
+    ("participaciones de un evento",
+     "SELECT * FROM event_participation WHERE instance_id = $1 AND normal_score > 0",
+     (0,), "event_participation_instance_id_user_id_key"),
+    ("presentaciones vencidas",
+     """SELECT presentation_id FROM presentations
+        WHERE status IN ('preparation', 'active') AND presentation_date < now()""",
+     (), "idx_presentations_open"),
+]
+
+
+async def create_schema_version_table(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMPTZ DEFAULT now()
+        );
+    """)
+
+
+async def run_migrations() -> list[int]:
+    """Aplica las migraciones pendientes y devuelve sus versiones."""
+    applied_now = []
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await create_schema_version_table(conn)
+            applied = {r["version"] for r in await conn.fetch("SELECT version FROM schema_version")}
+
+            for version, description, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                async with conn.transaction():
+                    for statement in statements:
+                        await conn.execute(statement)
+                    await conn.execute(
+                        "INSERT INTO schema_version (version, description) VALUES ($1, $2)",
+                        version, description
+                    )
+                applied_now.append(version)
+                logging.info(f"Migración {version} aplicada: {description}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    return applied_now
+
+
+def plan_indexes(plan: dict) -> set[str]:
+    indexes = set()
+    if "Index Name" in plan:
+        indexes.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+
+async def check_query_plans() -> list[str]:
+    """Revisa con EXPLAIN que cada consulta de HOT_QUERIES use su índice.
+    Se desactiva el seq scan para que el resultado no dependa del tamaño de las
+    tablas (con pocas filas Postgres prefiere recorrerlas). Devuelve los fallos."""
+    failures = []
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        for name, query, params, index in HOT_QUERIES:
+            async with conn.transaction():
+                await conn.execute("SET LOCAL enable_seqscan = off")
+                raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params)
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            used = plan_indexes(plan)
+            if index not in used:
+                failures.append(f"{name}: esperaba {index}, usa {sorted(used) or plan['Node Type']}")
+    return failures
+
+
+async def main(command: str):
+    from db.connection import create_pool
+    await create_pool()
+    if command == "check":
+        failures = await check_query_plans()
+        for failure in failures:
+            print(f"❌ {failure}")
+        print("✅ Todas las consultas usan su índice" if not failures else f"{len(failures)} consultas sin índice")
+        raise SystemExit(1 if failures else 0)
+    applied = await run_migrations()
+    print(f"Migraciones aplicadas: {applied or 'ninguna'}")
+
+
+if __name__ == "__main__":
+    # Uso: python -m db.migrations [migrate|check]
+    import asyncio, sys
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "migrate"))
@@ -0,0 +1,80 @@
+import asyncio, logging
+from collections import defaultdict
+from db.connection import get_pool
+
+# Progreso de misiones fuera del camino de cada interacción.
+# Los comandos llaman a emit(user_id, mission_type, n) sin tocar la base; los
+# incrementos se acumulan por (usuario, tipo) y se aplican cada FLUSH_INTERVAL
+# segundos con una sola sentencia para todos los usuarios.
+
+FLUSH_INTERVAL = 2  # segundos
+
+APPLY_PROGRESS = """
+    UPDATE user_missions um
+    SET obtained = um.obtained + v.n,
+        last_updated = now()
+    FROM missions_base mb,
+         unnest($1::bigint[], $2::text[], $3::int[]) AS v(user_id, mission_type, n)
+    WHERE um.mission_id = mb.mission_id
+    AND um.user_id = v.user_id
+    AND um.status = 'active'
+    AND mb.mission_type = v.mission_type
+"""
+
+
+class MissionProgressBus:
+    def __init__(self):
+        self._pending = defaultdict(int)  # (user_id, mission_type) -> incremento acumulado
+        self._lock = asyncio.Lock()
+        self.emitted = 0
+        self.flushed = 0
+
+    def emit(self, user_id: int, mission_type: str, n: int = 1):
+        if n <= 0:
+            return
+        self._pending[(user_id, mission_type)] += n
+        self.emitted += 1
+
+    async def flush(self) -> int:
+        """Aplica los incrementos pendientes; devuelve cuántos (usuario, tipo) se enviaron."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, defaultdict(int)
+            keys = list(batch)
+            try:
+                pool = get_pool()
+                async with pool.acquire() as conn:
+                    await conn.execute(
+                        APPLY_PROGRESS,
+                        [k[0] for k in keys], [k[1] for k in keys], [batch[k] for k in keys]
+                    )
+            except Exception as e:
+                # Se devuelven a la cola para el siguiente intento
+                for key, n in batch.items():
+                    self._pending[key] += n
+                logging.error(f"mission_events: no se pudo aplicar el progreso ({len(batch)} pendientes): {e}")
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    async def run(self, interval: float = FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+
+_bus = MissionProgressBus()
+
+
+def emit(user_id: int, mission_type: str, n: int = 1):
+    """Suma `n` al progreso de las misiones activas de tipo `mission_type` del usuario."""
+    _bus.emit(user_id, mission_type, n)
+
+
+async def flush() -> int:
+    return await _bus.flush()
+
+
+async def run_mission_events(interval: float = FLUSH_INTERVAL):
+    await _bus.run(interval)
@@ -0,0 +1,145 @@
+import random
+from collections import defaultdict
+from db.connection import get_pool
+
+# Asignación de misiones diarias/semanales por lotes.
+# Se cargan una sola vez las misiones base y las misiones activas de todos los
+# usuarios, se eligen las nuevas en memoria con las mismas reglas de siempre y
+# se insertan todas con un solo executemany.
+
+INSERT_USER_MISSION = """
+    INSERT INTO user_missions (
+        user_id, mission_number, mission_id, needed, obtained,
+        pack_id, redeemable_id, credits, xp, status, assigned_at, last_updated
+    ) VALUES (
+        $1, $2, $3, $4, 0,
+        $5, $6, $7, $8, 'active', now(), now()
+    )
+    ON CONFLICT DO NOTHING
+"""
+
+
+async def load_missions_by_difficulty(conn) -> dict:
+    rows = await conn.fetch("""
+        SELECT mission_id, mission_type, difficulty, needed, pack_id, redeemable_id, credits, xp
+        FROM missions_base
+    """)
+    missions = defaultdict(list)
+    for m in rows:
+        missions[m["difficulty"]].append(m)
+    return missions
+
+
+async def load_active_missions(conn, numbers: list[int] = None) -> dict:
+    """Misiones activas de todos los usuarios agrupadas por user_id."""
+    rows = await conn.fetch("""
+        SELECT um.user_id, um.mission_number, um.mission_id, mb.mission_type
+        FROM user_missions um
+        LEFT JOIN missions_base mb ON um.mission_id = mb.mission_id
+        WHERE um.status = 'active' AND ($1::int[] IS NULL OR um.mission_number = ANY($1::int[]))
+    """, numbers)
+    active = defaultdict(list)
+    for r in rows:
+        active[r["user_id"]].append(r)
+    return active
+
+
+def mission_record(user_id: int, mission_number: int, m) -> tuple:
+    return (
+        user_id,
+        mission_number,
+        m["mission_id"],
+        int(m["needed"] or 1),
+        m["pack_id"] or None,
+        m["redeemable_id"] or None,
+        int(m["credits"] or 0),
+        int(m["xp"] or 1)
+    )
+
+
+def pick_daily_missions(user_id: int, active_rows: list, missions: dict, rng=random) -> list[tuple]:
+    """Slot 1 exploratoria, slots 2 y 3 fáciles; sin repetir misión ni tipo."""
+    active_ids = {r["mission_id"] for r in active_rows if r["mission_id"]}
+    active_types = {r["mission_type"] for r in active_rows if r["mission_type"]}
+    active_by_number = {r["mission_number"]: r["mission_id"] for r in active_rows if r["mission_id"]}
+
+    records = []
+    for number, difficulty, check_type in ((1, "exploratory", False), (2, "easy", True), (3, "easy", True)):
+        if number in active_by_number:
+            continue
+        candidates = [
+            m for m in missions.get(difficulty, [])
+            if m["mission_id"] not in active_ids and (not check_type or m["mission_type"] not in active_types)
+        ]
+        if not candidates:
+            continue
+        m = rng.choice(candidates)
+        records.append(mission_record(user_id, number, m))
+        active_ids.add(m["mission_id"])
+        active_by_number[number] = m["mission_id"]
+        if m["mission_type"]:
+            active_types.add(m["mission_type"])
+    return records
+
+
+def pick_weekly_missions(user_id: int, active_rows: list, missions: dict, rng=random) -> list[tuple]:
+    """Slot 4 media y slot 5 difícil, evitando repetir el tipo de la otra semanal."""
+    active_by_number = {r["mission_number"]: r["mission_id"] for r in active_rows if r["mission_id"]}
+    active_types = {r["mission_type"] for r in active_rows if r["mission_type"]}
+    type_by_number = {r["mission_number"]: r["mission_type"] for r in active_rows}
+    medium_missions = missions.get("medium", [])
+    hard_missions = missions.get("hard", [])
+
+    records = []
+    if 4 not in active_by_number and medium_missions:
+        forbidden_type = type_by_number.get(5) if 5 in active_by_number else None
+        candidates = [
+            m for m in medium_missions
+            if forbidden_type is None or m["mission_type"] != forbidden_type
+        ] or list(medium_missions)
+        m = rng.choice(candidates)
+        records.append(mission_record(user_id, 4, m))
+        if m["mission_type"]:
+            active_types.add(m["mission_type"])
+            active_by_number[4] = m["mission_id"]
+
+    if 5 not in active_by_number and hard_missions:
+        candidates = [
+            m for m in hard_missions
+            if m["mission_type"] not in active_types
+        ] or list(hard_missions)
+        m = rng.choice(candidates)
+        records.append(mission_record(user_id, 5, m))
+
+    return records
+
+
+async def assign_missions(numbers: list[int], difficulties: tuple, pick, conn=None) -> int:
+    if conn is None:
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            return await assign_missions(numbers, difficulties, pick, conn)
+
+    missions = await load_missions_by_difficulty(conn)
+    if not any(missions.get(d) for d in difficulties):
+        return 0
+
+    users = await conn.fetch("SELECT user_id FROM users")
+    active = await load_active_missions(conn, numbers)
+
+    records = []
+    for u in users:
+        records.extend(pick(u["user_id"], active.get(u["user_id"], []), missions))
+
+    if records:
+        async with conn.transaction():
+            await conn.executemany(INSERT_USER_MISSION, records)
+    return len(records)
+
+
+async def assign_daily_missions(conn=None) -> int:
+    return await assign_missions(None, ("exploratory", "easy"), pick_daily_missions, conn)
+
+
+async def assign_weekly_missions(conn=None) -> int:
+    return await assign_missions([4, 5], ("medium", "hard"), pick_weekly_missions, conn)
@@ -3,7 +3,7 @@ from db.connection import get_pool
 import logging
 
 async def restore_giveaways(bot):
-    pool = await get_pool()
+    pool = get_pool()
     async with pool.acquire() as conn:
         active_giveaways = await conn.fetch(
             "SELECT giveaway_id, channel_id, message_id FROM giveaways WHERE active=TRUE"
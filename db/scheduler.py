@@ -0,0 +1,299 @@
+import asyncio, contextlib, datetime, json, logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+from db.connection import get_pool
+
+# Planificador de las tareas de loop_events.
+# Carga las definiciones una sola vez, calcula la próxima ejecución de cada
+# tarea y duerme exactamente hasta la más cercana. Las tareas que vencen juntas
+# corren en paralelo salvo que compartan grupo (mismo orden que antes dentro
+# del grupo), cada una con su propio timeout.
+#
+# Cada ejecución queda registrada en loop_event_runs. Los efectos de la tarea
+# se hacen en la conexión de la ejecución (run.conn) dentro de una transacción
+# que también actualiza last_applied, así que una caída a mitad de la tarea no
+# deja efectos a medias ni provoca que se repitan. Las tareas largas guardan
+# avances con run.save_checkpoint(); al reiniciar se retoma la ejecución abierta
+# con su último checkpoint. Lo que no se puede deshacer (DMs, mensajes, recargar
+# el catálogo) se agenda con run.after_commit() y se ejecuta tras cada commit.
+# Las esperas largas fuera de la base de datos van dentro de run.detached(),
+# sin transacción abierta ni conexión tomada del pool.
+
+EJECUCION_HORA_UTC = 5  # 05:00 UTC
+GRACE_DAYS = 50  # días de tolerancia para ejecución tardía
+FRECUENTE_MINUTOS = 5
+RETRY_MINUTES = 5  # espera antes de reintentar una tarea que falló
+MAX_SLEEP_SECONDS = 3600  # despertar al menos cada hora por si cambia el reloj
+RUN_RETENTION_DAYS = 30  # ejecuciones terminadas que se conservan en loop_event_runs
+
+
+@dataclass
+class ScheduledJob:
+    event: str
+    callback: Callable[[], Awaitable]
+    group: str
+    timeout: float
+    last_applied: Optional[datetime.datetime] = None
+    frecuencia_tipo: Optional[str] = None
+    dia_semana: Optional[int] = None
+    dia_mes: Optional[int] = None
+    retry_at: Optional[datetime.datetime] = None
+
+
+def at_run_hour(day: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(
+        year=day.year, month=day.month, day=day.day,
+        hour=EJECUCION_HORA_UTC, tzinfo=datetime.timezone.utc
+    )
+
+
+def scheduled_for(job: ScheduledJob, now: datetime.datetime) -> Optional[datetime.datetime]:
+    """Fecha en que debió ejecutarse la tarea en el periodo actual (misma regla que antes)."""
+    tipo = job.frecuencia_tipo
+    if tipo == 'diaria':
+        return at_run_hour(now)
+    if tipo == 'semanal':
+        dias_desde_dia = (now.weekday() - job.dia_semana) % 7
+        return at_run_hour(now) - datetime.timedelta(days=dias_desde_dia)
+    if tipo == 'mensual':
+        try:
+            return at_run_hour(now).replace(day=job.dia_mes)
+        except ValueError:
+            return None  # Día inválido para este mes (por ejemplo, 31 de febrero)
+    if tipo == 'frecuente':
+        return job.last_applied + datetime.timedelta(minutes=FRECUENTE_MINUTOS)
+    return None
+
+
+def next_period(job: ScheduledJob, scheduled: datetime.datetime) -> Optional[datetime.datetime]:
+    tipo = job.frecuencia_tipo
+    if tipo == 'diaria':
+        return scheduled + datetime.timedelta(days=1)
+    if tipo == 'semanal':
+        return scheduled + datetime.timedelta(days=7)
+    if tipo == 'mensual':
+        year, month = scheduled.year, scheduled.month
+        for _ in range(12):
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            try:
+                return scheduled.replace(year=year, month=month, day=job.dia_mes)
+            except ValueError:
+                continue
+    return None
+
+
+def next_due(job: ScheduledJob, now: datetime.datetime) -> Optional[datetime.datetime]:
+    """Momento en que la tarea debe ejecutarse; <= now significa que ya venció."""
+    if job.last_applied is None:
+        return None
+
+    if job.frecuencia_tipo == 'mensual':
+        # Si el día no existe este mes se busca el siguiente mes válido
+        scheduled = scheduled_for(job, now) or next_period(job, at_run_hour(now).replace(day=1))
+    else:
+        scheduled = scheduled_for(job, now)
+    if scheduled is None:
+        return None
+
+    if job.last_applied >= scheduled:
+        scheduled = next_period(job, scheduled)
+        if scheduled is None:
+            return None
+    else:
+        # Ejecución tardía permitida si pasó la tolerancia desde la última vez
+        scheduled = min(scheduled, job.last_applied + datetime.timedelta(days=GRACE_DAYS))
+
+    if job.retry_at:
+        scheduled = max(scheduled, job.retry_at)
+    return scheduled
+
+
+async def load_jobs(jobs: dict[str, ScheduledJob]) -> dict[str, ScheduledJob]:
+    """Carga las definiciones de loop_events; las tareas sin fila no se programan."""
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT event, last_applied, frecuencia_tipo, dia_semana, dia_mes
+            FROM loop_events
+            WHERE event = ANY($1::text[])
+        """, list(jobs))
+
+    loaded = {}
+    for row in rows:
+        job = jobs[row['event']]
+        job.last_applied = row['last_applied']
+        job.frecuencia_tipo = row['frecuencia_tipo']
+        job.dia_semana = row['dia_semana']
+        job.dia_mes = row['dia_mes']
+        loaded[job.event] = job
+    return loaded
+
+
+class JobRun:
+    """Ejecución en curso de una tarea: conexión, checkpoint y filas afectadas."""
+    def __init__(self, run_id: int, event: str, conn, checkpoint: dict = None, rows_touched: int = 0):
+        self.run_id = run_id
+        self.event = event
+        self.conn = conn
+        self.checkpoint = checkpoint or {}
+        self.rows_touched = rows_touched
+        self._transaction = None
+        self._after_commit = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        """Igual que pool.acquire(), pero sobre la conexión de la ejecución."""
+        yield self.conn
+
+    def touched(self, rows: int):
+        self.rows_touched += rows or 0
+
+    def after_commit(self, callback: Callable[[], Awaitable]):
+        """Agenda un efecto externo para cuando se confirme la transacción actual."""
+        self._after_commit.append(callback)
+
+    async def begin(self):
+        self._transaction = self.conn.transaction()
+        await self._transaction.start()
+
+    async def commit(self):
+        await self._transaction.commit()
+        self._transaction = None
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logging.error(f"Error en efecto posterior de {self.event}: {e}")
+
+    async def rollback(self):
+        self._after_commit = []
+        if self._transaction is not None:
+            await self._transaction.rollback()
+            self._transaction = None
+
+    @contextlib.asynccontextmanager
+    async def detached(self):
+        """Confirma lo hecho y devuelve la conexión al pool mientras dura el bloque
+        (p. ej. llamadas largas a Discord); al salir toma otra y abre una transacción nueva."""
+        await self.commit()
+        await get_pool().release(self.conn)
+        self.conn = None
+        try:
+            yield
+        finally:
+            self.conn = await get_pool().acquire()
+            await self.begin()
+
+    async def save_checkpoint(self, **progress):
+        """Confirma lo hecho hasta ahora junto con el avance y abre otra transacción."""
+        self.checkpoint.update(progress)
+        await self.conn.execute("""
+            UPDATE loop_event_runs SET checkpoint = $1, rows_touched = $2 WHERE run_id = $3
+        """, json.dumps(self.checkpoint), self.rows_touched, self.run_id)
+        await self.commit()
+        await self.begin()
+
+
+async def open_run(conn, event: str) -> JobRun:
+    """Retoma la ejecución sin terminar de la tarea o registra una nueva."""
+    row = await conn.fetchrow("""
+        UPDATE loop_event_runs
+        SET status = 'running', attempts = attempts + 1, error = NULL
+        WHERE event = $1 AND status <> 'done'
+        RETURNING run_id, checkpoint, rows_touched
+    """, event)
+    if row:
+        logging.info(f"Retomando ejecución {row['run_id']} de {event}")
+    else:
+        row = await conn.fetchrow("""
+            INSERT INTO loop_event_runs (event) VALUES ($1)
+            RETURNING run_id, checkpoint, rows_touched
+        """, event)
+    checkpoint = json.loads(row['checkpoint']) if row['checkpoint'] else {}
+    return JobRun(row['run_id'], event, conn, checkpoint, row['rows_touched'])
+
+
+async def run_job(job: ScheduledJob):
+    started = datetime.datetime.now(datetime.timezone.utc)
+    pool = get_pool()
+    conn = await pool.acquire()
+    run = None
+    try:
+        run = await open_run(conn, job.event)
+        try:
+            await run.begin()
+            await asyncio.wait_for(job.callback(run), timeout=job.timeout)
+            # Los efectos y el avance de last_applied se confirman juntos
+            await run.conn.execute("""
+                UPDATE loop_events SET last_applied = $1 WHERE event = $2;
+            """, started, job.event)
+            await run.conn.execute("""
+                UPDATE loop_event_runs
+                SET status = 'done', finished_at = now(), rows_touched = $1
+                WHERE run_id = $2
+            """, run.rows_touched, run.run_id)
+            await run.conn.execute("""
+                DELETE FROM loop_event_runs
+                WHERE event = $1 AND status = 'done'
+                AND finished_at < now() - make_interval(days => $2)
+            """, job.event, RUN_RETENTION_DAYS)
+            await run.commit()
+        except Exception as e:
+            await run.rollback()
+            if isinstance(e, asyncio.TimeoutError):
+                error = f"superó el tiempo límite de {job.timeout}s"
+                logging.error(f"Tarea {job.event} {error}")
+            else:
+                error = str(e)
+                logging.exception(f"Error en la tarea {job.event}: {e}")
+            # El checkpoint guardado se conserva para el reintento
+            await run.conn.execute("""
+                UPDATE loop_event_runs SET status = 'failed', error = $1 WHERE run_id = $2
+            """, error, run.run_id)
+            job.retry_at = started + datetime.timedelta(minutes=RETRY_MINUTES)
+            return
+    finally:
+        # La tarea pudo cambiar de conexión con run.detached()
+        held = conn if run is None else run.conn
+        if held is not None:
+            await pool.release(held)
+
+    if run.rows_touched:
+        logging.info(f"Tarea {job.event} completada (ejecución {run.run_id}, {run.rows_touched} filas)")
+    job.last_applied = started
+    job.retry_at = None
+
+
+async def run_group(jobs: list[ScheduledJob]):
+    for job in jobs:
+        try:
+            await run_job(job)
+        except Exception as e:
+            # p. ej. open_run o el registro del fallo con la conexión caída:
+            # se reintenta más tarde sin detener el scheduler
+            logging.exception(f"No se pudo ejecutar la tarea {job.event}: {e}")
+            job.retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=RETRY_MINUTES)
+
+
+async def run_scheduler(jobs: list[ScheduledJob]):
+    scheduled = await load_jobs({job.event: job for job in jobs})
+    order = [job for job in jobs if job.event in scheduled]
+
+    while True:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        dues = {job.event: next_due(job, now) for job in order}
+        due_jobs = [job for job in order if dues[job.event] and dues[job.event] <= now]
+
+        if not due_jobs:
+            pending = [d for d in dues.values() if d]
+            wait = MAX_SLEEP_SECONDS
+            if pending:
+                wait = min(wait, max((min(pending) - now).total_seconds(), 1))
+            await asyncio.sleep(wait)
+            continue
+
+        groups = {}
+        for job in due_jobs:
+            groups.setdefault(job.group, []).append(job)
+        await asyncio.gather(*(run_group(group) for group in groups.values()))
@@ -1,5 +1,62 @@
 from db.connection import get_pool
-import datetime
+from db.migrations import MIGRATIONS, run_migrations
+from contextlib import asynccontextmanager
+import datetime, hashlib, inspect, logging, sys
+
+# Conexión compartida mientras ensure_schema aplica el DDL en una sola transacción
+_ddl_conn = None
+
+@asynccontextmanager
+async def schema_connection():
+    if _ddl_conn is not None:
+        yield _ddl_conn
+    else:
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            yield conn
+
+def schema_fingerprint() -> str:
+    """Huella del esquema: el código de este módulo más las versiones de migraciones."""
+    source = inspect.getsource(sys.modules[__name__])
+    versions = ",".join(str(version) for version, _, _ in MIGRATIONS)
+    return hashlib.sha256(f"{source}|{versions}".encode()).hexdigest()
+
+async def ensure_schema() -> bool:
+    """Crea las tablas y aplica migraciones solo si el esquema cambió desde el
+    último arranque. Devuelve True si se ejecutó el DDL."""
+    global _ddl_conn
+    fingerprint = schema_fingerprint()
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        stored = None
+        if await conn.fetchval("SELECT to_regclass('schema_state') IS NOT NULL"):
+            stored = await conn.fetchval("SELECT fingerprint FROM schema_state WHERE id")
+        if stored == fingerprint:
+            logging.info("Esquema al día, se omite el DDL")
+            return False
+
+        # Todo el DDL por una sola conexión y en una sola transacción
+        async with conn.transaction():
+            _ddl_conn = conn
+            try:
+                await create_all_tables()
+                await create_schema_state_table()
+            finally:
+                _ddl_conn = None
+
+    await run_migrations()
+
+    # La huella se guarda al final: si algo falla, el próximo arranque lo reintenta
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO schema_state (id, fingerprint, updated_at)
+            VALUES (TRUE, $1, now())
+            ON CONFLICT (id) DO UPDATE SET
+            fingerprint = EXCLUDED.fingerprint,
+            updated_at = now()
+        """, fingerprint)
+    logging.info("Esquema actualizado")
+    return True
 
 async def create_all_tables():
     await create_users_table()
@@ -25,7 +82,6 @@ async def create_all_tables():
     await create_groups_members_table()
     await create_songs_table()
     await create_song_sections_table()
-    await create_effects_table()
     await create_presentation_table()
     await create_presentation_members_table()
     await create_presentation_sections_table()
@@ -41,10 +97,11 @@ async def create_all_tables():
     await create_event_instances_table()
     await create_event_participation_table()
     await create_loop_events_table()
+    await create_loop_event_runs_table()
+    await create_unique_id_sequence()
 
 async def create_users_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id BIGINT PRIMARY KEY,
@@ -63,8 +120,7 @@ async def create_users_table():
         """)
 
 async def create_level_rewards_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS level_rewards (
                 level INTEGER PRIMARY KEY,
@@ -77,8 +133,7 @@ async def create_level_rewards_table():
         """)
 
 async def create_user_boosts_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_boosts (
                 user_id BIGINT,
@@ -90,8 +145,7 @@ async def create_user_boosts_table():
 
 
 async def create_cards_idol_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS cards_idol (
                 card_id TEXT PRIMARY KEY,
@@ -114,8 +168,7 @@ async def create_cards_idol_table():
         """)
         
 async def create_cards_item_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS cards_item (
                 item_id TEXT PRIMARY KEY,
@@ -133,8 +186,7 @@ async def create_cards_item_table():
         """)
         
 async def create_cards_performance_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS cards_performance (
                 pcard_id TEXT PRIMARY KEY,
@@ -151,8 +203,7 @@ async def create_cards_performance_table():
         """)
         
 async def create_redeemables_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS redeemables (
                 redeemable_id TEXT PRIMARY KEY,
@@ -164,8 +215,7 @@ async def create_redeemables_table():
         """)
 
 async def create_badges_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS badges (
                 badge_id TEXT PRIMARY KEY,
@@ -177,8 +227,7 @@ async def create_badges_table():
         """)
 
 async def create_packs_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS packs (
                 pack_id TEXT PRIMARY KEY,
@@ -204,8 +253,7 @@ async def create_packs_table():
         """)
   
 async def create_players_packs_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS players_packs (
                 unique_id TEXT PRIMARY KEY,
@@ -220,8 +268,7 @@ async def create_players_packs_table():
         """)
 
 async def create_inventory_idol_cards_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_idol_cards (
                 unique_id TEXT PRIMARY KEY,
@@ -241,8 +288,7 @@ async def create_inventory_idol_cards_table():
         """)
 
 async def create_inventory_item_cards_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_item_cards (
                 unique_id TEXT PRIMARY KEY,
@@ -255,8 +301,7 @@ async def create_inventory_item_cards_table():
         """)
 
 async def create_inventory_performance_cards_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_performance_cards (
                 user_id BIGINT NOT NULL,
@@ -268,8 +313,7 @@ async def create_inventory_performance_cards_table():
         """)
 
 async def create_inventory_redeemables_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_redeemables (
                 user_id BIGINT NOT NULL,
@@ -281,8 +325,7 @@ async def create_inventory_redeemables_table():
         """)
 
 async def create_inventory_badges_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_badges (
                 user_id BIGINT NOT NULL,
@@ -297,8 +340,7 @@ async def create_inventory_badges_table():
 
 
 async def create_idol_group_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS idol_group (
                 idol_id TEXT,
@@ -309,8 +351,7 @@ async def create_idol_group_table():
         """)
 
 async def create_idol_base_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS idol_base (
                 idol_id TEXT PRIMARY KEY,
@@ -323,8 +364,7 @@ async def create_idol_base_table():
         """)
 
 async def create_skills_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS skills (
                 skill_name TEXT PRIMARY KEY,
@@ -345,8 +385,7 @@ async def create_skills_table():
 
 
 async def create_groups_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS groups (
                 group_id TEXT PRIMARY KEY,
@@ -364,8 +403,7 @@ async def create_groups_table():
         """)
 
 async def create_groups_members_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS groups_members (
                 group_id TEXT NOT NULL,
@@ -383,8 +421,7 @@ async def create_groups_members_table():
 
 #-----
 async def create_songs_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS songs (
                 song_id TEXT PRIMARY KEY,
@@ -400,8 +437,7 @@ async def create_songs_table():
         """)
 
 async def create_song_sections_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS song_sections (
                 section_id TEXT PRIMARY KEY,
@@ -430,8 +466,7 @@ ADD COLUMN column_name TEXT NOT NULL DEFAULT '';
 "help.{topic}_{page}"
 
 async def create_effects_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS performance_effects (
                 effect_id TEXT PRIMARY KEY,
@@ -451,8 +486,7 @@ async def create_effects_table():
         """)
 
 async def create_presentation_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS presentations (
                 presentation_id TEXT PRIMARY KEY,
@@ -483,8 +517,7 @@ async def create_presentation_table():
         """)
 
 async def create_presentation_members_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS presentation_members (
                 id SERIAL PRIMARY KEY,
@@ -510,8 +543,7 @@ async def create_presentation_members_table():
 
 
 async def create_presentation_sections_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS presentation_sections (
                 id SERIAL PRIMARY KEY,
@@ -529,8 +561,7 @@ async def create_presentation_sections_table():
 
 
 async def create_idol_usage_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_idol_usage (
                 user_id BIGINT NOT NULL,
@@ -543,8 +574,7 @@ async def create_idol_usage_table():
         """)
 
 async def create_reported_bugs_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS reported_bugs (
                 bug_id SERIAL PRIMARY KEY,
@@ -558,8 +588,7 @@ async def create_reported_bugs_table():
         """)
 
 async def create_trades_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS trades (
                 trade_id TEXT PRIMARY KEY,
@@ -577,8 +606,7 @@ async def create_trades_table():
 
 # - missions
 async def create_missions_base_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS missions_base (
                 mission_id TEXT PRIMARY KEY,
@@ -593,8 +621,7 @@ async def create_missions_base_table():
         """)
         
 async def create_user_missions_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_missions (
                 id SERIAL PRIMARY KEY,
@@ -614,8 +641,7 @@ async def create_user_missions_table():
         """)
 
 async def create_giveaways_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS giveaways (
                 giveaway_id TEXT PRIMARY KEY,
@@ -631,8 +657,7 @@ async def create_giveaways_table():
         """)
 
 async def create_giveaways_entries_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS giveaway_entries (
                 entry_id SERIAL PRIMARY KEY,
@@ -646,8 +671,7 @@ async def create_giveaways_entries_table():
 
 # - events
 async def create_events_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS events (
                 event_id TEXT PRIMARY KEY,
@@ -662,8 +686,7 @@ async def create_events_table():
         """)
 
 async def create_event_rewards_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS event_rewards (
                 reward_id INT PRIMARY KEY,
@@ -680,8 +703,7 @@ async def create_event_rewards_table():
         """)
  
 async def create_event_instances_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS event_instances (
                 instance_id SERIAL PRIMARY KEY,
@@ -699,8 +721,7 @@ async def create_event_instances_table():
         """)
 
 async def create_event_participation_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS event_participation (
                 participation_id SERIAL PRIMARY KEY,
@@ -719,8 +740,7 @@ async def create_event_participation_table():
 # - Loops table
 
 async def create_loop_events_table():
-    pool = get_pool()
-    async with pool.acquire() as conn:
+    async with schema_connection() as conn:
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS loop_events (
                 event TEXT PRIMARY KEY,
@@ -745,29 +765,56 @@ async def create_loop_events_table():
             ('change_event','semanal',0,None)
         ]
 
-        for event_name, tipo, dia_semana, dia_mes in eventos:
-            await conn.execute("""
-                INSERT INTO loop_events (event, frecuencia_tipo, dia_semana, dia_mes)
-                VALUES ($1, $2, $3, $4)
-                ON CONFLICT (event) DO UPDATE 
-                SET frecuencia_tipo = EXCLUDED.frecuencia_tipo,
-                    dia_semana = EXCLUDED.dia_semana,
-                    dia_mes = EXCLUDED.dia_mes;
-            """, event_name, tipo, dia_semana, dia_mes)
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        await conn.executemany("""
+            INSERT INTO loop_events (event, frecuencia_tipo, dia_semana, dia_mes)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (event) DO UPDATE 
+            SET frecuencia_tipo = EXCLUDED.frecuencia_tipo,
+                dia_semana = EXCLUDED.dia_semana,
+                dia_mes = EXCLUDED.dia_mes;
+        """, eventos)
 
+async def create_loop_event_runs_table():
+    async with schema_connection() as conn:
+        # Registro de ejecuciones de loop_events (ver db/scheduler.py)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS loop_event_runs (
+                run_id BIGSERIAL PRIMARY KEY,
+                event TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',  -- running, failed, done
+                started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                finished_at TIMESTAMPTZ,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                rows_touched INTEGER NOT NULL DEFAULT 0,
+                checkpoint JSONB,
+                error TEXT
+            );
+        """)
+        # Solo puede haber una ejecución sin terminar por tarea
+        await conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS loop_event_runs_open
+            ON loop_event_runs (event) WHERE status <> 'done';
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS loop_event_runs_event_finished
+            ON loop_event_runs (event, finished_at);
+        """)
 
+async def create_schema_state_table():
+    async with schema_connection() as conn:
+        # Huella del último esquema aplicado (ver ensure_schema)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_state (
+                id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                fingerprint TEXT NOT NULL,
+                updated_at TIMESTAMPTZ DEFAULT now()
+            );
+        """)
 
+async def create_unique_id_sequence():
+    async with schema_connection() as conn:
+        # Cada nextval reserva un bloque de 50 ids (ver db/unique_ids.py)
+        await conn.execute("""
+            CREATE SEQUENCE IF NOT EXISTS unique_id_seq
+            MINVALUE 0 START WITH 0 INCREMENT BY 50;
+        """)
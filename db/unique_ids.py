@@ -0,0 +1,83 @@
+import asyncio, logging, string
+from collections import deque
+from db.connection import get_pool
+
+# Asignador de unique_id de 5 caracteres (base36) para cartas, items y packs.
+# Los números salen de una secuencia de Postgres en bloques de BLOCK_SIZE y se
+# permutan dentro del espacio de 36^5 ids, así que no hace falta consultar si
+# el id ya existe. Los ids aleatorios generados antes de la secuencia se cargan
+# una vez al iniciar y se saltan.
+
+ALPHABET = string.digits + string.ascii_lowercase
+ID_LENGTH = 5
+ID_SPACE = len(ALPHABET) ** ID_LENGTH
+# Permutación afín n -> (n * MULTIPLIER + OFFSET) % ID_SPACE; MULTIPLIER es coprimo con 36
+MULTIPLIER = 16777619
+OFFSET = 7340033
+BLOCK_SIZE = 50
+
+ID_TABLES = ("user_idol_cards", "user_item_cards", "players_packs")
+
+
+def encode_id(n: int) -> str:
+    value = (n * MULTIPLIER + OFFSET) % ID_SPACE
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, rem = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[rem])
+    return "".join(reversed(chars))
+
+
+class UniqueIdAllocator:
+    def __init__(self):
+        self.legacy_ids = set()
+        self._pending = deque()  # ids reservados que aún no se entregaron
+        self._lock = asyncio.Lock()
+
+    async def load_legacy_ids(self):
+        """Carga los ids aleatorios ya usados para no repetirlos."""
+        query = " UNION ".join(f"SELECT unique_id FROM {table}" for table in ID_TABLES)
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(query)
+        self.legacy_ids = {r["unique_id"] for r in rows if len(r["unique_id"]) == ID_LENGTH}
+        logging.info(f"unique_ids: {len(self.legacy_ids)} ids existentes cargados")
+
+    async def _reserve(self, conn, blocks: int):
+        rows = await conn.fetch(
+            "SELECT nextval('unique_id_seq') AS start FROM generate_series(1, $1)", blocks)
+        for r in rows:
+            self._pending.extend(
+                new_id for new_id in map(encode_id, range(r["start"], r["start"] + BLOCK_SIZE))
+                if new_id not in self.legacy_ids
+            )
+
+    async def allocate(self, amount: int = 1, conn=None) -> list[str]:
+        """Entrega `amount` ids nuevos; solo consulta la secuencia cuando se agota la reserva."""
+        if amount <= 0:
+            return []
+        async with self._lock:
+            while len(self._pending) < amount:
+                blocks = (amount - len(self._pending) + BLOCK_SIZE - 1) // BLOCK_SIZE
+                if conn is None:
+                    pool = get_pool()
+                    async with pool.acquire() as own_conn:
+                        await self._reserve(own_conn, blocks)
+                else:
+                    await self._reserve(conn, blocks)
+            return [self._pending.popleft() for _ in range(amount)]
+
+
+_allocator = UniqueIdAllocator()
+
+
+async def load_unique_ids():
+    await _allocator.load_legacy_ids()
+
+
+async def new_unique_ids(amount: int, conn=None) -> list[str]:
+    return await _allocator.allocate(amount, conn)
+
+
+async def new_unique_id(conn=None) -> str:
+    return (await _allocator.allocate(1, conn))[0]
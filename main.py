@@ -2,13 +2,20 @@ import discord
 import logging
 import os
 from discord.ext import commands
-from discord import InteractionType
-from datetime import datetime
-from config import TOKEN
+from config import TOKEN, LOCALES_HOT_RELOAD
 from db.connection import create_pool
-from db.schema import create_all_tables
+from db.schema import ensure_schema
+from db.catalog import load_catalog
+from db.unique_ids import load_unique_ids
 from db.loop_events import events_loop
+from db import mission_events
+from db.metrics import run_metrics_report, REPORT_SOURCES
 from db.restore import restore_giveaways
+from utils.localization import load_translations, watch_translations
+from utils.language import language_cache_stats
+from utils.emojis import index_all_guild_emojis, index_guild_emojis, forget_guild_emojis
+from utils import telemetry
+from utils.telemetry import TelemetryTree
 from keep_alive import keep_alive
 
 keep_alive()
@@ -16,24 +23,49 @@ keep_alive()
 logging.basicConfig(level=logging.INFO)
 
 class LudiBot(commands.Bot):
+    async def close(self):
+        await mission_events.flush()  # no perder el progreso aún no aplicado
+        await telemetry.flush()
+        await super().close()
+
     async def setup_hook(self):
         asyncio.create_task(events_loop(self))
+        asyncio.create_task(mission_events.run_mission_events())
+        REPORT_SOURCES["idiomas"] = language_cache_stats
+        REPORT_SOURCES["telemetría"] = telemetry.telemetry_stats
+        asyncio.create_task(run_metrics_report())
+        asyncio.create_task(telemetry.run_telemetry_writer())
+        if LOCALES_HOT_RELOAD:
+            asyncio.create_task(watch_translations())
 
 
 intents = discord.Intents.default()
 intents.members = True
 intents.guilds = True
 intents.message_content = True
-bot = LudiBot(command_prefix="!", intents=intents)
+bot = LudiBot(command_prefix="!", intents=intents, tree_cls=TelemetryTree)
 
 @bot.event
 async def on_ready():
     print(f"🟢 Bot conectado como {bot.user}")
+    index_all_guild_emojis(bot.guilds)
     
     await restore_giveaways(bot)
     await bot.tree.sync()
     
 
+@bot.event
+async def on_guild_emojis_update(guild: discord.Guild, before, after):
+    index_guild_emojis(guild, after)
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    index_guild_emojis(guild)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    forget_guild_emojis(guild)
+
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
     logging.warning(f"[Error en comando] Usuario: {interaction.user} ({interaction.user.id}) - Error: {error}")
@@ -45,32 +77,8 @@ async def on_app_command_error(interaction: discord.Interaction, error: discord.
 
 @bot.event
 async def on_interaction(interaction: discord.Interaction):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    user = interaction.user
-
-    if interaction.type == InteractionType.component:
-        data = interaction.data
-        custom_id = data.get("custom_id")
-        label = None
-
-        # Buscamos el componente presionado dentro de interaction.message.components
-        if interaction.message and interaction.message.components:
-            for action_row in interaction.message.components:
-                for child in action_row.children:
-                    if getattr(child, "custom_id", None) == custom_id:
-                        label = getattr(child, "label", None)
-                        break
-                if label:
-                    break
-
-        if label:
-            logging.info(f"[{now}] [Botón] User: {user} ({user.id}) – Label: {label}")
-        else:
-            logging.info(f"[{now}] [Componente] User: {user} ({user.id})")
-
-    elif interaction.type.name == "application_command":
-        full_cmd = interaction.command.qualified_name
-        logging.info(f"[{now}] [Comando] User: {user} ({user.id}) – Comando: /{full_cmd}")
+    # Se encola un evento estructurado; la escritura la hace run_telemetry_writer
+    await telemetry.record_interaction(interaction)
 
 
 # 🔁 Carga todas las extensiones de la carpeta commands/
@@ -83,7 +91,10 @@ async def load_extensions():
 
 async def main():
     await create_pool()
-    await create_all_tables()
+    await ensure_schema()
+    await load_catalog()
+    await load_unique_ids()
+    load_translations()
     print("Base de datos inicializada.")
 
     await load_extensions()
@@ -1,6 +1,50 @@
 import discord
 
+# Índice nombre -> emoji (como texto) por guild.
+# Se construye en on_ready y se actualiza con on_guild_emojis_update, así que
+# get_emoji es una búsqueda en un dict en lugar de recorrer guild.emojis.
+
+MISSING_EMOJI = "❔"
+
+_guild_emojis: dict[int, dict[str, str]] = {}
+_any_guild: dict[str, str] = {}  # respaldo para DMs: primer emoji con ese nombre en cualquier guild
+
+
+def _rebuild_any_guild():
+    _any_guild.clear()
+    for emojis in _guild_emojis.values():
+        for name, emoji in emojis.items():
+            _any_guild.setdefault(name, emoji)
+
+
+def index_guild_emojis(guild: discord.Guild, emojis=None) -> dict[str, str]:
+    index = {}
+    for emoji in guild.emojis if emojis is None else emojis:
+        index.setdefault(emoji.name, str(emoji))  # igual que discord.utils.get: gana el primero
+    _guild_emojis[guild.id] = index
+    _rebuild_any_guild()
+    return index
+
+
+def index_all_guild_emojis(guilds):
+    for guild in guilds:
+        index = {}
+        for emoji in guild.emojis:
+            index.setdefault(emoji.name, str(emoji))
+        _guild_emojis[guild.id] = index
+    _rebuild_any_guild()
+
+
+def forget_guild_emojis(guild: discord.Guild):
+    _guild_emojis.pop(guild.id, None)
+    _rebuild_any_guild()
+
+
 def get_emoji(guild: discord.Guild, emoji_name: str) -> str:
+    if guild is None:
+        return _any_guild.get(emoji_name, MISSING_EMOJI)
 
-    emoji = discord.utils.get(guild.emojis, name=emoji_name)
-    return str(emoji) if emoji else "❔"
\ No newline at end of file
+    index = _guild_emojis.get(guild.id)
+    if index is None:
+        index = index_guild_emojis(guild)
+    return index.get(emoji_name, MISSING_EMOJI)
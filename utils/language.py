@@ -1,9 +1,77 @@
+import time
+from collections import OrderedDict
 from db.connection import get_pool
 
+# Caché por proceso del idioma de cada usuario (LRU con TTL).
+# LanguageButton (commands/agency.py) la invalida al cambiar el idioma.
+
+LANGUAGE_CACHE_TTL = 600  # segundos
+LANGUAGE_CACHE_SIZE = 5000
+DEFAULT_LANGUAGE = "en"
+
+
+class LanguageCache:
+    def __init__(self, maxsize: int = LANGUAGE_CACHE_SIZE, ttl: float = LANGUAGE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (idioma, expira)
+
+    def get(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user_id: int, language: str):
+        self._entries[user_id] = (language, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int = None):
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+_cache = LanguageCache()
+
+
 async def get_user_language(user_id: int) -> str:
-    pool = await get_pool()
+    language = _cache.get(user_id)
+    if language is not None:
+        return language
+
+    pool = get_pool()
     async with pool.acquire() as conn:
         row = await conn.fetchrow("SELECT language FROM users WHERE user_id = $1", user_id)
-        if row and row["language"]:
-            return row["language"]
-    return "en"  # idioma por defecto
\ No newline at end of file
+    if not row:
+        # Sin registro aún: no se cachea, el idioma se elige al crear la agencia
+        return DEFAULT_LANGUAGE
+    language = row["language"] or DEFAULT_LANGUAGE  # idioma por defecto
+    _cache.put(user_id, language)
+    return language
+
+
+def invalidate_user_language(user_id: int = None):
+    """Borra el idioma cacheado de un usuario (o de todos si no se indica)."""
+    _cache.invalidate(user_id)
+
+
+def language_cache_stats() -> dict:
+    return _cache.stats()
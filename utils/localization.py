@@ -1,38 +1,143 @@
-import json
+import asyncio, json, logging
 from pathlib import Path
+from string import Formatter
 
-# Diccionario en caché para evitar recargar archivos en cada uso
-_loaded_translations = {}
+# Catálogo de traducciones compilado al iniciar.
+# Cada idioma queda combinado con sus respaldos (idioma -> en -> es), así que
+# get_translation hace una sola búsqueda. Los textos se analizan una vez: los que
+# no tienen variables se devuelven tal cual sin llamar a format().
 
-def get_translation(language: str, key: str, **kwargs) -> str:
-    global _loaded_translations
-
-    def load_language(lang):
-        if lang not in _loaded_translations:
-            lang_path = Path("locales") / f"{lang}.json"
-            try:
-                with lang_path.open("r", encoding="utf-8") as f:
-                    _loaded_translations[lang] = json.load(f)
-            except FileNotFoundError:
-                _loaded_translations[lang] = {}
-
-    load_language(language)
-    if language != "en":
-        load_language("en")
-    if language != "es":
-        load_language("es")
-
-    text = (
-        _loaded_translations[language].get(key)
-        or _loaded_translations.get("en", {}).get(key)
-        or _loaded_translations.get("es", {}).get(key)
-    )
-
-    if text is None:
-        return f"[Missing translation: {key}]"
-
-    # Reemplazar variables dinámicas
+LOCALES_DIR = Path("locales")
+FALLBACK_LANGUAGES = ("en", "es")
+RELOAD_INTERVAL = 5  # segundos entre revisiones de los archivos con recarga activa
+
+
+class Template:
+    __slots__ = ("text", "fields", "literal")
+
+    def __init__(self, text: str):
+        try:
+            parsed = list(Formatter().parse(text))
+        except ValueError:
+            # Llaves sin cerrar: el texto sigue pasando por format(), que lanza
+            # ValueError igual que antes
+            self.text, self.fields, self.literal = text, frozenset(), False
+            return
+        self.fields = frozenset(
+            name.split(".")[0].split("[")[0] for _, name, _, _ in parsed
+            if name is not None
+        )
+        self.literal = not self.fields
+        # Sin variables: se guarda ya sin escapes ({{ -> {)
+        self.text = text if self.fields else "".join(literal for literal, _, _, _ in parsed)
+
+    def render(self, kwargs: dict) -> str:
+        if self.literal:
+            return self.text
+        try:
+            return self.text.format(**kwargs)
+        except KeyError as e:
+            return f"[Translation error: missing {e.args[0]}]"
+
+
+class TranslationCatalog:
+    def __init__(self, sources: dict[str, dict], mtimes: dict = None):
+        self.sources = sources
+        self.mtimes = mtimes or {}
+        self.languages = {}
+        keys = set().union(*sources.values()) if sources else set()
+
+        for lang in sources:
+            chain = [lang] + [f for f in FALLBACK_LANGUAGES if f != lang]
+            merged = {}
+            for key in keys:
+                for source in chain:
+                    text = sources.get(source, {}).get(key)
+                    if text:
+                        merged[key] = Template(text)
+                        break
+            self.languages[lang] = merged
+        # Idiomas sin archivo usan el mismo orden de respaldo que antes
+        self.default = self.languages.get("en") or self.languages.get("es") or {}
+
+    def missing_keys(self) -> dict[str, set]:
+        """Claves que cada archivo no define y se resuelven por respaldo."""
+        keys = set().union(*self.sources.values()) if self.sources else set()
+        return {lang: keys - set(k for k, v in texts.items() if v) for lang, texts in self.sources.items()}
+
+    def mismatched_fields(self) -> list[tuple]:
+        """Claves cuyas variables difieren entre idiomas."""
+        mismatched = []
+        keys = set().union(*self.sources.values()) if self.sources else set()
+        for key in sorted(keys):
+            fields = {
+                lang: Template(texts[key]).fields
+                for lang, texts in self.sources.items() if texts.get(key)
+            }
+            if len(set(fields.values())) > 1:
+                mismatched.append((key, fields))
+        return mismatched
+
+    def get(self, language: str, key: str, kwargs: dict) -> str:
+        template = self.languages.get(language, self.default).get(key)
+        if template is None:
+            return f"[Missing translation: {key}]"
+        return template.render(kwargs)
+
+
+def read_sources(locales_dir: Path = LOCALES_DIR) -> tuple[dict, dict]:
+    sources = {}
+    mtimes = {}
+    for path in sorted(locales_dir.glob("*.json")):
+        with path.open("r", encoding="utf-8") as f:
+            sources[path.stem] = json.load(f)
+        mtimes[path.stem] = path.stat().st_mtime
+    return sources, mtimes
+
+
+_catalog = None
+
+
+def load_translations(locales_dir: Path = LOCALES_DIR) -> TranslationCatalog:
+    """Compila locales/*.json y reemplaza el catálogo actual de una vez."""
+    global _catalog
+    sources, mtimes = read_sources(locales_dir)
+    catalog = TranslationCatalog(sources, mtimes)
+
+    for lang, keys in catalog.missing_keys().items():
+        if keys:
+            sample = ", ".join(sorted(keys)[:5])
+            logging.warning(f"localization: {lang}.json no tiene {len(keys)} claves (se usa respaldo): {sample}...")
+    for key, fields in catalog.mismatched_fields():
+        logging.warning(f"localization: variables distintas en {key}: {fields}")
+
+    _catalog = catalog
+    logging.info(f"localization: {len(catalog.languages)} idiomas, {len(catalog.default)} claves")
+    return catalog
+
+
+def reload_translations_if_changed(locales_dir: Path = LOCALES_DIR) -> bool:
+    mtimes = {path.stem: path.stat().st_mtime for path in locales_dir.glob("*.json")}
+    if _catalog is not None and mtimes == _catalog.mtimes:
+        return False
     try:
-        return text.format(**kwargs)
-    except KeyError as e:
-        return f"[Translation error: missing {e.args[0]}]"
\ No newline at end of file
+        load_translations(locales_dir)
+    except (OSError, json.JSONDecodeError) as e:
+        # Un archivo a medio guardar no debe tumbar las traducciones actuales
+        logging.error(f"localization: no se pudo recargar: {e}")
+        return False
+    return True
+
+
+async def watch_translations(interval: float = RELOAD_INTERVAL):
+    """Recarga el catálogo cuando cambia algún archivo de locales/ (solo desarrollo)."""
+    while True:
+        await asyncio.sleep(interval)
+        if reload_translations_if_changed():
+            logging.info("localization: traducciones recargadas")
+
+
+def get_translation(language: str, key: str, **kwargs) -> str:
+    if _catalog is None:
+        load_translations()
+    return _catalog.get(language, key, kwargs)
@@ -0,0 +1,81 @@
+import json, time
+from pathlib import Path
+from utils import localization
+
+# Compara get_translation compilado contra la versión anterior (tres búsquedas
+# y format() en cada llamada) usando todas las claves reales de locales/.
+# Uso: python -m utils.localization_bench [rondas]
+
+_legacy_translations = {}
+
+
+def legacy_get_translation(language: str, key: str, **kwargs) -> str:
+    def load_language(lang):
+        if lang not in _legacy_translations:
+            lang_path = Path("locales") / f"{lang}.json"
+            try:
+                with lang_path.open("r", encoding="utf-8") as f:
+                    _legacy_translations[lang] = json.load(f)
+            except FileNotFoundError:
+                _legacy_translations[lang] = {}
+
+    load_language(language)
+    if language != "en":
+        load_language("en")
+    if language != "es":
+        load_language("es")
+
+    text = (
+        _legacy_translations[language].get(key)
+        or _legacy_translations.get("en", {}).get(key)
+        or _legacy_translations.get("es", {}).get(key)
+    )
+
+    if text is None:
+        return f"[Missing translation: {key}]"
+
+    try:
+        return text.format(**kwargs)
+    except KeyError as e:
+        return f"[Translation error: missing {e.args[0]}]"
+
+
+def build_calls(catalog) -> list[tuple]:
+    calls = []
+    for lang in ("en", "es"):
+        for key, template in catalog.languages.get(lang, {}).items():
+            calls.append((lang, key, {field: "1" for field in template.fields}))
+    return calls
+
+
+def run(func, calls: list, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for lang, key, kwargs in calls:
+            func(lang, key, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(rounds: int = 200):
+    catalog = localization.load_translations()
+    calls = build_calls(catalog)
+
+    # Mismo resultado en ambas versiones antes de medir
+    mismatches = [
+        (lang, key) for lang, key, kwargs in calls
+        if legacy_get_translation(lang, key, **kwargs) != localization.get_translation(lang, key, **kwargs)
+    ]
+    if mismatches:
+        print(f"⚠️ {len(mismatches)} claves con resultado distinto: {mismatches[:5]}")
+
+    legacy = run(legacy_get_translation, calls, rounds)
+    compiled = run(localization.get_translation, calls, rounds)
+    total = len(calls) * rounds
+    print(f"{len(calls)} claves x {rounds} rondas = {total} llamadas")
+    print(f"anterior:  {legacy * 1e9 / total:8.1f} ns/llamada")
+    print(f"compilado: {compiled * 1e9 / total:8.1f} ns/llamada ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    import sys
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,252 @@
+import random
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate
+from db.catalog import get_catalog
+from db.unique_ids import new_unique_ids
+
+# Motor de apertura de packs.
+# Los muestreadores por peso se construyen una vez a partir del catálogo en memoria;
+# todas las cartas y skills de un pack se sortean sin consultas y se insertan con
+# un executemany por tabla.
+
+SKILL_SLOTS = {
+    "passive": "p_skill",
+    "active": "a_skill",
+    "support": "s_skill",
+    "ultimate": "u_skill"
+}
+
+# llave de rareza del pack -> peso en la tabla packs
+RARITY_WEIGHTS = {
+    "R_": "w_regular",
+    "LMT": "w_limited",
+    "FCR": "w_fcr",
+    "POB": "w_pob",
+    "LEG": "w_legacy"
+}
+
+TYPE_WEIGHTS = {
+    "idol": "w_idol",
+    "item": "w_item",
+    "performance": "w_performance",
+    "redeemable": "w_redeemable"
+}
+
+ITEM_ICONS = {"mic": "🎤", "outfit": "👗", "accessory": "🎀", "consumable": "🧃"}
+PERFORMANCE_ICONS = {"reinforcement": "🎭", "stage": "🪩"}
+
+
+class WeightedSampler:
+    """Sorteo por peso acumulado: O(n) al construir, O(log n) por carta."""
+    def __init__(self, items: list, weights: list = None):
+        self.items = items
+        if weights is None:
+            weights = [1] * len(items)
+        self.cumulative = list(accumulate(weights))
+        self.total = self.cumulative[-1] if self.cumulative else 0
+
+    def __bool__(self):
+        return self.total > 0
+
+    def draw(self, rng=random):
+        return self.items[bisect_right(self.cumulative, rng.random() * self.total)]
+
+
+def is_rarity_match(card, rarity_key: str) -> bool:
+    # 'R_' equivale al LIKE 'R_1': Regular de cualquier modelo en nivel 1
+    if rarity_key == "R_":
+        rarity_id = card["rarity_id"]
+        return len(rarity_id) == 3 and rarity_id[0] == "R" and rarity_id[2] == "1"
+    return card["rarity_id"] == rarity_key
+
+
+class PackSamplers:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.tables = {
+            table: WeightedSampler(rows, [r["weight"] for r in rows])
+            for table in ("cards_item", "cards_performance", "redeemables")
+            for rows in [catalog.rows(table)]
+        }
+        self.skills = {
+            skill_type: WeightedSampler(catalog.skills_of_type(skill_type))
+            for skill_type in SKILL_SLOTS
+        }
+        self.idols = {}
+
+    def idol(self, rarity_key: str, group_name: str = None, set_id: str = None) -> WeightedSampler:
+        key = (rarity_key, group_name, set_id)
+        if key not in self.idols:
+            cards = [
+                c for c in self.catalog.cards(set_id=set_id, group_name=group_name)
+                if is_rarity_match(c, rarity_key)
+            ]
+            self.idols[key] = WeightedSampler(cards, [c["weight"] for c in cards])
+        return self.idols[key]
+
+
+_samplers = None
+
+
+def get_samplers() -> PackSamplers:
+    """Muestreadores del catálogo actual; se reconstruyen cuando el catálogo se recarga."""
+    global _samplers
+    catalog = get_catalog()
+    if _samplers is None or _samplers.catalog is not catalog:
+        _samplers = PackSamplers(catalog)
+    return _samplers
+
+
+def draw_skills(card, samplers: PackSamplers, rng=random) -> dict:
+    """Sortea las skills de una carta de idol según su rareza."""
+    rarity = card["rarity"]
+    if rarity == "Regular":
+        types = [rng.choice(["passive", "active", "support"])]
+    elif rarity == "Limited":
+        types = ["ultimate", rng.choice(["passive", "active", "support"])]
+    elif rarity == "FCR":
+        types = ["support", rng.choice(["passive", "active", "ultimate"])]
+    elif rarity == "POB":
+        types = rng.sample(list(SKILL_SLOTS), 3)
+    else:
+        types = []
+
+    skills = {slot: None for slot in SKILL_SLOTS.values()}
+    for skill_type in types:
+        sampler = samplers.skills[skill_type]
+        if sampler:
+            skills[SKILL_SLOTS[skill_type]] = sampler.draw(rng)["skill_name"]
+    return skills
+
+
+def draw_pack(pack_row, samplers: PackSamplers = None, rng=random) -> list:
+    """Sortea en memoria todas las cartas de un pack.
+    Devuelve tuplas (tipo, fila del catálogo, skills) o un texto de error."""
+    samplers = samplers or get_samplers()
+    type_sampler = WeightedSampler(list(TYPE_WEIGHTS), [pack_row[w] for w in TYPE_WEIGHTS.values()])
+    if not type_sampler:
+        return []
+
+    # Solo rarezas con cartas para el grupo/set del pack
+    rarity_keys = [
+        k for k in RARITY_WEIGHTS
+        if samplers.idol(k, pack_row["group_name"], pack_row["set_id"])
+    ]
+    rarity_sampler = WeightedSampler(rarity_keys, [pack_row[RARITY_WEIGHTS[k]] for k in rarity_keys])
+
+    draws = []
+    for _ in range(pack_row["card_amount"]):
+        tipo = type_sampler.draw(rng)
+
+        if tipo == "idol":
+            if not rarity_sampler:
+                draws.append("❌ No hay cartas de idol disponibles.")
+                continue
+            rareza = rarity_sampler.draw(rng)
+            card = samplers.idol(rareza, pack_row["group_name"], pack_row["set_id"]).draw(rng)
+            draws.append(("idol", card, draw_skills(card, samplers, rng)))
+
+        elif tipo == "item":
+            if not samplers.tables["cards_item"]:
+                draws.append("❌ No hay items disponibles.")
+                continue
+            draws.append(("item", samplers.tables["cards_item"].draw(rng), None))
+
+        elif tipo == "performance":
+            if not samplers.tables["cards_performance"]:
+                draws.append("❌ No hay performance cards disponibles.")
+                continue
+            draws.append(("performance", samplers.tables["cards_performance"].draw(rng), None))
+
+        elif tipo == "redeemable":
+            if not samplers.tables["redeemables"]:
+                draws.append("❌ No hay redeemables disponibles.")
+                continue
+            draws.append(("redeemable", samplers.tables["redeemables"].draw(rng), None))
+
+    return draws
+
+
+def describe_draw(tipo: str, card) -> str:
+    if tipo == "item":
+        return f"{ITEM_ICONS.get(card['type'], '')} {card['name']}"
+    if tipo == "performance":
+        return f"{PERFORMANCE_ICONS.get(card['type'], '')} {card['name']}"
+    if tipo == "redeemable":
+        return f"🎟️ {card['name']}"
+    if card["rarity"] == "Regular" and card["rarity_id"].startswith("R") and len(card["rarity_id"]) == 3:
+        return f"👤 {card['idol_name']} `{card['set_name']}`\n(Regular {card['rarity_id'][1]})"
+    return f"👤 {card['idol_name']} `{card['set_name']}`\n({card['rarity']})"
+
+
+async def insert_draws(conn, user_id: int, draws: list) -> list:
+    """Inserta las cartas sorteadas con un executemany por tabla y arma los resultados."""
+    idol_draws = [d for d in draws if not isinstance(d, str) and d[0] == "idol"]
+    item_draws = [d for d in draws if not isinstance(d, str) and d[0] == "item"]
+    idol_ids = iter(await new_unique_ids(len(idol_draws), conn))
+    item_ids = iter(await new_unique_ids(len(item_draws), conn))
+
+    results = []
+    idol_rows = []
+    item_rows = []
+    performance_counts = Counter()
+    redeemable_counts = Counter()
+    for draw in draws:
+        if isinstance(draw, str):
+            results.append(draw)
+            continue
+
+        tipo, card, skills = draw
+        new_id = None
+        if tipo == "idol":
+            new_id = next(idol_ids)
+            idol_rows.append((
+                new_id, user_id, card["card_id"], card["idol_id"], card["set_id"], card["rarity_id"],
+                skills["p_skill"], skills["a_skill"], skills["s_skill"], skills["u_skill"]
+            ))
+            card_key = card["card_id"]
+        elif tipo == "item":
+            new_id = next(item_ids)
+            item_rows.append((new_id, user_id, card["item_id"], card["max_durability"]))
+            card_key = card["item_id"]
+        elif tipo == "performance":
+            performance_counts[card["pcard_id"]] += 1
+            card_key = card["pcard_id"]
+        else:
+            redeemable_counts[card["redeemable_id"]] += 1
+            card_key = card["redeemable_id"]
+
+        results.append((tipo, describe_draw(tipo, card), card_key, new_id))
+
+    if idol_rows:
+        await conn.executemany("""
+            INSERT INTO user_idol_cards (unique_id, user_id, card_id, idol_id, set_id, rarity_id, p_skill, a_skill, s_skill, u_skill)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+        """, idol_rows)
+
+    if item_rows:
+        await conn.executemany("""
+            INSERT INTO user_item_cards (unique_id, user_id, item_id, durability)
+            VALUES ($1, $2, $3, $4)
+        """, item_rows)
+
+    if performance_counts:
+        await conn.executemany("""
+            INSERT INTO user_performance_cards (user_id, pcard_id, quantity, last_updated)
+            VALUES ($1, $2, $3, now())
+            ON CONFLICT (user_id, pcard_id) DO UPDATE SET
+            quantity = user_performance_cards.quantity + EXCLUDED.quantity,
+            last_updated = now()
+        """, [(user_id, pcard_id, n) for pcard_id, n in performance_counts.items()])
+
+    if redeemable_counts:
+        await conn.executemany("""
+            INSERT INTO user_redeemables (user_id, redeemable_id, quantity, last_updated)
+            VALUES ($1, $2, $3, now())
+            ON CONFLICT (user_id, redeemable_id) DO UPDATE SET
+            quantity = user_redeemables.quantity + EXCLUDED.quantity,
+            last_updated = now()
+        """, [(user_id, redeemable_id, n) for redeemable_id, n in redeemable_counts.items()])
+
+    return results
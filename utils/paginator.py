@@ -1,4 +1,4 @@
-import discord
+import discord, inspect
 from discord.ext import commands
 from discord import app_commands
 import csv
@@ -8,6 +8,7 @@ from utils.localization import get_translation
 from utils.language import get_user_language
 from db.connection import get_pool
 from datetime import datetime
+from collections import OrderedDict
 
 
 class Paginator:
@@ -56,6 +57,94 @@ class Paginator:
         )
 
 
+
+class PageCache:
+    """LRU pequeño de páginas ya construidas."""
+    def __init__(self, maxsize: int = 5):
+        self.maxsize = maxsize
+        self._pages = OrderedDict()
+
+    def get(self, key):
+        if key not in self._pages:
+            return None
+        self._pages.move_to_end(key)
+        return self._pages[key]
+
+    def put(self, key, value):
+        self._pages[key] = value
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+
+    def clear(self):
+        self._pages.clear()
+
+
+class LazyPaginator(Paginator):
+    """Paginador que solo construye los embeds de la página visible.
+    rows: lista de filas o función async (page, per_page) -> filas de esa página;
+    con una función hay que indicar `total`.
+    render_page: recibe las filas de la página y devuelve sus embeds (puede ser async).
+    Los embeds se obtienen con `await fetch_current_embeds()`."""
+    def __init__(self, rows, render_page, embeds_per_page: int = 4, total: int = None, custom_view_factory=None, cache_size: int = 5):
+        super().__init__([], embeds_per_page, custom_view_factory)
+        self.rows = rows
+        self.render_page = render_page
+        if total is None:
+            if callable(rows):
+                raise ValueError("LazyPaginator: `total` es obligatorio cuando rows es una función")
+            total = len(rows)
+        self.total = total
+        self.total_pages = max(1, (self.total + embeds_per_page - 1) // embeds_per_page)
+        self.page_cache = PageCache(cache_size)
+        self.current_rows = []
+
+    async def get_page_rows(self, page: int) -> list:
+        if callable(self.rows):
+            return await self.rows(page, self.embeds_per_page)
+        start = page * self.embeds_per_page
+        return self.rows[start:start + self.embeds_per_page]
+
+    async def fetch_current_embeds(self):
+        cached = self.page_cache.get(self.current_page)
+        if cached is None:
+            rows = await self.get_page_rows(self.current_page)
+            page_embeds = self.render_page(rows)
+            if inspect.isawaitable(page_embeds):
+                page_embeds = await page_embeds
+            cached = (rows, list(page_embeds))
+            self.page_cache.put(self.current_page, cached)
+        self.current_rows, page_embeds = cached
+        return [self.page_header_embed()] + page_embeds
+
+    def get_current_embeds(self):
+        # Versión síncrona de Paginator: solo sirve si la página ya está en caché
+        cached = self.page_cache.get(self.current_page)
+        if cached is None:
+            raise RuntimeError("LazyPaginator: usar `await fetch_current_embeds()`")
+        return [self.page_header_embed()] + cached[1]
+
+    def page_header_embed(self) -> discord.Embed:
+        return discord.Embed(
+            description=f"### Total: {self.total}\nPage: {self.current_page + 1} / {self.total_pages}",
+            color=discord.Color.dark_gray()
+        )
+
+    async def start(self, interaction: discord.Interaction):
+        embeds = await self.fetch_current_embeds()
+        await interaction.response.send_message(
+            embeds=embeds,
+            view=self.get_view(),
+            ephemeral=True
+        )
+
+    async def update(self, interaction: discord.Interaction):
+        embeds = await self.fetch_current_embeds()
+        await interaction.response.edit_message(
+            embeds=embeds,
+            view=self.get_view()
+        )
+
 class PreviousButton(discord.ui.Button):
     def __init__(self, paginator):
         super().__init__(label="⬅️", style=discord.ButtonStyle.secondary, row=2)
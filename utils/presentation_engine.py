@@ -0,0 +1,560 @@
+import json, random
+from dataclasses import dataclass, field, fields
+from typing import Optional
+from db.catalog import get_catalog
+
+# Motor de simulación de presentaciones.
+# Carga una presentación completa (miembros, secciones de la canción y efectos)
+# una sola vez, calcula cada sección en memoria sin I/O y escribe el resultado
+# en una sola transacción.
+
+STATS = ["vocal", "rap", "dance", "visual"]
+
+# Aporte de los idols que acompañan al activo según su posición
+POSITION_BLEND = {
+    "participated": 0.4,
+    "grupal": 0.1
+}
+
+SECTION_TYPE_HYPE = {
+    "intro": 1.1,
+    "verse": 0.9,
+    "pre_chorus": 1.0,
+    "chorus": 1.3,
+    "break": 1.2,
+    "bridge": 0.8,
+    "ending": 0.7
+}
+
+SWITCH_RULES = {"optional": 1, "forced": -1, "locked": 0}
+
+
+@dataclass
+class MemberState:
+    id: int
+    idol_id: str
+    card_id: Optional[str]
+    unique_id: Optional[str]
+    vocal: int
+    rap: int
+    dance: int
+    visual: int
+    max_energy: int
+    used_energy: float
+    can_ult: bool
+    p_type: Optional[str]
+    current_position: Optional[str]
+    last_position: Optional[str]
+    individual_score: int
+
+    @classmethod
+    def from_row(cls, row) -> "MemberState":
+        return cls(**{f.name: row[f.name] for f in fields(cls)})
+
+
+@dataclass
+class PresentationState:
+    presentation_id: str
+    user_id: int
+    song_id: str
+    current_section: int
+    total_score: int
+    total_hype: float
+    free_switches: int
+    performance_card_uses: int
+    stage_effect: Optional[str]
+    stage_effect_duration: int
+    support_effect: Optional[str]
+    support_effect_duration: int
+    total_sections: int
+    members: list = field(default_factory=list)
+    sections: dict = field(default_factory=dict)
+    effects: dict = field(default_factory=dict)
+
+    def member(self, member_id: int) -> Optional[MemberState]:
+        for m in self.members:
+            if m.id == member_id:
+                return m
+        return None
+
+    def section(self, section_number: int = None) -> Optional[dict]:
+        if section_number is None:
+            section_number = self.current_section
+        return self.sections.get(section_number)
+
+    def active_effects(self) -> tuple:
+        """Devuelve (stage, support); None si el efecto no está activo."""
+        effect = None
+        if self.stage_effect and self.stage_effect_duration > 0:
+            effect = self.effects.get(self.stage_effect)
+
+        s_effect = None
+        if self.support_effect and self.support_effect_duration > 0:
+            s_effect = self.effects.get(self.support_effect)
+
+        return effect, s_effect
+
+
+@dataclass
+class SectionResult:
+    section_number: int
+    member_id: int
+    idol_id: str
+    card_id: Optional[str]
+    score: int
+    hype: float
+    base_hype: int
+    energy_cost: float
+    total_hype: float
+    final: bool
+
+
+async def load_presentation_state(conn, presentation_id: str, presentation_row=None) -> PresentationState:
+    if presentation_row is None:
+        presentation_row = await conn.fetchrow(
+            "SELECT * FROM presentations WHERE presentation_id = $1", presentation_id)
+
+    song_id = presentation_row["song_id"]
+
+    # Canción, secciones y efectos son estáticos: salen del catálogo en memoria
+    catalog = get_catalog()
+    song = catalog.song(song_id)
+    if song is None:
+        # Sin total_sections no se puede saber cuándo termina: se falla antes de simular
+        raise ValueError(f"La canción {song_id} de la presentación {presentation_id} no está en el catálogo")
+    sections = catalog.song_sections(song_id)
+    total_sections = song["total_sections"]
+
+    members = await conn.fetch(
+        "SELECT * FROM presentation_members WHERE presentation_id = $1 ORDER BY id", presentation_id)
+
+    effect_ids = [e for e in (presentation_row["stage_effect"], presentation_row["support_effect"]) if e]
+    effects = [catalog.effect(e) for e in effect_ids if catalog.effect(e)]
+
+    return PresentationState(
+        presentation_id=presentation_id,
+        user_id=presentation_row["user_id"],
+        song_id=song_id,
+        current_section=presentation_row["current_section"],
+        total_score=presentation_row["total_score"],
+        total_hype=presentation_row["total_hype"],
+        free_switches=presentation_row["free_switches"],
+        performance_card_uses=presentation_row["performance_card_uses"],
+        stage_effect=presentation_row["stage_effect"],
+        stage_effect_duration=presentation_row["stage_effect_duration"] or 0,
+        support_effect=presentation_row["support_effect"],
+        support_effect_duration=presentation_row["support_effect_duration"] or 0,
+        total_sections=total_sections,
+        members=[MemberState.from_row(m) for m in members],
+        sections={s["section_number"]: dict(s) for s in sections},
+        effects={e["effect_id"]: dict(e) for e in effects}
+    )
+
+
+def simulate_section(state: PresentationState, member_id: int, skill_bonus: dict) -> SectionResult:
+    """Calcula la sección actual para el idol activo y avanza el estado de la presentación."""
+    idol = state.member(member_id)
+    song_section = state.section()
+    current_section = state.current_section
+
+    section_stats = {stat: song_section[stat] for stat in STATS}
+    idol_stats = {stat: getattr(idol, stat) for stat in STATS}
+
+    # Mezcla de stats con los idols que acompañan
+    section_bonus_applied = False
+    for m in state.members:
+        blend = POSITION_BLEND.get(m.current_position)
+        if blend is None:
+            continue
+        for stat in STATS:
+            idol_stats[stat] += getattr(m, stat) * blend
+
+        if not section_bonus_applied and m.p_type == song_section["type_plus"]:
+            for stat in STATS:
+                section_stats[stat] += song_section[f"plus_{stat}"]
+            section_bonus_applied = True
+
+    for stat in STATS:
+        idol_stats[stat] = int(idol_stats[stat])
+
+    # Overrides por ultimate
+    for stat, val in skill_bonus.get("override_stat", {}).items():
+        if stat in section_stats:
+            section_stats[stat] = val
+    for stat in STATS:
+        idol_stats[stat] += skill_bonus.get(stat, 0)
+
+    duration = song_section["duration"]
+
+    restante = max(0, round((idol.max_energy - idol.used_energy) / idol.max_energy, 2))
+    if skill_bonus.get("override_energy") == "inverse":
+        restante = 1 - restante
+    if skill_bonus.get("override_energy") == "fixed":
+        Er = 1
+    else:
+        Er = 0.3 + restante * 0.7
+
+    # Stage y Support effects
+    effect, s_effect = state.active_effects()
+    for ef in (effect, s_effect):
+        if ef:
+            for stat in STATS:
+                section_stats[stat] += ef[f"plus_{stat}"]
+
+            ranked = [(stat, section_stats[stat]) for stat in STATS]
+            if ef["highest_stat_mod"]:
+                highest = max(ranked, key=lambda x: (x[1], STATS.index(x[0])))
+                section_stats[highest[0]] += ef["highest_stat_mod"]
+            if ef["lowest_stat_mod"]:
+                lowest = min(ranked, key=lambda x: (x[1], STATS.index(x[0])))
+                section_stats[lowest[0]] += ef["lowest_stat_mod"]
+
+    H = state.total_hype
+    Ph = min(1.2, max(0.8, ((0.4 * H) - 20) / 100 + 1))
+
+    energy_cost = duration
+    energy_cost += skill_bonus.get("extra_cost", 0)
+    energy_cost *= skill_bonus.get("relative_cost", 1)
+    energy_cost = round(energy_cost, 2)
+
+    for ef in (effect, s_effect):
+        if ef:
+            energy_cost += ef["extra_cost"]
+            energy_cost *= ef["relative_cost"]
+
+    score = sum(idol_stats[stat] * section_stats[stat] for stat in STATS) * duration * Er * Ph
+    score *= skill_bonus.get("score", 1)
+    for ef in (effect, s_effect):
+        if ef:
+            score *= ef["score_mod"]
+    score = int(score)
+
+    # Hype ganado
+    n_members = len(state.members)
+    base_hype = song_section["average_score"] * (1 + 0.001 * n_members * ((n_members + 1) / 2))
+    Hg = round((1 - base_hype / score) * 5 * skill_bonus.get("hype", 1), 2)
+    for ef in (effect, s_effect):
+        if ef:
+            Hg *= ef["hype_mod"]
+    Hg *= SECTION_TYPE_HYPE.get(song_section["section_type"], 1)
+    Hg = round(Hg, 2)
+
+    state.total_score += score
+    state.total_hype = min(100, max(0, state.total_hype + Hg))
+    total_hype = state.total_hype
+    idol.individual_score += score
+    advance_members(state, energy_cost)
+
+    # Siguiente sección y cambio de regla
+    next_section = current_section + 1
+    final = next_section > state.total_sections
+    if not final:
+        next_row = state.section(next_section)
+        state.current_section = next_section
+        state.free_switches = SWITCH_RULES.get(next_row["change_rule"], 1)
+        state.performance_card_uses = 1 + next_row["duration"] // 6
+
+        # Reducir duración de efectos
+        if state.stage_effect_duration > 0:
+            state.stage_effect_duration -= 1
+        if state.support_effect_duration > 0:
+            state.support_effect_duration -= 1
+
+    return SectionResult(
+        section_number=current_section,
+        member_id=idol.id,
+        idol_id=idol.idol_id,
+        card_id=idol.card_id,
+        score=score,
+        hype=Hg,
+        base_hype=int(base_hype),
+        energy_cost=energy_cost,
+        total_hype=total_hype,
+        final=final
+    )
+
+
+def advance_members(state: PresentationState, energy_cost: float):
+    """Consumo/regeneración de energía y rotación de posiciones al cerrar la sección."""
+    regen = round(energy_cost * 0.1, 1)
+    for m in state.members:
+        if m.current_position == "back":
+            m.used_energy -= regen
+        elif m.current_position is not None:
+            m.used_energy += energy_cost
+
+        if m.current_position in POSITION_BLEND:
+            m.last_position = "participated"
+            m.current_position = "back"
+        elif m.current_position is not None:
+            m.last_position = m.current_position
+
+        m.p_type = None
+        m.used_energy = min(m.max_energy, max(0, m.used_energy))
+
+
+# EFFECTS
+def apply_stat_boost(effect_values, conn=None, presentation_row=None, idol_row=None):
+    return {
+        "vocal": effect_values.get("vocal", 0),
+        "rap": effect_values.get("rap", 0),
+        "dance": effect_values.get("dance", 0),
+        "visual": effect_values.get("visual", 0),
+        "score": effect_values.get("score", 1),
+        "hype": effect_values.get("hype", 1)
+    }
+
+def apply_extra_cost(effect_values, conn=None, presentation_row=None, idol_row=None):
+    return {
+        "extra_cost": effect_values.get("energy", 0)
+    }
+
+def apply_relative_cost(effect_values, conn=None, presentation_row=None, idol_row=None):
+    return {
+        "relative_cost": effect_values.get("energy", 1)
+    }
+
+def apply_multi_effect(effect_values, conn=None, presentation_row=None, idol_row=None):
+    return {
+        "relative_cost": effect_values.get("relative_energy", 1),
+        "extra_cost": effect_values.get("extra_energy", 0),
+        "vocal": effect_values.get("vocal", 0),
+        "rap": effect_values.get("rap", 0),
+        "dance": effect_values.get("dance", 0),
+        "visual": effect_values.get("visual", 0),
+        "score": effect_values.get("score", 1),
+        "hype": effect_values.get("hype", 1)
+    }
+
+PASSIVE_EFFECTS = {
+    "stat_boost": apply_stat_boost,
+    "extra_cost": apply_extra_cost,
+    "relative_cost": apply_relative_cost,
+    "multi_effect": apply_multi_effect
+}
+
+
+# CHECKERS en memoria (también los usa commands/presentations.py vía check_passive_condition)
+def _energy_ratio(m: MemberState) -> float:
+    return 1 - (m.used_energy / m.max_energy)
+
+def _highest_stat(stats: dict) -> str:
+    return max(stats.items(), key=lambda x: (x[1], STATS.index(x[0])))[0]
+
+def _expect(values: dict, matches: bool) -> bool:
+    return matches if values.get("value", True) else not matches
+
+def _section_stat_above(values, idol, section, state):
+    for stat, min_value in values.items():
+        for ef in state.active_effects():
+            if ef:
+                min_value -= ef[f"plus_{stat}"]
+        if section.get(stat, 0) < min_value:
+            return False
+    return True
+
+def _section_stat_below(values, idol, section, state):
+    for stat, max_value in values.items():
+        for ef in state.active_effects():
+            if ef:
+                max_value += ef[f"plus_{stat}"]
+        if section.get(stat, 999) >= max_value:
+            return False
+    return True
+
+def _idol_stat_below(values, idol, section, state):
+    return "energy" not in values or (idol.max_energy - idol.used_energy) / idol.max_energy < values["energy"]
+
+def _idol_stat_above(values, idol, section, state):
+    return "energy" not in values or (idol.max_energy - idol.used_energy) / idol.max_energy > values["energy"]
+
+def _highest_section_stat(values, idol, section, state):
+    target_stat = values.get("stat")
+    return bool(target_stat) and _highest_stat({stat: section[stat] for stat in STATS}) == target_stat
+
+def _highest_score(values, idol, section, state):
+    return _expect(values, idol.individual_score == max(m.individual_score for m in state.members))
+
+def _highest_energy(values, idol, section, state):
+    return _expect(values, _energy_ratio(idol) == max(_energy_ratio(m) for m in state.members))
+
+def _lowest_score(values, idol, section, state):
+    return _expect(values, idol.individual_score == min(m.individual_score for m in state.members))
+
+def _lowest_energy(values, idol, section, state):
+    return _expect(values, _energy_ratio(idol) == min(_energy_ratio(m) for m in state.members))
+
+def _same_highest_stat(values, idol, section, state):
+    highest_idol = _highest_stat({stat: getattr(idol, stat) for stat in STATS})
+    highest_section = _highest_stat({stat: section[stat] for stat in STATS})
+    return _expect(values, highest_idol == highest_section)
+
+def _solo_act(values, idol, section, state):
+    if idol.last_position != "active":
+        return False
+    return _energy_ratio(idol) == max(_energy_ratio(m) for m in state.members)
+
+def _stat_above_stat(values, idol, section, state):
+    stat1, stat2 = values.get("higher"), values.get("lower")
+    if stat1 == stat2 or stat1 not in section or stat2 not in section:
+        return False
+    return section[stat1] > section[stat2]
+
+def _stat_higher_than_section(values, idol, section, state):
+    stat = values.get("stat")
+    return stat in STATS and getattr(idol, stat) > section[stat]
+
+PASSIVE_CONDITIONS = {
+    "section_stat_above": _section_stat_above,
+    "section_stat_below": _section_stat_below,
+    "idol_stat_below": _idol_stat_below,
+    "idol_stat_above": _idol_stat_above,
+    "highest_section_stat": _highest_section_stat,
+    "duration_above": lambda values, idol, section, state: section["duration"] > values.get("duration", 999),
+    "duration_below": lambda values, idol, section, state: section["duration"] < values.get("duration", 0),
+    "highest_score": _highest_score,
+    "highest_energy": _highest_energy,
+    "lowest_score": _lowest_score,
+    "lowest_energy": _lowest_energy,
+    "hype_above": lambda values, idol, section, state: state.total_hype > values.get("hype"),
+    "hype_below": lambda values, idol, section, state: state.total_hype < values.get("hype"),
+    "idol_active": lambda values, idol, section, state: _expect(values, idol.last_position == "active"),
+    "idol_participated": lambda values, idol, section, state: _expect(values, idol.last_position in ["participated", "active"]),
+    "same_highest_stat": _same_highest_stat,
+    "solo_act": _solo_act,
+    "stat_above_stat": _stat_above_stat,
+    "stat_higher_than_section": _stat_higher_than_section,
+    "stage_effect_active": lambda values, idol, section, state: (state.stage_effect_duration > 0) == values.get("value", False),
+    "support_effect_active": lambda values, idol, section, state: (state.support_effect_duration > 0) == values.get("value", False)
+}
+
+
+async def check_passive_condition(conn, condition: str, condition_values: dict, idol_row, section_row, presentation_row) -> Optional[bool]:
+    """Evalúa una condición pasiva desde las filas de la base (camino interactivo)
+    con los mismos checkers que la simulación. None si la condición no existe."""
+    checker = PASSIVE_CONDITIONS.get(condition)
+    if not checker:
+        return None
+    state = await load_presentation_state(conn, presentation_row["presentation_id"], presentation_row)
+    idol = state.member(idol_row["id"]) or MemberState.from_row(idol_row)
+    return checker(condition_values, idol, section_row, state)
+
+
+async def load_passive_skills(conn, state: PresentationState) -> dict:
+    """Skills pasivas de las cartas de la presentación, por unique_id."""
+    unique_ids = [m.unique_id for m in state.members if m.unique_id]
+    if not unique_ids:
+        return {}
+
+    rows = await conn.fetch(
+        "SELECT unique_id, p_skill FROM user_idol_cards WHERE unique_id = ANY($1::text[])", unique_ids)
+
+    catalog = get_catalog()
+    skills = {}
+    for r in rows:
+        skill = catalog.skill(r["p_skill"], "passive") if r["p_skill"] else None
+        if skill:
+            skills[r["unique_id"]] = dict(skill)
+    return skills
+
+
+def passive_bonus(state: PresentationState, idol: MemberState, skill: dict) -> dict:
+    if not skill:
+        return {}
+
+    checker = PASSIVE_CONDITIONS.get(skill["condition"])
+    if not checker:
+        return {}
+
+    condition_values = json.loads(skill["condition_values"]) if skill["condition_values"] else {}
+    if not checker(condition_values, idol, state.section(), state):
+        return {}
+
+    apply_func = PASSIVE_EFFECTS.get(skill["condition_effect"])
+    if not apply_func:
+        return {}
+
+    return apply_func(json.loads(skill["condition_params"]) if skill["condition_params"] else {})
+
+
+def auto_switch(state: PresentationState, rng=random):
+    """Cambio automático de idol en cada sección mientras queden cambios libres."""
+    if len(state.members) < 2 or state.free_switches == 0:
+        return
+
+    # El original tira 70/30 pero compara la lista que devuelve choices() (siempre
+    # verdadera), así que siempre cambia; se conserva la tirada para no alterar
+    # la secuencia del generador
+    rng.choices([True, False], weights=[70, 30])
+
+    old_active = next((m for m in state.members if m.current_position == "active"), None)
+    candidates = [m for m in state.members if m is not old_active]
+    weights = [max(0, m.max_energy - m.used_energy) for m in candidates]
+    if sum(weights) <= 0:
+        return
+
+    new_active = rng.choices(candidates, weights=weights, k=1)[0]
+    if old_active:
+        old_active.current_position = "back"
+    new_active.current_position = "active"
+
+
+def simulate_song(state: PresentationState, skills: dict, rng=random) -> list:
+    """Simula todas las secciones restantes sin I/O y devuelve la línea de tiempo."""
+    timeline = []
+    if not any(m.current_position == "active" for m in state.members):
+        rng.choice(state.members).current_position = "active"
+
+    while True:
+        auto_switch(state, rng)
+        idol = next(m for m in state.members if m.current_position == "active")
+        bonus = passive_bonus(state, idol, skills.get(idol.unique_id))
+        result = simulate_section(state, idol.id, bonus)
+        timeline.append(result)
+        if result.final:
+            return timeline
+
+
+async def run_auto_presentation(conn, presentation_id: str, presentation_row=None, rng=random):
+    """Corre la presentación completa en memoria y la guarda en una sola transacción."""
+    state = await load_presentation_state(conn, presentation_id, presentation_row)
+    skills = await load_passive_skills(conn, state)
+    timeline = simulate_song(state, skills, rng)
+    await write_presentation_state(conn, state, timeline)
+    return state, timeline
+
+
+async def write_section_result(conn, state: PresentationState, result: SectionResult):
+    await write_presentation_state(conn, state, [result])
+
+
+async def write_presentation_state(conn, state: PresentationState, results: list):
+    presentation_id = state.presentation_id
+    async with conn.transaction():
+        await conn.executemany("""
+            INSERT INTO presentation_sections (presentation_id, section, score_got, hype_got, active_card_id)
+            VALUES ($1, $2, $3, $4, $5)
+        """, [
+            (presentation_id, r.section_number, r.score, r.hype, r.card_id)
+            for r in results
+        ])
+
+        await conn.execute("""
+            UPDATE presentations
+            SET total_score = $1, total_hype = $2, current_section = $3,
+                free_switches = $4, performance_card_uses = $5,
+                stage_effect_duration = $6, support_effect_duration = $7
+            WHERE presentation_id = $8
+        """, state.total_score, state.total_hype, state.current_section,
+            state.free_switches, state.performance_card_uses,
+            state.stage_effect_duration, state.support_effect_duration, presentation_id)
+
+        await conn.executemany("""
+            UPDATE presentation_members
+            SET used_energy = $1, current_position = $2, last_position = $3,
+                individual_score = $4, p_type = $5
+            WHERE id = $6
+        """, [
+            (m.used_energy, m.current_position, m.last_position, m.individual_score, m.p_type, m.id)
+            for m in state.members
+        ])
@@ -0,0 +1,189 @@
+import asyncio, logging, time
+from collections import OrderedDict
+import discord
+from discord import app_commands
+from db.connection import get_pool
+from db.metrics import start_db_timer
+
+# Registro de interacciones fuera del camino de cada botón o comando.
+# on_interaction arma un evento (usuario, comando/custom_id, tiempo hasta la
+# respuesta, tiempo de base de datos de todo el comando) y lo deja en una cola
+# acotada; una tarea de fondo los escribe por lotes en interaction_log. Si la
+# cola se llena, los eventos se descartan y se cuentan en lugar de frenar al bot.
+
+QUEUE_SIZE = 5000
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 5  # segundos
+RETENTION_DAYS = 30
+PRUNE_INTERVAL = 3600  # segundos
+RESPONSE_POLL = 0.02  # segundos entre revisiones de interaction.response
+RESPONSE_DEADLINE = 3.0  # Discord invalida la interacción si no se responde antes
+COMMAND_DEADLINE = 900  # segundos; el token de la interacción dura 15 minutos
+LABEL_INDEX_SIZE = 10000
+
+COLUMNS = ("created_at", "user_id", "guild_id", "kind", "name", "label", "response_ms", "db_ms", "db_queries")
+
+
+class TelemetryTree(app_commands.CommandTree):
+    """Árbol de comandos que mide el tiempo de base de datos de cada comando.
+    El DbTimer y un evento de fin quedan en interaction.extras; on_interaction
+    lee el timer cuando el comando terminó (muchos hacen defer y luego consultan)."""
+
+    async def _call(self, interaction: discord.Interaction):
+        interaction.extras["db_timer"] = start_db_timer()
+        done = interaction.extras["command_done"] = asyncio.Event()
+        try:
+            await super()._call(interaction)
+        finally:
+            done.set()
+
+
+class ComponentLabels:
+    """Índice custom_id -> label de los botones.
+    La primera vez que aparece un custom_id se indexan todos los componentes de
+    su mensaje; las siguientes pulsaciones de ese mensaje son una búsqueda en el dict."""
+
+    def __init__(self, maxsize: int = LABEL_INDEX_SIZE):
+        self.maxsize = maxsize
+        self._labels = OrderedDict()  # custom_id -> label (o None si no tiene)
+
+    def index_message(self, message: discord.Message):
+        for action_row in message.components:
+            for child in getattr(action_row, "children", ()):
+                custom_id = getattr(child, "custom_id", None)
+                if custom_id:
+                    self._labels[custom_id] = getattr(child, "label", None)
+                    self._labels.move_to_end(custom_id)
+        while len(self._labels) > self.maxsize:
+            self._labels.popitem(last=False)
+
+    def get(self, custom_id: str, message: discord.Message = None):
+        if custom_id not in self._labels:
+            if message is None or not message.components:
+                return None
+            self.index_message(message)
+        return self._labels.get(custom_id)
+
+
+class InteractionTelemetry:
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._last_prune = 0.0
+        self.labels = ComponentLabels()
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+
+    def describe(self, interaction: discord.Interaction) -> tuple:
+        """(kind, name, label) de la interacción."""
+        kind = interaction.type.name
+        if interaction.type == discord.InteractionType.component:
+            custom_id = (interaction.data or {}).get("custom_id")
+            return kind, custom_id, self.labels.get(custom_id, interaction.message)
+        if interaction.type == discord.InteractionType.application_command:
+            command = interaction.command
+            name = command.qualified_name if command else (interaction.data or {}).get("name")
+            return kind, name, None
+        return kind, (interaction.data or {}).get("custom_id"), None
+
+    async def wait_response(self, interaction: discord.Interaction):
+        """Milisegundos desde que se creó la interacción hasta que se respondió
+        (o se difirió), o None si no hubo respuesta antes del límite de Discord."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RESPONSE_DEADLINE
+        while not interaction.response.is_done():
+            if loop.time() >= deadline:
+                return None
+            await asyncio.sleep(RESPONSE_POLL)
+        return (discord.utils.utcnow() - interaction.created_at).total_seconds() * 1000
+
+    async def record(self, interaction: discord.Interaction):
+        kind, name, label = self.describe(interaction)
+        response_ms = await self.wait_response(interaction)
+        done = interaction.extras.get("command_done")
+        if done is not None:
+            try:
+                await asyncio.wait_for(done.wait(), timeout=COMMAND_DEADLINE)
+            except asyncio.TimeoutError:
+                pass  # se guarda lo acumulado hasta ahora
+        timer = interaction.extras.get("db_timer")
+        event = (
+            interaction.created_at,
+            interaction.user.id,
+            interaction.guild_id,
+            kind,
+            name,
+            label,
+            response_ms,
+            timer.total_ms if timer else None,
+            timer.queries if timer else None
+        )
+        try:
+            self._queue.put_nowait(event)
+            self.recorded += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _take_batch(self) -> list:
+        batch = []
+        while len(batch) < BATCH_SIZE and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: list):
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table("interaction_log", records=batch, columns=COLUMNS)
+            if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                await conn.execute(
+                    "DELETE FROM interaction_log WHERE created_at < now() - make_interval(days => $1)",
+                    RETENTION_DAYS
+                )
+                self._last_prune = time.monotonic()
+
+    async def flush(self) -> int:
+        """Escribe todo lo que haya en la cola; devuelve cuántos eventos se guardaron."""
+        total = 0
+        while batch := self._take_batch():
+            try:
+                await self._write(batch)
+            except Exception as e:
+                # Es telemetría: se pierde el lote antes que acumular memoria
+                self.dropped += len(batch)
+                logging.error(f"telemetry: no se pudo guardar un lote de {len(batch)} interacciones: {e}")
+                break
+            total += len(batch)
+        self.written += total
+        return total
+
+    async def run(self, interval: float = FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+
+_telemetry = InteractionTelemetry()
+
+
+async def record_interaction(interaction: discord.Interaction):
+    await _telemetry.record(interaction)
+
+
+async def flush() -> int:
+    return await _telemetry.flush()
+
+
+async def run_telemetry_writer(interval: float = FLUSH_INTERVAL):
+    await _telemetry.run(interval)
+
+
+def telemetry_stats() -> dict:
+    return _telemetry.stats()